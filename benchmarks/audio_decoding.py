@@ -0,0 +1,163 @@
+"""Benchmark of the `AudioStream` decoder path.
+
+Encodes a synthetic stereo tone with the AAC encoder of FFmpeg, packetizes it as described in RFC 3640 with three
+access units per RTP packet and reports:
+
+- the throughput of depacketizing and decoding, in samples per second and as a multiple of real time, and
+- the latency from when a packet is handed to the stream until its block of samples is taken from the decode queue,
+  with packets arriving in real time, when decoding in the default executor and in a dedicated thread.
+
+Usage: python benchmarks/audio_decoding.py
+"""
+
+import asyncio
+import fractions
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+import av
+import numpy as np
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import AudioStream, StreamType
+
+SAMPLE_RATE = 48000
+ACCESS_UNITS_PER_PACKET = 3
+DURATION = 5.0
+
+
+class LoopbackTransport:
+    def subscribe(self, client: Any) -> None:
+        pass
+
+
+class FakeSDP:
+    def __init__(self, config: bytes) -> None:
+        self.attributes = {
+            "rtpmap": {
+                "pt": 97,
+                "encoding": f"MPEG4-GENERIC/{SAMPLE_RATE}",
+                "clockRate": 2,
+            },
+            "fmtp": {
+                "pt": 97,
+                "mode": "AAC-hbr",
+                "config": config.hex(),
+                "sizeLength": "13",
+                "indexLength": "3",
+                "indexDeltaLength": "3",
+            },
+        }
+
+    def get_media(self, media_type: str, media_index: int) -> Any:
+        return {"attributes": self.attributes}
+
+
+def encode(seconds: float) -> Tuple[List[bytes], bytes]:
+    encoder: Any = av.CodecContext.create("aac", "w")  # type: ignore
+    encoder.sample_rate = SAMPLE_RATE
+    encoder.layout = "stereo"
+    encoder.format = "fltp"
+    encoder.time_base = fractions.Fraction(1, SAMPLE_RATE)
+    encoder.open()
+    access_units: List[bytes] = []
+    for i in range(int(seconds * SAMPLE_RATE / 1024)):
+        t = np.arange(i * 1024, (i + 1) * 1024, dtype=np.float32) / SAMPLE_RATE
+        tone = 0.5 * np.sin(2 * np.pi * 440 * t, dtype=np.float32)
+        frame: Any = av.AudioFrame.from_ndarray(np.stack([tone, tone]), format="fltp", layout="stereo")  # type: ignore
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = i * 1024
+        access_units.extend(bytes(packet) for packet in encoder.encode(frame))
+    access_units.extend(bytes(packet) for packet in encoder.encode(None))
+    return access_units, bytes(encoder.extradata)
+
+
+def packetize(access_units: List[bytes]) -> List[Any]:
+    packets: List[Any] = []
+    for seq, i in enumerate(range(0, len(access_units), ACCESS_UNITS_PER_PACKET)):
+        group = access_units[i : i + ACCESS_UNITS_PER_PACKET]
+        rtp: Any = RTP()
+        rtp.pt = 97
+        rtp.seq = seq & 0xFFFF
+        rtp.ts = i * 1024
+        rtp.m = 1
+        rtp.data = (
+            (len(group) * 16).to_bytes(2, "big")
+            + b"".join(
+                (len(access_unit) << 3).to_bytes(2, "big") for access_unit in group
+            )
+            + b"".join(group)
+        )
+        packets.append(RTP(bytes(rtp)))
+    return packets
+
+
+def new_stream(
+    config: bytes, decoder_executor: Optional[ThreadPoolExecutor] = None
+) -> AudioStream:
+    stream = AudioStream(LoopbackTransport(), StreamType.AUDIO, decoder_executor, jitter_buffer_latency=None)  # type: ignore
+    stream.configure(FakeSDP(config))
+    return stream
+
+
+def throughput(packets: List[Any], config: bytes) -> None:
+    stream = new_stream(config)
+    t0 = time.perf_counter()
+    samples = 0
+    for packet in packets:
+        block = stream._decode_access_units(stream._depacketize(packet))  # type: ignore
+        if block is not None:
+            samples += len(block)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"throughput: {samples / elapsed:,.0f} samples/s, {samples / SAMPLE_RATE / elapsed:.0f}x real time, "
+        f"{elapsed / len(packets) * 1e6:.0f} us per packet"
+    )
+
+
+async def latency(
+    name: str,
+    packets: List[Any],
+    config: bytes,
+    decoder_executor: Optional[ThreadPoolExecutor],
+) -> None:
+    stream = new_stream(config, decoder_executor)
+    packet_duration = ACCESS_UNITS_PER_PACKET * 1024 / SAMPLE_RATE
+    sent: List[float] = []
+    latencies: List[float] = []
+    async with stream.decode() as block_queue:
+
+        async def sender():
+            for packet in packets:
+                sent.append(time.perf_counter())
+                stream.handle_rtp(packet)
+                await asyncio.sleep(packet_duration)
+
+        sender_task = asyncio.create_task(sender())
+        for i in range(len(packets)):
+            await block_queue.get()
+            latencies.append(time.perf_counter() - sent[i])
+        await sender_task
+    latencies.sort()
+    print(
+        f"latency ({name}): mean {statistics.mean(latencies) * 1000:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms"
+    )
+
+
+async def main() -> None:
+    access_units, config = encode(DURATION)
+    packets = packetize(access_units)
+    print(
+        f"{len(access_units)} access units in {len(packets)} packets, {SAMPLE_RATE} Hz stereo"
+    )
+    throughput(packets, config)
+    await latency("default executor", packets, config, None)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        await latency("dedicated thread", packets, config, executor)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
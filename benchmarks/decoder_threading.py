@@ -0,0 +1,96 @@
+"""Benchmark of the `DecoderThreading` modes.
+
+Decodes an H.264 clip with every threading mode and thread count and reports the decoded frames per
+second and the latency added by the decoder. The latency is the number of frames the decoder holds
+back, at the frame rate of the clip, plus the mean time per decode call.
+
+Usage: python benchmarks/decoder_threading.py [clip]
+
+The clip can be any file PyAV can demux, such as a raw `.h264` recording of the scene camera. Without
+a clip, a synthetic 1920x1080 25 fps clip with four slices per frame is encoded with libx264.
+"""
+
+import fractions
+import sys
+import time
+from typing import Any, List, Tuple
+
+import av
+
+from g3pylib.streams import DecoderThreading
+
+FRAMES_PER_SECOND = 25
+THREAD_COUNTS = [1, 2, 4, 8, 0]
+
+
+def synthetic_clip(frames: int = 250) -> List[bytes]:
+    encoder: Any = av.CodecContext.create("libx264", "w")  # type: ignore
+    encoder.width = 1920
+    encoder.height = 1080
+    encoder.pix_fmt = "yuv420p"
+    encoder.time_base = fractions.Fraction(1, FRAMES_PER_SECOND)
+    encoder.options = {
+        "preset": "veryfast",
+        "tune": "zerolatency",
+        "x264-params": f"keyint={2 * FRAMES_PER_SECOND}:slices=4",
+    }
+    packets: List[bytes] = []
+    for i in range(frames):
+        frame: Any = av.VideoFrame(encoder.width, encoder.height, "yuv420p")  # type: ignore
+        for plane_index, plane in enumerate(frame.planes):
+            row = bytes(
+                (x + 8 * i * (plane_index + 1)) % 256 for x in range(plane.line_size)
+            )
+            plane.update(row * (plane.buffer_size // plane.line_size))
+        frame.pts = i
+        packets.extend(bytes(packet) for packet in encoder.encode(frame))
+    packets.extend(bytes(packet) for packet in encoder.encode(None))
+    return packets
+
+
+def recorded_clip(path: str) -> List[bytes]:
+    with av.open(path) as container:  # type: ignore
+        return [
+            bytes(packet)
+            for packet in container.demux(video=0)  # type: ignore
+            if packet.size
+        ]
+
+
+def decode(
+    packets: List[bytes], threading: DecoderThreading, thread_count: int
+) -> Tuple[float, float, float]:
+    codec_context: Any = av.CodecContext.create("h264", "r")  # type: ignore
+    codec_context.options = threading.codec_options(thread_count)
+    delays: List[int] = []
+    t0 = time.perf_counter()
+    for i, data in enumerate(packets):
+        packet: Any = av.Packet(data)  # type: ignore
+        packet.pts = i
+        for frame in codec_context.decode(packet):
+            delays.append(i - frame.pts)
+    codec_context.decode(None)
+    elapsed = time.perf_counter() - t0
+    frames_per_second = len(packets) / elapsed
+    mean_delay = sum(delays) / len(delays) if delays else 0.0
+    latency = mean_delay / FRAMES_PER_SECOND + elapsed / len(packets)
+    return frames_per_second, mean_delay, latency
+
+
+def main() -> None:
+    packets = recorded_clip(sys.argv[1]) if len(sys.argv) > 1 else synthetic_clip()
+    print(f"{len(packets)} frames")
+    print(f"{'threading':<16}{'threads':>8}{'fps':>10}{'delay':>10}{'latency':>12}")
+    for threading in DecoderThreading:
+        for thread_count in THREAD_COUNTS:
+            frames_per_second, mean_delay, latency = decode(
+                packets, threading, thread_count
+            )
+            print(
+                f"{threading.name:<16}{thread_count or 'auto':>8}{frames_per_second:>10.1f}"
+                f"{mean_delay:>8.2f} f{latency * 1000:>9.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
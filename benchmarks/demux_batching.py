@@ -0,0 +1,190 @@
+"""Benchmark of the `DemuxMode`s.
+
+Feeds synthetic RTP packets to a gaze stream, consumed with `DataStream.decode`, and to a scene camera stream,
+consumed with `VideoStream.demux`, and reports the packets per second, the event loop CPU time per packet and the
+mean latency from when the last packet of an item is handed to the stream until the consumer takes the item with
+every demux mode, the best of three runs.
+
+The packets are handed to the stream in bursts from a loop callback, the way the transport delivers the datagrams
+that were read in one event loop iteration. The larger the bursts, the more a batched demuxer can take at once. The
+RTP queue holds all packets, so that none are dropped when the demuxer falls behind. Demuxing in the callback queues
+at most `FRAME_QUEUE_SIZE` access units though, so the oldest are dropped when a burst completes more than that, and
+the latency is the mean of the items which were taken.
+
+Usage: python benchmarks/demux_batching.py
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, List, Tuple
+
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import (
+    DataStream,
+    DemuxMode,
+    OverflowPolicy,
+    Stream,
+    StreamType,
+    VideoStream,
+)
+
+PACKET_COUNT = 20000
+REPEATS = 3
+BURST_SIZES = [1, 4, 16, 64]
+
+GAZE_SAMPLE = {
+    "gaze2d": [0.468, 0.483],
+    "gaze3d": [37.482, -7.186, 590.547],
+    "eyeleft": {
+        "gazeorigin": [29.841, -7.672, -24.012],
+        "gazedirection": [0.0614, -0.0842, 0.9946],
+        "pupildiameter": 2.632,
+    },
+    "eyeright": {
+        "gazeorigin": [-30.247, -7.408, -23.556],
+        "gazedirection": [0.0802, -0.0891, 0.9928],
+        "pupildiameter": 2.574,
+    },
+}
+
+
+class LoopbackTransport:
+    def subscribe(self, client: Any) -> None:
+        pass
+
+
+def rtp_packet(payload: bytes, seq: int, ts: int, marker: bool) -> Any:
+    rtp: Any = RTP()
+    rtp.pt = 96
+    rtp.seq = seq & 0xFFFF
+    rtp.ts = ts
+    rtp.m = int(marker)
+    rtp.data = payload
+    return RTP(bytes(rtp))
+
+
+def gaze_packets() -> Tuple[List[Any], int]:
+    payload = json.dumps(GAZE_SAMPLE).encode()
+    return [
+        rtp_packet(payload, seq, seq * 1800, True) for seq in range(PACKET_COUNT)
+    ], PACKET_COUNT
+
+
+def video_packets() -> Tuple[List[Any], int]:
+    """Parameter sets followed by an access unit every 4 packets, the first 3 with FU-A fragments and the last with
+    a single NAL unit."""
+    packets: List[Any] = [
+        rtp_packet(bytes([0x67, *os.urandom(10)]), 0, 0, False),
+        rtp_packet(bytes([0x68, *os.urandom(4)]), 1, 0, False),
+    ]
+    nal_header = 0x41
+    fragments = [
+        bytes([nal_header & 0xE0 | 28, fu_header, *os.urandom(1200)])
+        for fu_header in [0x80 | 1, 1, 0x40 | 1]
+    ]
+    access_unit_count = PACKET_COUNT // 4
+    for i in range(access_unit_count):
+        ts = i * 3600
+        for j, fragment in enumerate(fragments):
+            packets.append(rtp_packet(fragment, 2 + 4 * i + j, ts, False))
+        packets.append(
+            rtp_packet(bytes([nal_header, *os.urandom(300)]), 2 + 4 * i + 3, ts, True)
+        )
+    return packets, access_unit_count
+
+
+async def run(
+    stream: Stream,
+    packets: List[Any],
+    item_count: int,
+    last_packet_index: Callable[[int, Any], int],
+    burst_size: int,
+) -> Tuple[float, float, float, int]:
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    position = 0
+    fed = [0.0] * len(packets)
+    latencies: List[float] = []
+
+    def feed():
+        nonlocal position
+        for i, packet in enumerate(packets[position : position + burst_size]):
+            fed[position + i] = time.perf_counter()
+            stream.handle_rtp(packet)
+        position += burst_size
+        if position < len(packets):
+            loop.call_soon(feed)
+
+    async with (
+        stream.decode() if isinstance(stream, DataStream) else stream.demux()
+    ) as queue:
+
+        async def consumer():
+            while True:
+                # Items are only dropped when the queue is full, so the remaining items are always queued
+                if (
+                    queue.empty()
+                    and len(latencies) + stream.stats["demux_dropped_count"]
+                    >= item_count
+                ):
+                    break
+                item = await queue.get()
+                latencies.append(
+                    time.perf_counter() - fed[last_packet_index(len(latencies), item)]
+                )
+            done.set_result(None)
+
+        consumer_task = asyncio.create_task(consumer())
+        t0 = time.perf_counter()
+        cpu0 = time.process_time()
+        loop.call_soon(feed)
+        await done
+        elapsed = time.perf_counter() - t0
+        cpu_time = time.process_time() - cpu0
+        await consumer_task
+    stats = stream.stats
+    return (
+        len(packets) / elapsed,
+        cpu_time / len(packets),
+        sum(latencies) / len(latencies),
+        int(stats["dropped_count"] + stats["demux_dropped_count"]),
+    )
+
+
+async def main() -> None:
+    for name, stream_class, stream_type, (packets, item_count), last_packet_index in [
+        ("gaze decode", DataStream, StreamType.GAZE, gaze_packets(), lambda i, _: i),
+        (
+            "video demux",
+            VideoStream,
+            StreamType.SCENE_CAMERA,
+            video_packets(),
+            lambda _, item: 2 + 4 * (item[0].rtp_timestamp // 3600) + 3,
+        ),
+    ]:
+        print(f"{name}: {len(packets)} packets, {item_count} items")
+        print(
+            f"{'mode':<12}{'burst':>6}{'packets/s':>12}{'cpu/packet':>14}{'latency':>13}{'dropped':>9}"
+        )
+        for burst_size in BURST_SIZES:
+            for demux_mode in DemuxMode:
+                results: List[Tuple[float, float, float, int]] = []
+                for _ in range(REPEATS):
+                    stream = stream_class(LoopbackTransport(), stream_type, jitter_buffer_latency=None, overflow_policy=OverflowPolicy.DROP_OLDEST, rtp_queue_size=len(packets), demux_mode=demux_mode)  # type: ignore
+                    results.append(
+                        await run(
+                            stream, packets, item_count, last_packet_index, burst_size
+                        )
+                    )
+                packets_per_second, cpu_per_packet, latency, dropped = max(results)
+                print(
+                    f"{demux_mode.name:<12}{burst_size:>6}{packets_per_second:>12,.0f}"
+                    f"{cpu_per_packet * 1e6:>11.2f} us{latency * 1e6:>10.1f} us{dropped:>9}"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
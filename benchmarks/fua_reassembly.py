@@ -0,0 +1,128 @@
+"""Micro-benchmark of the path from the RTP payloads of an access unit to the packet passed to the decoder.
+
+Splits synthetic NAL units of a large IDR slice and smaller P slices into FU-As, preceded by an SPS and a PPS in
+single NAL unit packets, and turns the payloads into an `av.Packet` both the way `VideoStream` used to, reassembling
+each fragmented NAL unit with a new bytearray and slice per fragment, joining the NAL units of the access unit and
+copying the result into the packet, and with a `FUAReassemblyBuffer` and `AccessUnit.to_packet`. Reports the number
+of bytes copied per access unit, relative to its size, and the time spent per access unit, the best of `REPEATS`
+runs.
+"""
+
+import os
+import time
+from typing import Any, List, Tuple
+
+import av  # type: ignore
+
+from g3pylib.streams import FUA, AccessUnit, FUAReassemblyBuffer, NALUnit
+
+FRAME_SIZES = [300_000, 20_000, 3_000]
+FRAGMENT_SIZE = 1400
+FRAMES = 200
+REPEATS = 5
+
+SPS = bytes([0x67]) + os.urandom(10)
+PPS = bytes([0x68]) + os.urandom(4)
+
+
+def fragment(nal_unit: bytes, fragment_size: int) -> List[bytes]:
+    header, payload = nal_unit[0], nal_unit[1:]
+    fu_indicator = header & 0b11100000 | 28
+    chunks = [
+        payload[i : i + fragment_size] for i in range(0, len(payload), fragment_size)
+    ]
+    fragments: List[bytes] = []
+    for i, chunk in enumerate(chunks):
+        fu_header = header & 0b00011111
+        if i == 0:
+            fu_header |= 0b10000000
+        if i == len(chunks) - 1:
+            fu_header |= 0b01000000
+        fragments.append(bytes([fu_indicator, fu_header]) + chunk)
+    return fragments
+
+
+def packet_with_copies(rtp_payloads: List[bytes]) -> Tuple[Any, int]:
+    copied = 0
+    nal_units: List[bytes] = []
+    data = bytearray()
+    for rtp_payload in rtp_payloads:
+        nal_unit = NALUnit.from_rtp_payload(rtp_payload)
+        if not isinstance(nal_unit, FUA):
+            nal_units.append(b"\x00\x00\x01" + nal_unit.data)
+            copied += len(nal_units[-1])
+            continue
+        fu_a_data = bytearray(nal_unit.data)
+        copied += len(fu_a_data)
+        payload = fu_a_data[2:]
+        copied += len(payload)
+        if nal_unit.s:
+            data = bytearray([nal_unit.original_header])
+        data += payload
+        copied += len(payload)
+        if nal_unit.e:
+            nal_units.append(b"\x00\x00\x01" + data)
+            copied += len(nal_units[-1])
+    access_unit_data = b"".join(nal_units)
+    copied += len(access_unit_data)
+    packet = av.Packet(access_unit_data)  # type: ignore
+    copied += packet.size
+    return packet, copied
+
+
+def packet_with_views(
+    rtp_payloads: List[bytes], buffer: FUAReassemblyBuffer
+) -> Tuple[Any, int]:
+    access_unit = AccessUnit(0)
+    for rtp_payload in rtp_payloads:
+        nal_unit = NALUnit.from_rtp_payload(rtp_payload)
+        if not isinstance(nal_unit, FUA):
+            access_unit.nal_units.append(nal_unit)
+            continue
+        if nal_unit.s:
+            buffer.start(nal_unit)
+        else:
+            buffer.append(nal_unit)
+        if nal_unit.e:
+            access_unit.nal_units.append(buffer.finish())
+    packet = access_unit.to_packet()
+    # Joined into the data of the access unit and copied into the packet
+    return packet, 2 * packet.size
+
+
+def main():
+    buffer = FUAReassemblyBuffer()
+    for frame_size in FRAME_SIZES:
+        nal_unit = bytes([0x65]) + os.urandom(frame_size - 1)
+        rtp_payloads = [SPS, PPS, *fragment(nal_unit, FRAGMENT_SIZE)]
+        print(
+            f"Access unit with a NAL unit of {frame_size} bytes in {len(rtp_payloads) - 2} FU-As of "
+            f"{FRAGMENT_SIZE} bytes"
+        )
+
+        legacy_time = views_time = float("inf")
+        for _ in range(REPEATS):
+            t0 = time.perf_counter()
+            for _ in range(FRAMES):
+                legacy_packet, legacy_copied = packet_with_copies(rtp_payloads)
+            legacy_time = min(legacy_time, (time.perf_counter() - t0) / FRAMES)
+
+            t0 = time.perf_counter()
+            for _ in range(FRAMES):
+                packet, copied = packet_with_views(rtp_payloads, buffer)
+            views_time = min(views_time, (time.perf_counter() - t0) / FRAMES)
+
+        assert bytes(packet) == bytes(legacy_packet)
+        size = packet.size
+        print(
+            f"  Per-fragment copies: {legacy_copied} bytes copied ({legacy_copied / size:.2f}x), "
+            f"{legacy_time * 1e6:.1f} us"
+        )
+        print(
+            f"  Fragment views:      {copied} bytes copied ({copied / size:.2f}x), "
+            f"{views_time * 1e6:.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
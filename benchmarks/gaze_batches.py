@@ -0,0 +1,170 @@
+"""Benchmark of decoding gaze samples into dicts and into columnar batches.
+
+Hands synthetic RTP packets with gaze samples to a gaze stream and consumes all of them with `DataStream.decode`,
+one dict per sample, and with `DataStream.decode_batches`, one structured array per batch. With `decode`, the
+samples are either only taken or also collected into one NumPy array per field every `DEFAULT_BATCH_SIZE` samples,
+the way a consumer of the dicts would. Reports the samples per second and the CPU time per sample, the best of
+`REPEATS` runs. Also times `ColumnarSchema.to_array` on its own against the way it used to fill the array, one record
+and field at a time.
+
+Usage: python benchmarks/gaze_batches.py
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import (
+    DEFAULT_BATCH_SIZE,
+    GAZE_SCHEMA,
+    ColumnarSchema,
+    DataStream,
+    StreamType,
+)
+
+SAMPLE_COUNT = 20000
+BATCH_SIZES = [10, 100, 1000]
+REPEATS = 5
+
+GAZE_SAMPLE = {
+    "gaze2d": [0.468, 0.483],
+    "gaze3d": [37.482, -7.186, 590.547],
+    "eyeleft": {
+        "gazeorigin": [29.841, -7.672, -24.012],
+        "gazedirection": [0.0614, -0.0842, 0.9946],
+        "pupildiameter": 2.632,
+    },
+    "eyeright": {
+        "gazeorigin": [-30.247, -7.408, -23.556],
+        "gazedirection": [0.0802, -0.0891, 0.9928],
+        "pupildiameter": 2.574,
+    },
+}
+
+
+class LoopbackTransport:
+    def subscribe(self, client: Any) -> None:
+        pass
+
+
+def gaze_packets() -> List[Any]:
+    payload = json.dumps(GAZE_SAMPLE).encode()
+    packets: List[Any] = []
+    for seq in range(SAMPLE_COUNT):
+        rtp: Any = RTP()
+        rtp.pt = 96
+        rtp.seq = seq & 0xFFFF
+        rtp.ts = seq * 1800
+        rtp.m = 1
+        rtp.data = payload
+        packets.append(RTP(bytes(rtp)))
+    return packets
+
+
+def to_array_per_record(
+    schema: ColumnarSchema, samples: List[Tuple[Any, Optional[float]]]
+) -> np.ndarray:
+    """`ColumnarSchema.to_array` as it used to be, setting every field of every record."""
+    array = np.empty(len(samples), dtype=schema.dtype)
+    for name in schema.dtype.names:  # type: ignore
+        if name not in schema._presence_fields:  # type: ignore
+            array[name] = np.nan
+    for record, (sample, timestamp) in zip(array, samples):
+        record["timestamp"] = np.nan if timestamp is None else timestamp
+        for name, path in schema._fields:  # type: ignore
+            value = sample
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if name in schema._presence_fields:  # type: ignore
+                record[name] = value is not None
+            elif value is not None:
+                record[name] = value
+    return array
+
+
+def dicts_to_arrays(samples: List[Any]) -> Dict[str, np.ndarray]:
+    arrays: Dict[str, np.ndarray] = {}
+    for name, path in GAZE_SCHEMA._fields:  # type: ignore
+        values: List[Any] = []
+        for sample in samples:
+            for key in path:
+                sample = sample.get(key) if isinstance(sample, dict) else None
+            values.append(sample)
+        arrays[name] = np.array(values)
+    return arrays
+
+
+async def run(
+    packets: List[Any], batch_size: Optional[int], to_arrays: bool
+) -> Tuple[float, float]:
+    stream = DataStream(LoopbackTransport(), StreamType.GAZE, jitter_buffer_latency=None, rtp_queue_size=len(packets))  # type: ignore
+    for packet in packets:
+        stream.handle_rtp(packet)
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    if batch_size is None:
+        async with stream.decode() as queue:
+            samples: List[Any] = []
+            for _ in range(len(packets)):
+                sample, _ = await queue.get()
+                if to_arrays:
+                    samples.append(sample)
+                    if len(samples) == DEFAULT_BATCH_SIZE:
+                        dicts_to_arrays(samples)
+                        samples = []
+    else:
+        async with stream.decode_batches(batch_size) as queue:
+            count = 0
+            while count < len(packets):
+                count += len(await queue.get())
+    elapsed = time.perf_counter() - t0
+    cpu_time = time.process_time() - cpu0
+    return len(packets) / elapsed, cpu_time / len(packets)
+
+
+def time_to_array(batch_size: int) -> Tuple[float, float]:
+    samples: List[Tuple[Any, Optional[float]]] = [
+        (GAZE_SAMPLE, i / 50) for i in range(batch_size)
+    ]
+    batches = SAMPLE_COUNT // batch_size
+    times: List[Tuple[float, float]] = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        for _ in range(batches):
+            to_array_per_record(GAZE_SCHEMA, samples)
+        t1 = time.perf_counter()
+        for _ in range(batches):
+            GAZE_SCHEMA.to_array(samples)
+        t2 = time.perf_counter()
+        times.append(((t1 - t0) / SAMPLE_COUNT, (t2 - t1) / SAMPLE_COUNT))
+    return min(t for t, _ in times), min(t for _, t in times)
+
+
+async def main() -> None:
+    packets = gaze_packets()
+    print(f"{SAMPLE_COUNT} gaze samples")
+    print(f"{'path':<24}{'samples/s':>12}{'cpu/sample':>14}")
+    for name, batch_size, to_arrays in [
+        ("decode", None, False),
+        ("decode + arrays", None, True),
+        *[(f"decode_batches({size})", size, False) for size in BATCH_SIZES],
+    ]:
+        samples_per_second, cpu_per_sample = max(
+            [await run(packets, batch_size, to_arrays) for _ in range(REPEATS)]
+        )
+        print(f"{name:<24}{samples_per_second:>12,.0f}{cpu_per_sample * 1e6:>11.2f} us")
+    print()
+    print(f"{'to_array batch':<24}{'per record':>14}{'per column':>14}")
+    for batch_size in BATCH_SIZES:
+        per_record, per_column = time_to_array(batch_size)
+        print(
+            f"{batch_size:<24}{per_record * 1e6:>11.2f} us{per_column * 1e6:>11.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
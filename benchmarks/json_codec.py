@@ -0,0 +1,67 @@
+"""Benchmark of the JSON codecs in `g3pylib.jsoncodec`.
+
+Decodes realistic gaze, IMU and property response messages, and encodes requests, with every available
+codec and reports the number of messages per second. Install orjson, for example with the `fast-json`
+extra, to compare it with the standard library.
+"""
+
+import time
+from typing import Any, Callable, List
+
+from g3pylib.jsoncodec import JSONCodec, OrjsonJSONCodec, StdlibJSONCodec
+
+DURATION = 1.0
+
+GAZE_SAMPLE = (
+    b'{"gaze2d":[0.468,0.483],"gaze3d":[37.482,-7.186,590.547],'
+    b'"eyeleft":{"gazeorigin":[29.841,-7.672,-24.012],"gazedirection":[0.0614,-0.0842,0.9946],"pupildiameter":2.632},'
+    b'"eyeright":{"gazeorigin":[-30.247,-7.408,-23.556],"gazedirection":[0.0802,-0.0891,0.9928],"pupildiameter":2.574}}'
+)
+IMU_SIGNAL = (
+    '{"signal":"rudimentary:imu","body":[{"type":"imu","timestamp":183.5562,'
+    '"data":{"accelerometer":[-0.2461,9.6848,0.6714],"gyroscope":[1.3542,-0.2145,0.7521]}}]}'
+)
+GAZE_SIGNAL = (
+    '{"signal":"rudimentary:gaze","body":[{"type":"gaze","timestamp":183.5521,"data":'
+    + GAZE_SAMPLE.decode()
+    + "}]}"
+)
+PROPERTY_RESPONSE = (
+    '{"id":42,"body":{"uuid":"f3d1d3a6-1c4e-4b6e-9a8a-8e2f3d1f7a10","name":"Recording 12",'
+    '"created":"2022-09-13T12:34:56.789Z","duration":123.456,"folder":"20220913T123456Z",'
+    '"gaze-samples":24690,"valid-gaze-samples":23012,"http-path":"/recordings/f3d1d3a6"}}'
+)
+REQUEST = {"path": "rudimentary.gaze-sample", "method": "GET", "id": 42}
+
+
+def rate(function: Callable[[], Any]) -> float:
+    count = 0
+    t0 = time.perf_counter()
+    while (elapsed := time.perf_counter() - t0) < DURATION:
+        for _ in range(1000):
+            function()
+        count += 1000
+    return count / elapsed
+
+
+def main() -> None:
+    codecs: List[JSONCodec] = [StdlibJSONCodec()]
+    try:
+        codecs.append(OrjsonJSONCodec())
+    except ImportError:
+        print("orjson is not installed")
+    print(f"{'message':<24}" + "".join(f"{codec.name:>14}" for codec in codecs))
+    for message_name, message in [
+        ("gaze sample (rtsp)", GAZE_SAMPLE),
+        ("gaze signal", GAZE_SIGNAL),
+        ("imu signal", IMU_SIGNAL),
+        ("property response", PROPERTY_RESPONSE),
+    ]:
+        rates = [rate(lambda: codec.loads(message)) for codec in codecs]
+        print(f"{message_name:<24}" + "".join(f"{r:>10.0f} m/s" for r in rates))
+    rates = [rate(lambda: codec.dumps(REQUEST)) for codec in codecs]
+    print(f"{'request (encode)':<24}" + "".join(f"{r:>10.0f} m/s" for r in rates))
+
+
+if __name__ == "__main__":
+    main()
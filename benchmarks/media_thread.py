@@ -0,0 +1,158 @@
+"""Benchmark of running a stream on a `MediaThread`.
+
+A sender process sends gaze RTP packets over UDP on the loopback interface at a steady rate while the main event
+loop is kept busy with CPU bound work, like a GUI that redraws, for part of every period. The packets are received by
+a gaze stream, decoded with `DataStream.decode` and consumed on the main loop, once with the socket and the stream on
+the main loop and once with them on a media thread, consumed through a `StreamProxy`.
+
+Reports how many of the sent packets were dropped by the kernel because the socket buffer was full, how many were
+dropped from the RTP queue and how many samples reached the consumer.
+
+Usage: python benchmarks/media_thread.py
+"""
+
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+from typing import Any, Optional, Tuple
+
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import DataStream, MediaThread, StreamProxy, StreamType
+
+PACKET_RATE = 4000
+DURATION = 5.0
+BUSY_PERIOD = 0.2
+BUSY_TIME = 0.1
+DRAIN_TIME = 0.5
+
+GAZE_SAMPLE = {
+    "gaze2d": [0.468, 0.483],
+    "gaze3d": [37.482, -7.186, 590.547],
+    "eyeleft": {
+        "gazeorigin": [29.841, -7.672, -24.012],
+        "gazedirection": [0.0614, -0.0842, 0.9946],
+        "pupildiameter": 2.632,
+    },
+    "eyeright": {
+        "gazeorigin": [-30.247, -7.408, -23.556],
+        "gazedirection": [0.0802, -0.0891, 0.9928],
+        "pupildiameter": 2.574,
+    },
+}
+
+
+class LoopbackTransport:
+    def subscribe(self, client: Any) -> None:
+        pass
+
+
+class RTPReceiver(asyncio.DatagramProtocol):
+    def __init__(self, stream: DataStream) -> None:
+        self.stream = stream
+        self.received_count = 0
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        self.received_count += 1
+        self.stream.handle_rtp(RTP(data))
+
+
+def send(port: int, packet_count: int) -> None:
+    """Sends `packet_count` packets at `PACKET_RATE`, a millisecond worth at a time."""
+    payload = json.dumps(GAZE_SAMPLE).encode()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    t0 = time.perf_counter()
+    for seq in range(packet_count):
+        due = t0 + seq / PACKET_RATE
+        delay = due - time.perf_counter()
+        if delay > 0.001:
+            time.sleep(delay)
+        rtp: Any = RTP()
+        rtp.pt = 96
+        rtp.seq = seq & 0xFFFF
+        rtp.ts = seq * 90000 // PACKET_RATE
+        rtp.m = 1
+        rtp.data = payload
+        sender.sendto(bytes(rtp), ("127.0.0.1", port))
+    sender.close()
+
+
+async def create_receiver() -> Tuple[Any, RTPReceiver]:
+    stream = DataStream(LoopbackTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+    transport, receiver = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: RTPReceiver(stream), local_addr=("127.0.0.1", 0)
+    )
+    return transport, receiver
+
+
+async def busy_main_loop() -> None:
+    while True:
+        end = time.perf_counter() + BUSY_TIME
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(BUSY_PERIOD - BUSY_TIME)
+
+
+async def run(media_thread: Optional[MediaThread]) -> None:
+    if media_thread is None:
+        transport, receiver = await create_receiver()
+        stream: Any = receiver.stream
+    else:
+        transport, receiver = await media_thread.run(create_receiver())
+        stream = StreamProxy(receiver.stream, media_thread)
+    sock = transport.get_extra_info("socket")
+    port = sock.getsockname()[1]
+    receive_buffer_size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    packet_count = int(PACKET_RATE * DURATION)
+    consumed_count = 0
+    loop = asyncio.get_running_loop()
+    async with stream.decode() as json_queue:
+
+        async def consumer():
+            nonlocal consumed_count
+            while True:
+                await json_queue.get()
+                consumed_count += 1
+
+        consumer_task = asyncio.create_task(consumer())
+        busy_task = asyncio.create_task(busy_main_loop())
+        sender = multiprocessing.Process(target=send, args=(port, packet_count))
+        sender.start()
+        await loop.run_in_executor(None, sender.join)
+        busy_task.cancel()
+        await asyncio.sleep(DRAIN_TIME)
+        consumer_task.cancel()
+    if media_thread is None:
+        transport.close()
+    else:
+        media_thread.loop.call_soon_threadsafe(transport.close)
+    kernel_dropped = packet_count - receiver.received_count
+    queue_dropped = stream.stats["dropped_count"]
+    print(
+        f"{'media thread' if media_thread is not None else 'main loop':<14}{packet_count:>8}"
+        f"{kernel_dropped:>10} ({kernel_dropped / packet_count:>5.1%}){queue_dropped:>10}"
+        f"{consumed_count:>10}{receive_buffer_size:>12}"
+    )
+
+
+async def main() -> None:
+    print(
+        f"{PACKET_RATE} packets/s for {DURATION} s, main loop busy {BUSY_TIME * 1000:.0f} ms "
+        f"every {BUSY_PERIOD * 1000:.0f} ms"
+    )
+    print(
+        f"{'stream on':<14}{'sent':>8}{'kernel dropped':>19}{'queue dropped':>14}{'consumed':>10}"
+        f"{'rcvbuf':>12}"
+    )
+    await run(None)
+    media_thread = MediaThread()
+    try:
+        await run(media_thread)
+    finally:
+        await media_thread.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
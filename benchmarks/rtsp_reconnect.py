@@ -0,0 +1,271 @@
+"""Benchmark of reconnecting a stalled RTSP media session with `Streams.connect(auto_reconnect=True)`.
+
+A minimal stand-in RTSP server on the loopback interface serves a gaze stream at `GAZE_RATE` samples per second over
+UDP or interleaved TCP. While the gaze samples are consumed with `DataStream.decode`, the server simulates a dropout,
+either by silently stopping to send RTP packets or by closing the RTSP connection, and keeps serving new sessions.
+
+Reports, averaged over `REPEATS` dropouts, the time from the dropout until the session was reconnected, the gap in
+the stream from the last packet before the dropout until the first packet of the new session as found in
+`Streams.stats`, and the longest interval between two consumed samples.
+
+Usage: python benchmarks/rtsp_reconnect.py
+"""
+
+import asyncio
+import json
+import socket
+import struct
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, cast
+
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import Streams
+
+GAZE_RATE = 100
+STALL_TIMEOUT = 0.5
+REPEATS = 5
+SETTLE_TIME = 1.0
+
+GAZE_SAMPLE = json.dumps(
+    {
+        "gaze2d": [0.468, 0.483],
+        "gaze3d": [37.482, -7.186, 590.547],
+    }
+).encode()
+
+SDP = (
+    "v=0\r\n"
+    "o=- 0 0 IN IP4 127.0.0.1\r\n"
+    "s=Stand-in\r\n"
+    "c=IN IP4 0.0.0.0\r\n"
+    "t=0 0\r\n"
+    "m=application 0 RTP/AVP 98\r\n"
+    "a=rtpmap:98 com.tobii.g3api/90000\r\n"
+    "a=control:gaze\r\n"
+)
+
+
+class RTSPSession:
+    """A session of the stand-in server which sends gaze packets over UDP or interleaved TCP once playing."""
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.interleaved_channel: Optional[int] = None
+        self.client_address: Optional[Tuple[str, int]] = None
+        self.sender_task: Optional[asyncio.Task[None]] = None
+
+    async def send(self, udp_socket: Any) -> None:
+        loop = asyncio.get_running_loop()
+        seq = 0
+        t0 = time.monotonic()
+        while True:
+            rtp: Any = RTP()
+            rtp.pt = 98
+            rtp.seq = seq & 0xFFFF
+            rtp.ts = seq * 90000 // GAZE_RATE
+            rtp.m = 1
+            rtp.data = GAZE_SAMPLE
+            data = bytes(rtp)
+            if self.interleaved_channel is not None:
+                self.writer.write(
+                    struct.pack("!cBH", b"$", self.interleaved_channel, len(data))
+                    + data
+                )
+            elif self.client_address is not None:
+                await loop.sock_sendto(udp_socket, data, self.client_address)
+            seq += 1
+            await asyncio.sleep(max(0.0, t0 + seq / GAZE_RATE - time.monotonic()))
+
+    def stop(self) -> None:
+        if self.sender_task is not None:
+            self.sender_task.cancel()
+            self.sender_task = None
+
+
+class StandInServer:
+    """Answers the RTSP requests needed to set up, play and tear down a gaze session."""
+
+    def __init__(self) -> None:
+        self.sessions: Dict[asyncio.StreamWriter, RTSPSession] = {}
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.handlers: Set[asyncio.Task[Any]] = set()
+
+    async def start(self) -> int:
+        self.udp_socket.setblocking(False)
+        self.udp_socket.bind(("127.0.0.1", 0))
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.disconnect()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await asyncio.gather(*self.handlers)
+        self.udp_socket.close()
+
+    def stall(self) -> None:
+        """Stops sending RTP packets in all sessions without closing their connections."""
+        for session in self.sessions.values():
+            session.stop()
+
+    def disconnect(self) -> None:
+        """Closes the RTSP connections of all sessions."""
+        for writer, session in list(self.sessions.items()):
+            session.stop()
+            writer.close()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        session = self.sessions[writer] = RTSPSession(writer)
+        handler = cast(asyncio.Task[Any], asyncio.current_task())
+        self.handlers.add(handler)
+        try:
+            while True:
+                first = await reader.readexactly(1)
+                if first == b"$":
+                    _, length = struct.unpack("!BH", await reader.readexactly(3))
+                    await reader.readexactly(length)
+                    continue
+                head = first + await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode().split("\r\n")
+                headers = {
+                    name.strip().lower(): value.strip()
+                    for name, _, value in (
+                        line.partition(":") for line in header_lines if line
+                    )
+                }
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                method, url, _ = request_line.split(" ")
+                writer.write(self.respond(session, method, url, headers, writer))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            session.stop()
+            del self.sessions[writer]
+            self.handlers.discard(handler)
+            writer.close()
+
+    def respond(
+        self,
+        session: RTSPSession,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        writer: asyncio.StreamWriter,
+    ) -> bytes:
+        response_headers = [f"CSeq: {headers.get('cseq', '0')}"]
+        body = ""
+        match method:
+            case "OPTIONS":
+                response_headers.append(
+                    "Public: OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN, GET_PARAMETER"
+                )
+            case "DESCRIBE":
+                response_headers += [
+                    "Content-Type: application/sdp",
+                    f"Content-Base: {url}/",
+                ]
+                body = SDP
+            case "SETUP":
+                transport = headers["transport"]
+                fields = dict(
+                    field.partition("=")[::2] for field in transport.split(";")
+                )
+                if "interleaved" in fields:
+                    session.interleaved_channel = int(
+                        fields["interleaved"].split("-")[0]
+                    )
+                else:
+                    host = writer.get_extra_info("peername")[0]
+                    session.client_address = (
+                        host,
+                        int(fields["client_port"].split("-")[0]),
+                    )
+                    server_port = self.udp_socket.getsockname()[1]
+                    transport += f";server_port={server_port}-{server_port + 1}"
+                response_headers += [
+                    f"Transport: {transport}",
+                    f"Session: {id(session) & 0xFFFFFFFF:08X};timeout=60",
+                ]
+            case "PLAY":
+                if session.sender_task is None:
+                    session.sender_task = asyncio.create_task(
+                        session.send(self.udp_socket)
+                    )
+                response_headers.append(f"Session: {id(session) & 0xFFFFFFFF:08X}")
+            case "TEARDOWN":
+                session.stop()
+            case _:
+                pass
+        if body:
+            response_headers.append(f"Content-Length: {len(body)}")
+        return (
+            "RTSP/1.0 200 OK\r\n"
+            + "".join(f"{h}\r\n" for h in response_headers)
+            + "\r\n"
+            + body
+        ).encode()
+
+
+async def run(scheme: str, dropout: str) -> None:
+    server = StandInServer()
+    port = await server.start()
+    reconnect_times: List[float] = []
+    consumed_times: List[float] = []
+    try:
+        async with Streams.connect(
+            f"{scheme}://127.0.0.1:{port}/live/all",
+            scene_camera=False,
+            gaze=True,
+            jitter_buffer_latency=None,
+            auto_reconnect=True,
+            stall_timeout=STALL_TIMEOUT,
+        ) as streams:
+            await streams.play()
+            async with streams.gaze.decode() as gaze_queue:
+
+                async def consumer():
+                    while True:
+                        await gaze_queue.get()
+                        consumed_times.append(time.monotonic())
+
+                consumer_task = asyncio.create_task(consumer())
+                await asyncio.sleep(SETTLE_TIME)
+                for i in range(REPEATS):
+                    dropout_time = time.monotonic()
+                    getattr(server, dropout)()
+                    while streams.reconnect_count <= i:
+                        await asyncio.sleep(0.001)
+                    reconnect_times.append(time.monotonic() - dropout_time)
+                    await asyncio.sleep(SETTLE_TIME)
+                consumer_task.cancel()
+            stats = streams.stats
+    finally:
+        await server.stop()
+    longest_interval = max(b - a for a, b in zip(consumed_times, consumed_times[1:]))
+    print(
+        f"{scheme:<8}{dropout:<12}{sum(reconnect_times) / len(reconnect_times) * 1000:>12.1f} ms"
+        f"{stats['mean_gap_duration'] * 1000:>10.1f} ms{longest_interval * 1000:>12.1f} ms"
+    )
+
+
+async def main() -> None:
+    print(
+        f"{GAZE_RATE} gaze samples/s, stall timeout {STALL_TIMEOUT * 1000:.0f} ms, "
+        f"{REPEATS} dropouts"
+    )
+    print(
+        f"{'scheme':<8}{'dropout':<12}{'reconnect':>15}{'gap':>13}{'max interval':>15}"
+    )
+    for scheme in ["rtsp", "rtspt"]:
+        for dropout in ["stall", "disconnect"]:
+            await run(scheme, dropout)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""Benchmark of moving a video stream to a new RTSP media session while packets of the previous session are queued.
+
+Feeds the packets of a keyframe and `backlog` further access units of a synthetic H.264 stream to a `VideoStream`
+without letting the demuxer run, moves the stream to a new transport with `attach_transport`, as `Streams.reconnect`
+does, and feeds the packets of a new session from another sender, a P frame followed by a keyframe. Reports how many
+access units of the previous session were demuxed, the time from the first packet of the new session until the
+keyframe request was sent to its sender and the time from the last packet of the new keyframe until the demuxer
+delivered it, which includes demuxing the backlog, the best of `REPEATS` runs.
+
+Usage: python benchmarks/session_switch.py
+"""
+
+import asyncio
+import os
+import struct
+import time
+from types import SimpleNamespace
+from typing import Any, List, Tuple
+
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import StreamType, VideoStream
+
+BACKLOGS = [0, 10, 100, 1000]
+REPEATS = 5
+OLD_SSRC = 0x22222222
+NEW_SSRC = 0x33333333
+NEW_RTP_TIMESTAMP = 0x40000000
+
+
+class LoopbackTransport:
+    def __init__(self) -> None:
+        self.stats = SimpleNamespace(ssrc=0x11111111, build_rtcp=lambda: None)
+        self.keyframe_requests: List[Tuple[float, int]] = []
+
+    def subscribe(self, client: Any) -> None:
+        pass
+
+    def unsubscribe(self, client: Any) -> None:
+        pass
+
+    async def send_rtcp_report(self, rtcp: Any) -> None:
+        media_ssrc = struct.unpack("!I", bytes(rtcp)[-4:])[0]
+        self.keyframe_requests.append((time.perf_counter(), media_ssrc))
+
+
+def rtp_packet(payload: bytes, seq: int, ts: int, marker: bool, ssrc: int) -> Any:
+    rtp: Any = RTP()
+    rtp.pt = 96
+    rtp.ssrc = ssrc
+    rtp.seq = seq & 0xFFFF
+    rtp.ts = ts
+    rtp.m = int(marker)
+    rtp.data = payload
+    return RTP(bytes(rtp))
+
+
+def access_unit_packets(
+    nal_header: int, seq: int, ts: int, ssrc: int, fragment_count: int = 3
+) -> List[Any]:
+    """An access unit of a single NAL unit in FU-A fragments of 1200 bytes."""
+    fu_headers = [nal_header & 0x1F for _ in range(3)]
+    fu_headers[0] |= 0x80
+    fu_headers[-1] |= 0x40
+    return [
+        rtp_packet(
+            bytes([nal_header & 0xE0 | 28, fu_header, *os.urandom(1200)]),
+            seq + i,
+            ts,
+            i == 2,
+            ssrc,
+        )
+        for i, fu_header in enumerate(fu_headers[:fragment_count])
+    ]
+
+
+def old_session_packets(backlog: int) -> List[Any]:
+    """Parameter sets, a keyframe, `backlog` P frames and the first fragment of another P frame."""
+    packets = [
+        rtp_packet(bytes([0x67, *os.urandom(10)]), 0, 0, False, OLD_SSRC),
+        rtp_packet(bytes([0x68, *os.urandom(4)]), 1, 0, False, OLD_SSRC),
+        *access_unit_packets(0x65, 2, 0, OLD_SSRC),
+    ]
+    for i in range(1, backlog + 2):
+        packets.extend(
+            access_unit_packets(
+                0x41, len(packets), 3600 * i, OLD_SSRC, 3 if i <= backlog else 1
+            )
+        )
+    return packets
+
+
+async def run(backlog: int) -> Tuple[int, float, float]:
+    old_packets = old_session_packets(backlog)
+    new_packets = [
+        *access_unit_packets(0x41, 1000, NEW_RTP_TIMESTAMP, NEW_SSRC),
+        *access_unit_packets(0x65, 1003, NEW_RTP_TIMESTAMP + 3600, NEW_SSRC),
+    ]
+    stream = VideoStream(
+        LoopbackTransport(),  # type: ignore
+        StreamType.SCENE_CAMERA,
+        jitter_buffer_latency=None,
+        rtp_queue_size=len(old_packets) + len(new_packets),
+    )
+    old_count = 0
+    async with stream.demux() as access_unit_queue:
+        for packet in old_packets:
+            stream.handle_rtp(packet)
+        new_transport = LoopbackTransport()
+        stream.attach_transport(new_transport)  # type: ignore
+        first_packet_time = time.perf_counter()
+        stream.handle_rtp(new_packets[0])
+        while not new_transport.keyframe_requests:
+            await asyncio.sleep(0)
+        request_time, media_ssrc = new_transport.keyframe_requests[0]
+        assert media_ssrc == NEW_SSRC
+        for packet in new_packets[1:]:
+            stream.handle_rtp(packet)
+        keyframe_fed_time = time.perf_counter()
+        while True:
+            access_unit, _ = await access_unit_queue.get()
+            if access_unit.rtp_timestamp < NEW_RTP_TIMESTAMP:
+                old_count += 1
+                continue
+            assert access_unit.is_keyframe
+            keyframe_time = time.perf_counter()
+            break
+    return (
+        old_count,
+        request_time - first_packet_time,
+        keyframe_time - keyframe_fed_time,
+    )
+
+
+async def main() -> None:
+    print(
+        f"{'backlog':>8}{'old demuxed':>13}{'keyframe request':>18}{'new keyframe':>14}"
+    )
+    for backlog in BACKLOGS:
+        results = [await run(backlog) for _ in range(REPEATS)]
+        old_count = min(old_count for old_count, _, _ in results)
+        request_delay = min(request_delay for _, request_delay, _ in results)
+        keyframe_latency = min(latency for _, _, latency in results)
+        print(
+            f"{backlog:>8}{f'{old_count}/{backlog + 1}':>13}{request_delay * 1e6:>15.1f} us"
+            f"{keyframe_latency * 1e3:>11.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
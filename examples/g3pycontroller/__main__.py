@@ -475,13 +475,14 @@ class G3App(App, ScreenManager):
     def start_live_stream(self, g3: Glasses3) -> None:
         async def live_stream():
             async with g3.stream_rtsp(scene_camera=True, gaze=True) as streams:
-                async with streams.scene_camera.decode() as scene_stream, streams.gaze.decode() as gaze_stream:
+                async with streams.synchronize_gaze(
+                    format="bgr24", flip=True
+                ) as synchronizer:
                     live_screen = self.get_screen("control").ids.sm.get_screen("live")
                     Window.bind(on_resize=live_screen.clear)
-                    self.latest_frame_with_timestamp = await scene_stream.get()
-                    self.latest_gaze_with_timestamp = await gaze_stream.get()
+                    await read_frame(synchronizer)
                     self.read_frames_task = self.create_task(
-                        update_frame(scene_stream, gaze_stream, streams),
+                        update_frame(synchronizer, streams),
                         name="update_frame",
                     )
                     if self.live_gaze_circle is None:
@@ -498,24 +499,17 @@ class G3App(App, ScreenManager):
                     )
                     await self.read_frames_task
 
-        async def update_frame(scene_stream, gaze_stream, streams):
+        async def read_frame(synchronizer):
+            (frame, _gaze_samples, gaze), timestamp = await synchronizer.get()
+            self.latest_frame_with_timestamp = (frame, timestamp)
+            self.latest_gaze_with_timestamp = (
+                gaze if gaze is not None else {},
+                timestamp,
+            )
+
+        async def update_frame(synchronizer, streams):
             while True:
-                latest_frame_with_timestamp = await scene_stream.get()
-                latest_gaze_with_timestamp = await gaze_stream.get()
-                while (
-                    latest_gaze_with_timestamp[1] is None
-                    or latest_frame_with_timestamp[1] is None
-                ):
-                    if latest_frame_with_timestamp[1] is None:
-                        latest_frame_with_timestamp = await scene_stream.get()
-                    if latest_gaze_with_timestamp[1] is None:
-                        latest_gaze_with_timestamp = await gaze_stream.get()
-                while latest_gaze_with_timestamp[1] < latest_frame_with_timestamp[1]:
-                    latest_gaze_with_timestamp = await gaze_stream.get()
-                    while latest_gaze_with_timestamp[1] is None:
-                        latest_gaze_with_timestamp = await gaze_stream.get()
-                self.latest_frame_with_timestamp = latest_frame_with_timestamp
-                self.latest_gaze_with_timestamp = latest_gaze_with_timestamp
+                await read_frame(synchronizer)
                 logging.debug(streams.scene_camera.stats)
 
         def draw_frame(dt):
@@ -529,9 +523,7 @@ class G3App(App, ScreenManager):
                 )
                 return
             display = self.get_screen("control").ids.sm.get_screen("live").ids.display
-            image = np.flip(
-                self.latest_frame_with_timestamp[0].to_ndarray(format="bgr24"), 0
-            )
+            image = self.latest_frame_with_timestamp[0]
             texture = Texture.create(
                 size=(image.shape[1], image.shape[0]), colorfmt="bgr"
             )
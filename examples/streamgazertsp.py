@@ -15,26 +15,14 @@ async def stream_rtsp():
         os.environ["G3_HOSTNAME"], using_zeroconf=True
     ) as g3:
         async with g3.stream_rtsp(scene_camera=True, gaze=True) as streams:
-            async with streams.gaze.decode() as gaze_stream, streams.scene_camera.decode() as scene_stream:
+            async with streams.synchronize_gaze(format="bgr24") as synchronizer:
                 for i in range(200):
-                    frame, frame_timestamp = await scene_stream.get()
-                    gaze, gaze_timestamp = await gaze_stream.get()
-                    while gaze_timestamp is None or frame_timestamp is None:
-                        if frame_timestamp is None:
-                            frame, frame_timestamp = await scene_stream.get()
-                        if gaze_timestamp is None:
-                            gaze, gaze_timestamp = await gaze_stream.get()
-                    while gaze_timestamp < frame_timestamp:
-                        gaze, gaze_timestamp = await gaze_stream.get()
-                        while gaze_timestamp is None:
-                            gaze, gaze_timestamp = await gaze_stream.get()
-
+                    synchronized_frame, frame_timestamp = await synchronizer.get()
+                    frame, _gaze_samples, gaze = synchronized_frame
                     logging.info(f"Frame timestamp: {frame_timestamp}")
-                    logging.info(f"Gaze timestamp: {gaze_timestamp}")
-                    frame = frame.to_ndarray(format="bgr24")
 
                     # If given gaze data
-                    if "gaze2d" in gaze:
+                    if isinstance(gaze, dict) and "gaze2d" in gaze:
                         gaze2d = gaze["gaze2d"]
                         logging.info(f"Gaze2d: {gaze2d[0]:9.4f},{gaze2d[1]:9.4f}")
 
@@ -21,9 +21,20 @@ The default hostname of a Glasses3 device is its serial number.
 from __future__ import annotations
 
 import logging
+from concurrent.futures import Executor
 from contextlib import asynccontextmanager
 from types import TracebackType
-from typing import Any, AsyncIterator, Coroutine, Generator, Optional, Tuple, Type, cast
+from typing import (
+    Any,
+    AsyncIterator,
+    Coroutine,
+    Dict,
+    Generator,
+    Optional,
+    Tuple,
+    Type,
+    cast,
+)
 
 
 import g3pylib.websocket
@@ -35,7 +46,18 @@ from g3pylib.recorder import Recorder
 from g3pylib.recordings import Recordings
 from g3pylib.rudimentary import Rudimentary
 from g3pylib.settings import Settings
-from g3pylib.streams import Streams
+from g3pylib.streams import (
+    DEFAULT_JITTER_BUFFER_LATENCY,
+    DEFAULT_STALL_TIMEOUT,
+    RTP_QUEUE_SIZE,
+    DecoderThreading,
+    DemuxMode,
+    KeyframeRequestKind,
+    OverflowPolicy,
+    Streams,
+    StreamType,
+    ThreadedStreams,
+)
 from g3pylib.system import System
 from g3pylib.websocket import G3WebSocketClientProtocol
 from g3pylib.zeroconf import DEFAULT_WEBSOCKET_PATH, G3Service, G3ServiceDiscovery
@@ -132,6 +154,21 @@ class Glasses3(APIComponent):
         sync: bool = False,
         imu: bool = False,
         events: bool = False,
+        decoder_executor: Optional[Executor] = None,
+        audio_decoder_executor: Optional[Executor] = None,
+        jitter_buffer_latency: Optional[float] = DEFAULT_JITTER_BUFFER_LATENCY,
+        keyframe_request: Optional[KeyframeRequestKind] = KeyframeRequestKind.PLI,
+        overflow_policies: Optional[Dict[StreamType, OverflowPolicy]] = None,
+        rtp_queue_size: int = RTP_QUEUE_SIZE,
+        adaptive_skipping: bool = False,
+        decoder_threading: Optional[Dict[StreamType, DecoderThreading]] = None,
+        decoder_thread_counts: Optional[Dict[StreamType, int]] = None,
+        demux_mode: DemuxMode = DemuxMode.BATCHED,
+        media_thread: bool = False,
+        receive_buffer_sizes: Optional[Dict[StreamType, int]] = None,
+        tcp_fallback: bool = False,
+        auto_reconnect: bool = False,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
     ) -> AsyncIterator[Streams]:
         """Set up an RTSP connection in the form of a Streams object with the Stream properties indicated by the arguments.
 
@@ -139,21 +176,60 @@ class Glasses3(APIComponent):
         ```python
         async with connect_to_glasses(g3_hostname) as g3:
             async with g3.stream_rtsp() as streams:
-                async with streams.scene_camera.decode() as decoded_stream:
+                async with streams.scene_camera.decode(format="bgr24") as decoded_stream:
                     for _ in range(500):
-                        frame, _timestamp = await decoded_stream.get()
-                        image = frame.to_ndarray(format="bgr24")
+                        image, _timestamp = await decoded_stream.get()
                         cv2.imshow("Video", image)
                         cv2.waitKey(1)
         ```
 
-        *Alpha version note:* Only the scene_camera, eye_camera and gaze attributes are implemented so far.
+        To keep video decoding from blocking the event loop, pass a thread based `decoder_executor`,
+        for example `concurrent.futures.ThreadPoolExecutor(max_workers=1)`. The audio stream decodes in a single
+        thread executor of its own, or in `audio_decoder_executor` if given.
+
+        `jitter_buffer_latency` is the time in seconds the streams wait for reordered RTP packets. Set it to `None`
+        to disable reordering.
+
+        `keyframe_request` is the kind of RTCP feedback used to request a keyframe after packet loss. Set it to `None`
+        to wait for the next scheduled keyframe instead.
+
+        Each stream queues at most `rtp_queue_size` RTP packets. What happens when a queue is full is decided per stream
+        type by `overflow_policies`, see `g3pylib.streams.OverflowPolicy`.
+
+        With `adaptive_skipping` the video decoders skip non-reference frames, or all frames but keyframes, while they
+        can't keep up with the stream. The current skip level and the number of skipped frames are found in the stats
+        of the video streams.
+
+        `decoder_threading` and `decoder_thread_counts` set how FFmpeg uses threads when decoding each video stream type,
+        see `g3pylib.streams.DecoderThreading`. By default the decoders use one thread per core without delaying frames.
+
+        `demux_mode` selects whether the streams demux and decode one packet at a time or all available packets at once,
+        or whether the packets are demuxed as they are received, see `g3pylib.streams.DemuxMode`.
+
+        If `media_thread` is `True`, the RTSP session, including the transports, demuxers and decoders, runs on a
+        dedicated thread with its own event loop, so that a busy application event loop doesn't delay reading the
+        sockets. The streams are then `g3pylib.streams.StreamProxy` objects which deliver their queues to the calling
+        loop, see `g3pylib.streams.ThreadedStreams`.
+
+        `receive_buffer_sizes` sets the size in bytes of the UDP receive buffer of each stream type, which has to hold
+        the packets of a whole keyframe when they arrive faster than they are read. The effective sizes and the number
+        of datagrams dropped by the kernel are found in the stats of the streams.
+
+        With `tcp_fallback` the session is moved to interleaved TCP if sustained packet loss is detected over UDP,
+        see `g3pylib.streams.Streams.switch_transport`.
+
+        With `auto_reconnect` the session is re-established with the same streams when the RTSP connection is lost or no
+        RTP packets arrive for `stall_timeout` seconds. The stream queues are kept, so consumers only see a gap. The
+        number of reconnects and the gap durations are found in `g3pylib.streams.Streams.stats`.
+
+        The gaze, sync, imu and events streams are `g3pylib.streams.DataStream` objects. The gaze and imu streams can
+        also be decoded into batches of NumPy arrays with `g3pylib.streams.DataStream.decode_batches`.
         """
         if self.rtsp_url is None:
             raise FeatureNotAvailableError(
                 "This Glasses3 object was initialized without a proper RTSP url."
             )
-        async with Streams.connect(
+        async with (ThreadedStreams if media_thread else Streams).connect(
             self.rtsp_url,
             scene_camera=scene_camera,
             audio=audio,
@@ -162,6 +238,20 @@ class Glasses3(APIComponent):
             sync=sync,
             imu=imu,
             events=events,
+            decoder_executor=decoder_executor,
+            audio_decoder_executor=audio_decoder_executor,
+            jitter_buffer_latency=jitter_buffer_latency,
+            keyframe_request=keyframe_request,
+            overflow_policies=overflow_policies,
+            rtp_queue_size=rtp_queue_size,
+            adaptive_skipping=adaptive_skipping,
+            decoder_threading=decoder_threading,
+            decoder_thread_counts=decoder_thread_counts,
+            demux_mode=demux_mode,
+            receive_buffer_sizes=receive_buffer_sizes,
+            tcp_fallback=tcp_fallback,
+            auto_reconnect=auto_reconnect,
+            stall_timeout=stall_timeout,
         ) as streams:
             await streams.play()
             yield streams
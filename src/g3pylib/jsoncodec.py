@@ -0,0 +1,94 @@
+"""The JSON codec used for websocket messages and data stream samples.
+
+[orjson](https://github.com/ijl/orjson) is used if it is installed, for example with the `fast-json` extra,
+and the standard library `json` module otherwise. Another codec can be selected with `set_codec`.
+"""
+
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Union, cast
+
+from g3pylib.g3typing import JSONObject
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+
+class JSONCodec(ABC):
+    """Decodes and encodes JSON messages."""
+
+    name: str
+    """The name of the codec."""
+
+    @abstractmethod
+    def loads(self, data: Union[str, bytes]) -> JSONObject:
+        """Should decode a JSON message and raise `json.JSONDecodeError` if it's invalid."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> str:
+        """Should encode an object as a JSON message."""
+        raise NotImplementedError
+
+
+class StdlibJSONCodec(JSONCodec):
+    """Uses the standard library `json` module."""
+
+    name = "json"
+
+    def loads(self, data: Union[str, bytes]) -> JSONObject:
+        return cast(JSONObject, json.loads(data))
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+
+class OrjsonJSONCodec(JSONCodec):
+    """Uses orjson, falling back to the standard library for messages orjson rejects but `json` accepts,
+    such as messages containing `NaN` or integers larger than 64 bits."""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("orjson is not installed.")
+
+    def loads(self, data: Union[str, bytes]) -> JSONObject:
+        try:
+            return cast(JSONObject, orjson.loads(data))  # type: ignore
+        except orjson.JSONDecodeError:  # type: ignore
+            return cast(JSONObject, json.loads(data))
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            return cast(bytes, orjson.dumps(obj)).decode()  # type: ignore
+        except TypeError:
+            return json.dumps(obj)
+
+
+_codec: JSONCodec = OrjsonJSONCodec() if orjson is not None else StdlibJSONCodec()
+
+
+def get_codec() -> JSONCodec:
+    """Returns the codec in use."""
+    return _codec
+
+
+def set_codec(codec: JSONCodec) -> None:
+    """Selects the codec to use from now on."""
+    global _codec
+    _codec = codec
+
+
+def loads(data: Union[str, bytes]) -> JSONObject:
+    """Decodes a JSON message with the codec in use. Raises `json.JSONDecodeError` if the message is invalid."""
+    return _codec.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encodes an object as a JSON message with the codec in use."""
+    return _codec.dumps(obj)
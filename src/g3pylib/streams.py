@@ -1,22 +1,50 @@
-"""
-*Alpha version note:* Only the scene_camera, eye_camera and gaze attributes are implemented so far.
+"""The RTSP media streams of a Glasses3 device.
+
+`Streams` sets up a session with the scene camera, audio and eye cameras streams, which are decoded with PyAV, and the
+gaze, sync-port, IMU and events data streams, whose JSON samples are decoded with `g3pylib.jsoncodec`.
 """
 
 from __future__ import annotations
 
 import asyncio
-import functools
-import json
+import base64
+import bisect
+import itertools
 import logging
+import math
+import socket
+import struct
+import sys
+import threading
+import time
 from abc import ABC, abstractmethod, abstractproperty
-from contextlib import AsyncExitStack, asynccontextmanager
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
 from enum import Enum, auto
-from functools import cached_property
-from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Union, cast
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Deque,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 from urllib.parse import urlparse
 
 import av  # type: ignore
-from aiortsp.rtcp.parser import RTCP, SR  # type: ignore
+import numpy as np
+from aiortsp.rtcp.parser import RTCP, SR, RTCPPacket  # type: ignore
 from aiortsp.rtsp.connection import RTSPConnection  # type: ignore
 from aiortsp.rtsp.session import (  # type: ignore
     MediaStreamConfiguration,
@@ -30,16 +58,49 @@ from aiortsp.transport import (  # type: ignore
 )
 from dpkt.rtp import RTP  # type: ignore
 
-from g3pylib import _utils
+from g3pylib import _utils, jsoncodec
 from g3pylib.g3typing import JSONObject
 
 TIMESTAMP_GRANULARITY = 90000
 FRAME_QUEUE_SIZE = 10
 DATA_QUEUE_SIZE = 100
+AUDIO_QUEUE_SIZE = 50
+SUBSCRIBER_QUEUE_SIZE = 10
+MAX_DEMUX_BATCH_SIZE = 64
+BATCH_QUEUE_SIZE = 10
+GAZE_BUFFER_SIZE = 1000
+DEFAULT_BATCH_SIZE = 100
 RTCP_QUEUE_SIZE = 100
+RTP_QUEUE_SIZE = 2000
+DEFAULT_JITTER_BUFFER_LATENCY = 0.05
+KEYFRAME_REQUEST_INTERVAL = 0.5
+JITTER_BUFFER_MAX_PACKETS = 1000
+JITTER_BUFFER_MAX_MISORDER = 100
+JITTER_BUFFER_MAX_DROPOUT = 3000
+CLOCK_MODEL_WINDOW = 32
+MAX_CLOCK_DRIFT = 0.001
+MAX_CLOCK_SLEW = 0.1
+CLOCK_SLEW_DURATION = 1.0
+UDP_LOSS_CHECK_INTERVAL = 1.0
+UDP_LOSS_THRESHOLD = 0.02
+UDP_LOSS_CHECK_COUNT = 5
+DEFAULT_STALL_TIMEOUT = 2.0
+RECONNECT_INTERVAL = 0.5
+MAX_RECONNECT_INTERVAL = 8.0
+SKIP_NONREF_QUEUE_DEPTH = FRAME_QUEUE_SIZE // 2
+SKIP_NONKEY_QUEUE_DEPTH = FRAME_QUEUE_SIZE - 1
+NDARRAY_FORMAT_CHANNELS = {"gray": 1, "rgb24": 3, "bgr24": 3, "rgba": 4, "bgra": 4}
+"""The pixel formats decoded frames can be converted to NumPy arrays in, with their number of channels."""
 
 _logger: logging.Logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+# Linux socket options which the socket module doesn't define
+_SO_RCVBUFFORCE = 33
+_SO_MEMINFO = 55
+_SK_MEMINFO_DROPS = 8
+
 
 class StreamType(Enum):
     """Defines the different stream types in an RTSP stream."""
@@ -72,6 +133,111 @@ class StreamType(Enum):
                 return "events"
 
 
+class KeyframeRequestKind(Enum):
+    """Defines the RTCP feedback messages which can be used to request a keyframe from the sender."""
+
+    PLI = auto()
+    """Picture Loss Indication, described in RFC 4585 section [6.3.1](https://datatracker.ietf.org/doc/html/rfc4585#section-6.3.1)."""
+    FIR = auto()
+    """Full Intra Request, described in RFC 5104 section [4.3.1](https://datatracker.ietf.org/doc/html/rfc5104#section-4.3.1)."""
+
+    @property
+    def fmt(self) -> int:
+        """The feedback message type of the payload-specific feedback message."""
+        match self:
+            case KeyframeRequestKind.PLI:
+                return 1
+            case KeyframeRequestKind.FIR:
+                return 4
+
+
+class SkipLevel(Enum):
+    """Defines which frames a `VideoStream` with adaptive skipping lets the decoder skip."""
+
+    NONE = auto()
+    """Decode all frames."""
+    NONREF = auto()
+    """Skip frames which no other frames reference."""
+    NONKEY = auto()
+    """Skip all frames except keyframes."""
+
+    @property
+    def skip_frame(self) -> str:
+        """The corresponding value of the `skip_frame` option of the PyAV codec context."""
+        match self:
+            case SkipLevel.NONE:
+                return "DEFAULT"
+            case SkipLevel.NONREF:
+                return "NONREF"
+            case SkipLevel.NONKEY:
+                return "NONKEY"
+
+
+class DecoderThreading(Enum):
+    """Defines how FFmpeg spreads the decoding of a `VideoStream` over threads."""
+
+    LOW_LATENCY = auto()
+    """Decode the slices of each frame in parallel and output every frame as soon as it is decoded.
+    Only uses multiple threads if the sender encodes multiple slices per frame."""
+    HIGH_THROUGHPUT = auto()
+    """Decode multiple frames in parallel, delaying each frame by up to one frame per thread."""
+
+    def codec_options(self, thread_count: int = 0) -> Dict[str, str]:
+        """The FFmpeg codec options of the threading mode, using `thread_count` threads or one per core if 0."""
+        options = {"threads": str(thread_count) if thread_count else "auto"}
+        match self:
+            case DecoderThreading.LOW_LATENCY:
+                options["thread_type"] = "slice"
+                options["flags"] = "+low_delay"
+            case DecoderThreading.HIGH_THROUGHPUT:
+                options["thread_type"] = "frame+slice"
+        return options
+
+
+class PSFB(RTCPPacket):
+    """RTCP payload-specific feedback message, which carries PLI and FIR keyframe requests."""
+
+    pt = 206
+
+    def __init__(
+        self, fmt: int, sender_ssrc: int, media_ssrc: int, fci: bytes = b""
+    ) -> None:
+        self.fmt = fmt
+        self.sender_ssrc = sender_ssrc
+        self.media_ssrc = media_ssrc
+        self.fci = fci
+
+    @classmethod
+    def unpack(cls, px: int, pt: int, p_len: int, data: bytes) -> PSFB:
+        sender_ssrc, media_ssrc = struct.unpack("!II", data[:8])
+        return cls(px & 0x1F, sender_ssrc, media_ssrc, data[8:])
+
+    @classmethod
+    def keyframe_request(
+        cls,
+        kind: KeyframeRequestKind,
+        sender_ssrc: int,
+        media_ssrc: int,
+        sequence_number: int,
+    ) -> PSFB:
+        """Constructs a keyframe request of the given kind for the media source `media_ssrc`."""
+        match kind:
+            case KeyframeRequestKind.PLI:
+                return cls(kind.fmt, sender_ssrc, media_ssrc)
+            case KeyframeRequestKind.FIR:
+                fci = struct.pack("!IB3x", media_ssrc, sequence_number & 0xFF)
+                return cls(kind.fmt, sender_ssrc, 0, fci)
+
+    def __repr__(self) -> str:
+        return f"<PSFB fmt={self.fmt} ssrc={self.sender_ssrc} media_ssrc={self.media_ssrc}>"
+
+    def __bytes__(self) -> bytes:
+        return self.pack(  # type: ignore
+            self.fmt,
+            struct.pack("!II", self.sender_ssrc, self.media_ssrc) + self.fci,
+        )
+
+
 class NALUnit:
     """Represents a RTP or H264 NAL unit
 
@@ -93,34 +259,34 @@ class NALUnit:
     _R_MASK = 0b00100000
     _R_SHIFT = 5
 
-    data: bytearray
-    """Header and payload."""
+    data: memoryview
+    """Header and payload. A view into the buffer the NAL unit was constructed from, no copy is made."""
 
     def __init__(self, data: Union[bytes, bytearray, memoryview]) -> None:
-        self.data = bytearray(data)
+        self.data = memoryview(data)
 
-    @cached_property
+    @property
     def f(self) -> int:
         """Forbidden zero bit."""
         return (self.header & self._F_MASK) >> self._F_SHIFT
 
-    @cached_property
+    @property
     def nri(self) -> int:
         """NAL ref IDC."""
         return (self.header & self._NRI_MASK) >> self._NRI_SHIFT
 
-    @cached_property
+    @property
     def type(self) -> int:
         """NAL unit type."""
         return (self.header & self._TYPE_MASK) >> self._TYPE_SHIFT
 
-    @cached_property
+    @property
     def header(self) -> int:
         """The header of the NAL unit or FU indicator in the case of a fragmentation unit."""
         return self.data[0]
 
     @property
-    def payload(self) -> bytes:
+    def payload(self) -> memoryview:
         """The payload of the NAL unit."""
         if isinstance(self, FUA):
             return self.data[2:]
@@ -131,13 +297,27 @@ class NALUnit:
         """The header and payload of the NAL unit with start code prefix prepended."""
         return self._START_CODE_PREFIX + self.data
 
+    @property
+    def prefixed_chunks(self) -> Tuple[Union[bytes, memoryview], ...]:
+        """The same bytes as `data_with_prefix` split in chunks which can be joined without intermediate copies."""
+        return (self._START_CODE_PREFIX, self.data)
+
     @classmethod
     def from_rtp_payload(cls, rtp_payload: bytes) -> NALUnit:
         """Constructs `NALUnit` from an rtp payload."""
-        nal_unit = cls(rtp_payload)
-        if nal_unit.type == 28:
-            return FUA(rtp_payload)
-        return nal_unit
+        match rtp_payload[0] & cls._TYPE_MASK:
+            case 28:
+                return FUA(rtp_payload)
+            case 24:
+                return STAPA(rtp_payload)
+            case 25:
+                return STAPB(rtp_payload)
+            case 26:
+                return MTAP16(rtp_payload)
+            case 27:
+                return MTAP24(rtp_payload)
+            case _:
+                return cls(rtp_payload)
 
     @classmethod
     def from_fu_a(cls, fu_a: FUA) -> NALUnit:
@@ -145,407 +325,2943 @@ class NALUnit:
 
         Note that fragmented NAL unit payloads must be aggregated before they can get parsed.
         """
-        header = fu_a.header & (cls._F_MASK | cls._NRI_MASK) | fu_a.original_type
         data = bytearray()
-        data.append(header)
+        data.append(fu_a.original_header)
         data += fu_a.payload
         return cls(data)
 
 
+class ReassembledNALUnit(NALUnit):
+    """A NAL unit reassembled from the FU-As it was fragmented into, made of views of their payloads.
+
+    The payloads are not copied, so they must not be modified afterwards. They are only joined when the `data` of
+    the NAL unit is accessed.
+    """
+
+    def __init__(self, header: int, payloads: List[memoryview]) -> None:
+        self._prefixed_chunks = (self._START_CODE_PREFIX + bytes([header]), *payloads)
+        self._data: Optional[memoryview] = None
+
+    @property
+    def data(self) -> memoryview:  # type: ignore
+        if self._data is None:
+            self._data = memoryview(
+                b"".join(self._prefixed_chunks)[len(self._START_CODE_PREFIX) :]
+            )
+        return self._data
+
+    @property
+    def header(self) -> int:
+        return self._prefixed_chunks[0][len(self._START_CODE_PREFIX)]
+
+    @property
+    def data_with_prefix(self) -> bytes:
+        return b"".join(self._prefixed_chunks)
+
+    @property
+    def prefixed_chunks(self) -> Tuple[Union[bytes, memoryview], ...]:
+        return self._prefixed_chunks
+
+
 class FUA(NALUnit):
     """A specific type of RTP NAL unit called FU-A (Fragmentation Unit type A).
     Described in detail in RFC 6184 section [5.8](https://datatracker.ietf.org/doc/html/rfc6184#section-5.8).
     """
 
-    @cached_property
+    @property
     def s(self) -> int:
         """Start bit for fragmentation unit."""
         return (self.fu_header & self._S_MASK) >> self._S_SHIFT
 
-    @cached_property
+    @property
     def e(self) -> int:
         """End bit for fragmentation unit."""
         return (self.fu_header & self._E_MASK) >> self._E_SHIFT
 
-    @cached_property
+    @property
     def original_type(self) -> int:
         """The type of the NAL unit contained in the fragmentation unit."""
         return (self.fu_header & self._TYPE_MASK) >> self._TYPE_SHIFT
 
-    @cached_property
+    @property
     def fu_header(self) -> int:
         """The extra header in fragmentation units."""
         return self.data[1]
 
+    @property
+    def original_header(self) -> int:
+        """The header of the NAL unit contained in the fragmentation unit."""
+        return self.header & (self._F_MASK | self._NRI_MASK) | self.original_type
 
-class Stream(RTPTransportClient, ABC):
-    """Abstract class for a RTSP media stream."""
 
-    transport: RTPTransport
-    """A wrapper around a pair of UDP (or TCP) sockets."""
-    rtp_queue: asyncio.Queue[Tuple[RTP, Optional[float]]]
-    """The queue where all received raw RTP packets get queued for demuxing and decoding."""
-    rtcp_queue: asyncio.Queue[RTCP]
-    """The queue where all received raw RTCP packets get queued for demuxing and decoding."""
-    type: StreamType
-    """The type of this media stream. For example scene camera or gaze."""
-    _last_rtcp_timestamp: Optional[int]
-    _last_ntp_time: Optional[float]
+class AggregationPacket(NALUnit):
+    """Base class for RTP NAL units which aggregate multiple NAL units in one RTP packet.
+    Described in detail in RFC 6184 section [5.7](https://datatracker.ietf.org/doc/html/rfc6184#section-5.7).
 
-    def __init__(self, transport: RTPTransport, type: StreamType) -> None:
-        transport.subscribe(self)
-        self.transport = transport
-        self.rtp_queue = asyncio.Queue()
-        self.rtcp_queue = asyncio.Queue(RTCP_QUEUE_SIZE)
-        self.type = type
-        self._last_rtcp_timestamp = None
-        self._last_ntp_time = None
+    The aggregated NAL units are views into the data of the aggregation packet.
+    """
 
-    def handle_rtp(self, rtp: RTP) -> None:
-        """A callback which is called everytime a new RTP packet is received. Queues the packet and
-        calculates its absolute NTP timestamp."""
-        if self._last_ntp_time is not None and self._last_rtcp_timestamp is not None:
-            time_delta = cast(int, rtp.ts) - self._last_rtcp_timestamp  # type: ignore
-            ntp_timestamp = self._last_ntp_time + time_delta / TIMESTAMP_GRANULARITY
-        else:
-            ntp_timestamp = None
-        self.rtp_queue.put_nowait((rtp, ntp_timestamp))
-        # _logger.debug(f"{self.type}: {rtp.ts}")
-        # _logger.debug(f"RTP size: {len(rtp.data)}")
+    _DON_SIZE = 0
+    """Size of the decoding order number field following the header."""
+    _UNIT_HEADER_SIZE = 2
+    """Size of the fields preceding each aggregated NAL unit, starting with its 16 bit size."""
 
-    def handle_rtcp(self, rtcp: RTCP) -> None:
-        """A callback which is called everytime a new RTCP packet is received. Queues the packet and
-        extracts information needed for calculations of absolute time."""
-        try:
-            self.rtcp_queue.put_nowait(rtcp)
-        except asyncio.QueueFull:
-            _logger.warning(
-                "RTCP queue full. New RTCP packages will be thrown away. Consume the queue to prevent this from happening."
-            )
-        sender_report = cast(Optional[SR], rtcp.get(200))
-        if sender_report is None:
-            return
-        self._last_ntp_time = sender_report.ntp
-        self._last_rtcp_timestamp = sender_report.ts
+    @property
+    def nal_units(self) -> List[NALUnit]:
+        """The NAL units contained in the aggregation packet.
 
-    @abstractproperty
-    def stats(self) -> Dict[str, int]:
-        """Should contain some media stream statistics. Used mainly for debugging purposes."""
-        raise NotImplementedError
+        Parsing stops at the first truncated aggregation unit.
+        """
+        data = self.data
+        nal_units: List[NALUnit] = []
+        offset = 1 + self._DON_SIZE
+        while offset + self._UNIT_HEADER_SIZE <= len(data):
+            size = data[offset] << 8 | data[offset + 1]
+            start = offset + self._UNIT_HEADER_SIZE
+            end = start + size
+            if size == 0 or end > len(data):
+                break
+            nal_units.append(NALUnit(data[start:end]))
+            offset = end
+        return nal_units
 
-    @property
-    def media_stream_configuration(self) -> MediaStreamConfiguration:
-        """A `MediaStreamConfiguration` for this media stream which is used for configuring the `RTSPMediaSession`"""
-        return MediaStreamConfiguration(
-            self.transport, self.media_type, self.media_index
-        )
 
-    @abstractproperty
-    def media_type(self) -> MediaType:
-        """Should be the media type identifier of the `Stream` subclass."""
-        raise NotImplementedError
+class STAPA(AggregationPacket):
+    """Single-time aggregation packet type A, containing NAL units with the same timestamp."""
 
-    @property
-    def media_index(self) -> int:
-        """The media index of the stream.
 
-        Every separate media stream in the RTSP media session is identified by its `media_type` and its `media_index`.
-        """
-        match self.type:
-            case StreamType.SCENE_CAMERA:
-                return 0
-            case StreamType.AUDIO:
-                return 0
-            case StreamType.EYE_CAMERAS:
-                return 1
-            case StreamType.GAZE:
-                return 0
-            case StreamType.SYNC:
-                return 1
-            case StreamType.IMU:
-                return 2
-            case StreamType.EVENTS:
-                return 3
+class STAPB(AggregationPacket):
+    """Single-time aggregation packet type B, a STAP-A with a decoding order number."""
 
-    @classmethod
-    @asynccontextmanager
-    async def setup(
-        cls, connection: RTSPConnection, stream_type: StreamType, scheme: str
-    ) -> AsyncIterator[Stream]:
-        """The main entry point of a `Stream`.
+    _DON_SIZE = 2
 
-        Sets up a transport for RTP and RTCP packets and instantiates a `Stream` object containing the transport.
-        """
-        transport_class = transport_for_scheme(scheme)
-        async with transport_class(connection) as transport:
-            yield cls(transport, stream_type)
 
-    @abstractmethod
-    @asynccontextmanager
-    async def demux(self) -> AsyncIterator[asyncio.Queue[Tuple[Any, Optional[float]]]]:
-        """Should return a queue with tuples containing the demuxed RTP stream along with timestamps."""
-        raise NotImplementedError
-        yield
+class MTAP16(AggregationPacket):
+    """Multi-time aggregation packet with 16 bit timestamp offsets.
 
-    @abstractmethod
-    @asynccontextmanager
-    async def decode(self) -> AsyncIterator[asyncio.Queue[Tuple[Any, Optional[float]]]]:
-        """Should return a queue with tuples containing the demuxed and decoded RTP stream along with timestamps."""
-        raise NotImplementedError
-        yield
+    The NAL units are returned in transmission order and the timestamp offsets are ignored.
+    """
 
+    _DON_SIZE = 2
+    _UNIT_HEADER_SIZE = 2 + 1 + 2
 
-class DataStream(Stream):
-    def __init__(self, transport: RTPTransport, stream_type: StreamType) -> None:
-        super().__init__(transport, stream_type)
 
-    @property
-    def media_type(self) -> MediaType:
-        return "application"
+class MTAP24(AggregationPacket):
+    """Multi-time aggregation packet with 24 bit timestamp offsets.
 
-    @property
-    def stats(self) -> Dict[str, int]:
-        return {
-            "samples": 0,
-        }
+    The NAL units are returned in transmission order and the timestamp offsets are ignored.
+    """
 
-    @asynccontextmanager
-    async def demux(
-        self,
-    ) -> AsyncIterator[asyncio.Queue[Tuple[bytes, Optional[float]]]]:
-        data_queue: asyncio.Queue[Tuple[bytes, Optional[float]]] = asyncio.Queue(
-            DATA_QUEUE_SIZE
-        )
+    _DON_SIZE = 2
+    _UNIT_HEADER_SIZE = 2 + 1 + 3
 
-        async def demuxer():
-            while True:
-                rtp, timestamp = await self.rtp_queue.get()
-                await data_queue.put((cast(bytes, rtp.data), timestamp))  # type: ignore
 
-        demuxer_task = _utils.create_task(demuxer(), name="demuxer")
-        try:
-            yield data_queue
-        finally:
-            demuxer_task.cancel()
-            try:
-                await demuxer_task
-            except asyncio.CancelledError:
-                pass
+class FUAReassemblyBuffer:
+    """Reassembles a fragmented NAL unit from its FU-As.
 
-    @asynccontextmanager
-    async def decode(
-        self,
-    ) -> AsyncIterator[asyncio.Queue[Tuple[JSONObject, Optional[float]]]]:
-        json_queue: asyncio.Queue[Tuple[JSONObject, Optional[float]]] = asyncio.Queue(
-            DATA_QUEUE_SIZE
-        )
+    The fragment payloads are not copied. The finished NAL unit is made of views of them, which are only joined
+    along with the rest of its access unit, when the packet passed to the decoder is built, see
+    `AccessUnit.to_packet`.
+    """
 
-        async def decoder():
-            async with self.demux() as data_queue:
-                while True:
-                    data, timestamp = await data_queue.get()
-                    try:
-                        json_message: JSONObject = json.loads(data)
-                    except json.JSONDecodeError:
-                        _logger.debug(
-                            f"Received data that couldn't be decoded{' since it was empty.' if len(data) == 0 else '.'}"
-                        )
-                        continue
-                    await json_queue.put((json_message, timestamp))
+    def __init__(self) -> None:
+        self._header = 0
+        self._payloads: List[memoryview] = []
+        self._in_progress = False
 
-        decoder_task = _utils.create_task(decoder(), name="decoder")
-        try:
-            yield json_queue
-        finally:
-            decoder_task.cancel()
-            try:
-                await decoder_task
-            except asyncio.CancelledError:
-                pass
+    @property
+    def in_progress(self) -> bool:
+        """True if a NAL unit has been started but not yet finished."""
+        return self._in_progress
+
+    def start(self, fu_a: FUA) -> None:
+        """Starts reassembly of a new NAL unit. Any unfinished NAL unit is discarded."""
+        self._header = fu_a.original_header
+        self._payloads = [fu_a.payload]
+        self._in_progress = True
+
+    def append(self, fu_a: FUA) -> None:
+        """Appends the payload of an FU-A to the NAL unit being reassembled."""
+        assert self._in_progress
+        self._payloads.append(fu_a.payload)
+
+    def finish(self) -> NALUnit:
+        """Finishes reassembly and returns the NAL unit."""
+        assert self._in_progress
+        nal_unit = ReassembledNALUnit(self._header, self._payloads)
+        self.discard()
+        return nal_unit
 
+    def discard(self) -> None:
+        """Discards the NAL unit being reassembled."""
+        self._payloads = []
+        self._in_progress = False
 
-class VideoStream(Stream):
-    """Represents a RTSP video stream.
 
-    Handles demuxing and decoding of video frames.
+class AccessUnit:
+    """A set of H264 NAL units which together make up one coded picture.
+
+    All NAL units in an access unit are sent with the same RTP timestamp and the last RTP packet
+    of the access unit has the marker bit set, as described in RFC 6184 section
+    [5.1](https://datatracker.ietf.org/doc/html/rfc6184#section-5.1).
     """
 
-    _nal_unit_builder: Tuple[NALUnit, Optional[float]]
+    nal_units: List[NALUnit]
+    """The NAL units of the access unit in decoding order."""
+    rtp_timestamp: int
+    """The RTP timestamp shared by all NAL units in the access unit, extended to handle wraparound."""
 
-    def __init__(self, transport: RTPTransport, stream_type: StreamType) -> None:
-        super().__init__(transport, stream_type)
-        self.codec_context: Any = av.CodecContext.create("h264", "r")  # type: ignore
-        self.sps_or_pps_received = False
-        self._demux_in_count = 0
-        self._demux_out_count = 0
-        self._decode_count = 0
-        self._fragment_count = 0
+    def __init__(self, rtp_timestamp: int) -> None:
+        self.nal_units = []
+        self.rtp_timestamp = rtp_timestamp
 
     @property
-    def media_type(self) -> MediaType:
-        """The media type identifier of a `VideoStream`."""
-        return "video"
+    def is_keyframe(self) -> bool:
+        """True if the access unit contains an IDR picture."""
+        return any(nal_unit.type == 5 for nal_unit in self.nal_units)
 
     @property
-    def stats(self) -> Dict[str, int]:
-        """Contains some media stream statistics. Used mainly for debugging purposes."""
-        return {
-            "demux_in_count": self._demux_in_count,
-            "demux_out_count": self._demux_out_count,
-            "decode_count": self._decode_count,
-        }
-
-    @asynccontextmanager
-    async def demux(
-        self,
-    ) -> AsyncIterator[asyncio.Queue[Tuple[NALUnit, Optional[float]]]]:
-        """Returns a queue with tuples containing the demuxed RTP stream along with timestamps.
-
-        Spawns a demuxer task which parses the NAL units received in the RTP payloads.
-        It also aggregates fragmentation units of larger NAL units sent in multiple RTP packets.
-        """
-        nal_unit_queue: asyncio.Queue[Tuple[NALUnit, Optional[float]]] = asyncio.Queue(
-            FRAME_QUEUE_SIZE
+    def is_reference(self) -> bool:
+        """True if the access unit contains a slice which later pictures may reference."""
+        return any(
+            nal_unit.type in [1, 5] and nal_unit.nri != 0 for nal_unit in self.nal_units
         )
 
-        async def demuxer():
-            while True:
-                rtp, timestamp = await self.rtp_queue.get()
-                self._demux_in_count += 1
-                # t0 = time.perf_counter()
-                nal_unit = NALUnit.from_rtp_payload(cast(bytes, rtp.data))  # type: ignore
-                if nal_unit.type in [7, 8]:
-                    # SPS or PPS is queued
-                    self.sps_or_pps_received = True
-                    await nal_unit_queue.put((nal_unit, timestamp))
-                    self._demux_out_count += 1
-                    continue
-                if not self.sps_or_pps_received:
-                    # SPS or PPS should be the first NAL unit to be queued
-                    continue
-                if nal_unit.type in [1, 5]:
-                    # Self contained NAL unit is queued
-                    await nal_unit_queue.put((nal_unit, timestamp))
-                    self._demux_out_count += 1
-                    continue
-                if isinstance(nal_unit, FUA):
-                    # Fragmented NAL units need to be aggregated
-                    if nal_unit.s:
-                        self._nal_unit_builder = (
-                            NALUnit.from_fu_a(nal_unit),
-                            timestamp,
-                        )
-                        self._fragment_count = 1
-                        # t1 = time.perf_counter()
-                        # logger.debug(f"Demuxed FU-A start in {t1 - t0:.6f} seconds")
-                        continue
-                    self._nal_unit_builder[0].data += nal_unit.payload
-                    self._fragment_count += 1
-                    # t1 = time.perf_counter()
-                    # logger.debug(f"Demuxed FU-A in {t1 - t0:.6f} seconds")
-                    if nal_unit.e:
-                        # logger.debug(f"NAL unit built of {self._fragment_count} FU-As")
-                        await nal_unit_queue.put(self._nal_unit_builder)
-                        self._demux_out_count += 1
-                else:
-                    _logger.warning(f"Unhandled NAL unit of type {nal_unit.type}")
-
-        demuxer_task = _utils.create_task(demuxer(), name="demuxer")
-        try:
-            yield nal_unit_queue
-        finally:
-            demuxer_task.cancel()
-            try:
-                await demuxer_task
-            except asyncio.CancelledError:
-                pass
-
-    @asynccontextmanager
-    async def decode(self) -> AsyncIterator[asyncio.Queue[Tuple[Any, Optional[float]]]]:
-        """Returns a queue with tuples containing the demuxed and decoded RTP stream along with timestamps.
+    @property
+    def data(self) -> bytes:
+        """The NAL units of the access unit in H.264 Annex B byte stream format."""
+        return b"".join(
+            chunk for nal_unit in self.nal_units for chunk in nal_unit.prefixed_chunks
+        )
 
-        Spawns a decoder task which uses PyAV (ffmpeg) to parse and decode the demuxed NAL units.
+    def to_packet(self) -> Any:
+        """Returns a PyAV packet with the `data` of the access unit and its RTP timestamp as pts.
 
-        The returned queue contains PyAVs `av.VideoFrame` objects along with timestamps.
+        The views of the received RTP payloads which make up the NAL units are joined once, into a buffer of the size
+        of the access unit, which PyAV copies into the packet. Each received byte is thus copied twice on its way to
+        the decoder, both times in a single C call for the whole access unit.
         """
-        frame_queue: asyncio.Queue[Tuple[Any, Optional[float]]] = asyncio.Queue(
-            FRAME_QUEUE_SIZE
-        )
+        packet: Any = av.Packet(self.data)  # type: ignore
+        packet.pts = self.rtp_timestamp
+        return packet
 
-        async def decoder():
-            async with self.demux() as nal_unit_queue:
-                while True:
-                    nal_unit, timestamp = await nal_unit_queue.get()
-                    # t0 = time.perf_counter()
-                    packets = cast(
-                        List[Any],
-                        self.codec_context.parse(nal_unit.data_with_prefix),
-                    )
-                    frames = functools.reduce(
-                        lambda frame_acc, packet: frame_acc
-                        + self.codec_context.decode(packet),
-                        packets,
-                        [],
-                    )
-                    # t1 = time.perf_counter()
-                    # logger.debug(f"Decoded NAL unit in {t1 - t0:.6f} seconds")
-                    for frame in frames:
-                        await frame_queue.put((frame, timestamp))
-                        self._decode_count += 1
 
-        decoder_task = _utils.create_task(decoder(), name="decoder")
-        try:
-            yield frame_queue
-        finally:
-            decoder_task.cancel()
-            try:
-                await decoder_task
-            except asyncio.CancelledError:
-                pass
+class RTPJitterBuffer:
+    """Reorders RTP packets by sequence number and detects lost packets.
 
+    Packets which arrive in order are released immediately. When there is a gap in the sequence numbers,
+    the following packets are held back until the missing packets arrive or until the oldest held back
+    packet has waited for `latency` seconds, at which point the missing packets are considered lost.
 
-class Streams:
-    """Handles a `RTSPMediaSession` with one or multiple media streams.
+    When the SSRC of the packets changes, the sequence number jumps back more than `max_misorder` packets or it
+    jumps ahead more than `max_dropout` packets, as in RFC 3550 appendix A.1, the sender has restarted its
+    sequence. The held back packets are then released, see `flush`, and the new sequence starts at the packet,
+    instead of dropping every packet as late until the old sequence number is reached again, or holding back
+    every packet and counting the skipped sequence numbers as lost.
+    """
 
-    Exposes a `connect` function which is used to set up an RTSP media session and create an instance of this object.
-    Gives easy access to the different streams.
+    latency: float
+    """The maximum time in seconds a packet is held back waiting for missing packets."""
+    lost_count: int
+    """The number of packets which never arrived within the latency window."""
+    reordered_count: int
+    """The number of packets which arrived out of order but in time to be reordered."""
+    late_count: int
+    """The number of packets which arrived after they had already been considered lost."""
+    duplicate_count: int
+    """The number of duplicate packets which were dropped."""
+    resync_count: int
+    """The number of times the sender restarted its sequence."""
+
+    def __init__(
+        self,
+        latency: float,
+        max_packets: int = JITTER_BUFFER_MAX_PACKETS,
+        max_misorder: int = JITTER_BUFFER_MAX_MISORDER,
+        max_dropout: int = JITTER_BUFFER_MAX_DROPOUT,
+    ) -> None:
+        self.latency = latency
+        self.lost_count = 0
+        self.reordered_count = 0
+        self.late_count = 0
+        self.duplicate_count = 0
+        self.resync_count = 0
+        self._max_packets = max_packets
+        self._max_misorder = max_misorder
+        self._max_dropout = max_dropout
+        self._packets: Dict[int, Tuple[RTP, Optional[float], float]] = {}
+        self._next_sequence_number: Optional[int] = None
+        self._highest_sequence_number: Optional[int] = None
+        self._ssrc: Optional[int] = None
+
+    def push(
+        self, rtp: RTP, timestamp: Optional[float], now: float
+    ) -> List[Tuple[RTP, Optional[float]]]:
+        """Adds a packet received at time `now` and returns the packets which are ready to be released, in order."""
+        ssrc = cast(int, rtp.ssrc)  # type: ignore
+        sequence_number = self._extend_sequence_number(cast(int, rtp.seq))  # type: ignore
+        released: List[Tuple[RTP, Optional[float]]] = []
+        if self._next_sequence_number is not None and (
+            ssrc != self._ssrc
+            or sequence_number < self._next_sequence_number - self._max_misorder
+            or sequence_number
+            > cast(int, self._highest_sequence_number) + self._max_dropout
+        ):
+            # The sender restarted its sequence
+            released = self.flush()
+            self.resync_count += 1
+            sequence_number = self._extend_sequence_number(cast(int, rtp.seq))  # type: ignore
+        self._ssrc = ssrc
+        if self._next_sequence_number is None:
+            self._next_sequence_number = sequence_number
+        if sequence_number < self._next_sequence_number:
+            self.late_count += 1
+            return []
+        if sequence_number in self._packets:
+            self.duplicate_count += 1
+            return []
+        assert self._highest_sequence_number is not None
+        if sequence_number < self._highest_sequence_number:
+            self.reordered_count += 1
+        else:
+            self._highest_sequence_number = sequence_number
+        self._packets[sequence_number] = (rtp, timestamp, now)
+        return released + self.release(now)
+
+    def release(self, now: float) -> List[Tuple[RTP, Optional[float]]]:
+        """Returns the packets which are ready to be released at time `now`, skipping gaps which have expired."""
+        released: List[Tuple[RTP, Optional[float]]] = []
+        packets = self._packets
+        while packets:
+            assert self._next_sequence_number is not None
+            packet = packets.pop(self._next_sequence_number, None)
+            if packet is not None:
+                released.append(packet[:2])
+                self._next_sequence_number += 1
+                continue
+            first_sequence_number = min(packets)
+            if (
+                now - packets[first_sequence_number][2] < self.latency
+                and len(packets) <= self._max_packets
+            ):
+                break
+            self.lost_count += first_sequence_number - self._next_sequence_number
+            self._next_sequence_number = first_sequence_number
+        return released
+
+    def flush(self) -> List[Tuple[RTP, Optional[float]]]:
+        """Returns all held back packets, skipping gaps, and forgets the sequence numbers so that the next packet
+        starts a new sequence."""
+        released = self.release(math.inf)
+        self._next_sequence_number = None
+        self._highest_sequence_number = None
+        return released
+
+    def fill_missing_timestamps(
+        self, timestamp: Callable[[RTP], Optional[float]]
+    ) -> None:
+        """Sets the timestamps of held back packets which have none to the result of `timestamp`."""
+        for sequence_number, (rtp, packet_timestamp, received) in self._packets.items():
+            if packet_timestamp is None:
+                self._packets[sequence_number] = (rtp, timestamp(rtp), received)
 
-    After the setup process is completed, await the `play` coroutine to start the streaming.
+    @property
+    def deadline(self) -> Optional[float]:
+        """The time when the oldest held back packet expires or `None` if no packets are held back."""
+        if not self._packets:
+            return None
+        return self._packets[min(self._packets)][2] + self.latency
+
+    def _extend_sequence_number(self, sequence_number: int) -> int:
+        if self._highest_sequence_number is None:
+            self._highest_sequence_number = sequence_number
+            return sequence_number
+        delta = (sequence_number - self._highest_sequence_number) & 0xFFFF
+        if delta >= 0x8000:
+            delta -= 0x10000
+        return self._highest_sequence_number + delta
+
+
+class RTPClock:
+    """Maps the RTP timestamps of a stream to NTP time using the RTCP sender reports of the sender.
+
+    The mapping is a least squares fit of NTP time to RTP time over the last `window` sender reports, which
+    follows the drift between the RTP clock and the NTP clock of the sender and averages out jitter in the
+    reports. The drift is limited to `MAX_CLOCK_DRIFT`. RTP timestamps are extended over 32 bit wraparounds
+    relative to the latest sender report.
+
+    When a new sender report moves the mapping by at most `MAX_CLOCK_SLEW` seconds, the change is slewed in
+    over `CLOCK_SLEW_DURATION` seconds of RTP time so that timestamps don't jump. Larger changes are
+    considered discontinuities of the sender's clocks, which restart the fit.
     """
 
-    def __init__(self, session: RTSPMediaSession, streams: Set[Stream]) -> None:
-        self.session = session
-        self.streams: Dict[StreamType, Stream] = {
-            stream.type: stream for stream in streams
-        }
+    clock_rate: int
+    """The number of RTP timestamp units per second."""
+    window: int
+    """The number of sender reports the mapping is fitted to."""
+    step_count: int
+    """The number of times the mapping was restarted because of a discontinuity."""
+
+    def __init__(
+        self, clock_rate: int = TIMESTAMP_GRANULARITY, window: int = CLOCK_MODEL_WINDOW
+    ) -> None:
+        self.clock_rate = clock_rate
+        self.window = window
+        self.step_count = 0
+        self._sender_reports: Deque[Tuple[int, float]] = deque(maxlen=window)
+        self._reference_rtp_timestamp: Optional[int] = None
+        self._reference_extended_rtp_timestamp = 0
+        self._reference_ntp_time = 0.0
+        self._seconds_per_unit = 1 / clock_rate
+        self._slew = 0.0
 
     @property
-    def scene_camera(self) -> VideoStream:
-        return cast(VideoStream, self._get_stream(StreamType.SCENE_CAMERA))
+    def is_synchronized(self) -> bool:
+        """True once a sender report has been received."""
+        return self._reference_rtp_timestamp is not None
 
     @property
-    def audio(self) -> Stream:
-        return self._get_stream(StreamType.AUDIO)
+    def drift(self) -> float:
+        """The estimated relative rate error of the RTP clock, measured with the NTP clock of the sender. Positive if
+        the RTP clock runs fast."""
+        return 1 / (self._seconds_per_unit * self.clock_rate) - 1
+
+    def add_sender_report(self, rtp_timestamp: int, ntp_time: float) -> None:
+        """Updates the mapping with the RTP timestamp and NTP time of a sender report."""
+        extended_rtp_timestamp = self._extend(rtp_timestamp)
+        previous_ntp_time = self._to_ntp(extended_rtp_timestamp)
+        if (
+            previous_ntp_time is not None
+            and abs(ntp_time - previous_ntp_time) > MAX_CLOCK_SLEW
+        ):
+            self.step_count += 1
+            self._sender_reports.clear()
+            previous_ntp_time = None
+        self._sender_reports.append((extended_rtp_timestamp, ntp_time))
+        self._reference_rtp_timestamp = rtp_timestamp & 0xFFFFFFFF
+        self._reference_extended_rtp_timestamp = extended_rtp_timestamp
+        self._reference_ntp_time, self._seconds_per_unit = self._fit(
+            extended_rtp_timestamp
+        )
+        self._slew = (
+            0.0
+            if previous_ntp_time is None
+            else previous_ntp_time - self._reference_ntp_time
+        )
 
-    @property
-    def eye_cameras(self) -> Stream:
-        return self._get_stream(StreamType.EYE_CAMERAS)
+    def to_ntp(self, rtp_timestamp: int) -> Optional[float]:
+        """Returns the NTP time of an RTP timestamp or `None` if no sender report has been received."""
+        if self._reference_rtp_timestamp is None:
+            return None
+        return self._to_ntp(self._extend(rtp_timestamp))
+
+    def _to_ntp(self, extended_rtp_timestamp: int) -> Optional[float]:
+        if self._reference_rtp_timestamp is None:
+            return None
+        delta = extended_rtp_timestamp - self._reference_extended_rtp_timestamp
+        ntp_time = self._reference_ntp_time + delta * self._seconds_per_unit
+        if self._slew:
+            remaining = 1 - delta / (CLOCK_SLEW_DURATION * self.clock_rate)
+            ntp_time += self._slew * min(max(remaining, 0.0), 1.0)
+        return ntp_time
+
+    def _extend(self, rtp_timestamp: int) -> int:
+        if self._reference_rtp_timestamp is None:
+            return rtp_timestamp
+        delta = (rtp_timestamp - self._reference_rtp_timestamp) & 0xFFFFFFFF
+        if delta >= 0x80000000:
+            delta -= 0x100000000
+        return self._reference_extended_rtp_timestamp + delta
+
+    def _fit(self, extended_rtp_timestamp: int) -> Tuple[float, float]:
+        """Returns the fitted NTP time at `extended_rtp_timestamp` and the fitted seconds per RTP timestamp unit."""
+        nominal_seconds_per_unit = 1 / self.clock_rate
+        n = len(self._sender_reports)
+        xs = [x - extended_rtp_timestamp for x, _ in self._sender_reports]
+        ys = [y for _, y in self._sender_reports]
+        mean_x = sum(xs) / n
+        mean_y = sum(ys) / n
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance == 0:
+            seconds_per_unit = nominal_seconds_per_unit
+        else:
+            covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+            seconds_per_unit = min(
+                max(
+                    covariance / variance,
+                    nominal_seconds_per_unit * (1 - MAX_CLOCK_DRIFT),
+                ),
+                nominal_seconds_per_unit * (1 + MAX_CLOCK_DRIFT),
+            )
+        return mean_y - seconds_per_unit * mean_x, seconds_per_unit
 
-    @property
-    def gaze(self) -> Stream:
-        return self._get_stream(StreamType.GAZE)
 
-    @property
-    def sync(self) -> Stream:
-        return self._get_stream(StreamType.SYNC)
+class OverflowPolicy(Enum):
+    """Defines what a `Stream` does when its RTP queue is full."""
+
+    BLOCK = auto()
+    """Stop reading from the UDP socket until the queue is half empty, leaving packets in the socket buffer.
+    Transports which can't be paused, such as interleaved TCP, fall back to `DROP_OLDEST`."""
+    DROP_OLDEST = auto()
+    """Drop the oldest queued packet to make room for the new one."""
+    DROP_UNTIL_KEYFRAME = auto()
+    """Drop all queued packets and all new packets until the start of the next keyframe. Only for video streams."""
+
+
+class DemuxMode(Enum):
+    """Defines how the demuxer and decoder tasks of a `Stream` take items from their queues and pass on the results."""
+
+    PER_PACKET = auto()
+    """Take and process one item at a time."""
+    BATCHED = auto()
+    """Take all available items, up to `MAX_DEMUX_BATCH_SIZE`, at once each time the task wakes up and put all the
+    results on the next queue without waiting, unless it is full. This saves a queue operation per item at high
+    packet rates."""
+    IN_CALLBACK = auto()
+    """Demux the packets in `Stream.handle_rtp` as they are received, without a demuxer task, so that only demuxed
+    items are queued. This saves a task switch and a queue item per packet. The demuxed items are put on an
+    `OverflowQueue` which takes the place of the `Stream.rtp_queue`, with the same overflow policy. It has the same
+    size, except for video streams, where it holds up to `FRAME_QUEUE_SIZE` access units like the queue of the demuxer
+    task. Items demuxed before the first sender report keep no timestamp. Decoder tasks take one item at a time."""
+
+
+class OverflowQueue(asyncio.Queue[Tuple[_T, Optional[float]]], Generic[_T]):
+    """A queue of timestamped items received from the transport, bounded by `limit` items.
+
+    `put_nowait` never raises `asyncio.QueueFull`. Instead, the `overflow_policy` is applied when the queue is full.
+    """
+
+    limit: int
+    """The number of items the queue holds before the overflow policy is applied."""
+    overflow_policy: OverflowPolicy
+    """What to do when the queue is full."""
+    dropped_count: int
+    """The number of items dropped because the queue was full."""
+
+    def __init__(
+        self,
+        limit: int,
+        overflow_policy: OverflowPolicy,
+        pause_reading: Callable[[], bool],
+        resume_reading: Callable[[], None],
+        is_keyframe_start: Callable[[_T], bool],
+        request_keyframe: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """`pause_reading` should pause the transport and return whether it succeeded, `resume_reading` should resume it and
+        `is_keyframe_start` should tell whether an item starts a keyframe. `request_keyframe`, if given, is called when
+        the queue starts dropping items until the next keyframe, so that the keyframe doesn't have to be waited for."""
+        super().__init__()
+        self.limit = limit
+        self.overflow_policy = overflow_policy
+        self.dropped_count = 0
+        self._pause_reading = pause_reading
+        self._resume_reading = resume_reading
+        self._is_keyframe_start = is_keyframe_start
+        self._request_keyframe = request_keyframe
+        self._paused = False
+        self._dropping_until_keyframe = False
+
+    def put_nowait(self, item: Tuple[_T, Optional[float]]) -> None:
+        if self._dropping_until_keyframe:
+            if not self._is_keyframe_start(item[0]):
+                self.dropped_count += 1
+                return
+            self._dropping_until_keyframe = False
+        if self.qsize() >= self.limit:
+            match self.overflow_policy:
+                case OverflowPolicy.BLOCK:
+                    if not self._paused:
+                        self._paused = self._pause_reading()
+                    if not self._paused:
+                        self.get_nowait()
+                        self.dropped_count += 1
+                case OverflowPolicy.DROP_OLDEST:
+                    self.get_nowait()
+                    self.dropped_count += 1
+                case OverflowPolicy.DROP_UNTIL_KEYFRAME:
+                    self.dropped_count += self.qsize()
+                    while not self.empty():
+                        self.get_nowait()
+                    if not self._is_keyframe_start(item[0]):
+                        self._dropping_until_keyframe = True
+                        self.dropped_count += 1
+                        if self._request_keyframe is not None:
+                            self._request_keyframe()
+                        return
+        super().put_nowait(item)
+
+    def fill_missing_timestamps(
+        self, timestamp: Callable[[_T], Optional[float]]
+    ) -> None:
+        """Sets the timestamps of queued items which have none to the result of `timestamp`."""
+        queue = cast(Deque[Tuple[_T, Optional[float]]], self._queue)  # type: ignore
+        for _ in range(len(queue)):
+            item, item_timestamp = queue.popleft()
+            queue.append(
+                (item, timestamp(item) if item_timestamp is None else item_timestamp)
+            )
+
+    def get_many_nowait(self, count: int) -> List[Tuple[_T, Optional[float]]]:
+        """Removes and returns up to `count` queued items."""
+        queue = cast(Deque[Tuple[_T, Optional[float]]], self._queue)  # type: ignore
+        if count >= len(queue):
+            items = list(queue)
+            queue.clear()
+        else:
+            items = [queue.popleft() for _ in range(count)]
+        if self._paused and self.qsize() <= self.limit // 2:
+            self._paused = False
+            self._resume_reading()
+        return items
+
+    def _get(self) -> Tuple[_T, Optional[float]]:
+        item = super()._get()  # type: ignore
+        if self._paused and self.qsize() <= self.limit // 2:
+            self._paused = False
+            self._resume_reading()
+        return item
+
+
+class RTPQueue(OverflowQueue[RTP]):
+    """The queue of received RTP packets of a `Stream`, bounded by `limit` packets.
+
+    The queue also keeps track of where the packets of each new RTSP media session start, see `mark_session_start`,
+    by their position in the sequence of packets which have passed through the queue. Unlike a marker item, the
+    position is kept when the packets around it are dropped and it isn't seen by consumers of the queue which
+    don't ask for it.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        overflow_policy: OverflowPolicy,
+        pause_reading: Callable[[], bool],
+        resume_reading: Callable[[], None],
+        is_keyframe_start: Callable[[RTP], bool],
+        request_keyframe: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__(
+            limit,
+            overflow_policy,
+            pause_reading,
+            resume_reading,
+            is_keyframe_start,
+            request_keyframe,
+        )
+        self._removed_count = 0
+        self._session_starts: Deque[int] = deque()
+
+    @property
+    def session_start_pending(self) -> bool:
+        """Whether the start of a new session has been marked but not yet taken with `take_session_starts`."""
+        return bool(self._session_starts)
+
+    def mark_session_start(self) -> None:
+        """Marks that the packets queued from now on belong to a new RTSP media session."""
+        self._session_starts.append(self._removed_count + self.qsize())
+
+    def take_session_starts(self, count: int) -> List[int]:
+        """Returns and forgets where new sessions start among the last `count` packets taken from the queue, as
+        indices into them. Sessions whose first packets were dropped start at 0 and a session which starts with the
+        next packet in the queue starts at `count`."""
+        first_index = self._removed_count - count
+        session_starts: List[int] = []
+        while self._session_starts and self._session_starts[0] <= self._removed_count:
+            session_starts.append(max(self._session_starts.popleft() - first_index, 0))
+        return session_starts
+
+    def get_many_nowait(self, count: int) -> List[Tuple[RTP, Optional[float]]]:
+        items = super().get_many_nowait(count)
+        self._removed_count += len(items)
+        return items
+
+    def _get(self) -> Tuple[RTP, Optional[float]]:
+        item = super()._get()
+        self._removed_count += 1
+        return item
+
+
+async def _get_items(queue: asyncio.Queue[_T], demux_mode: DemuxMode) -> List[_T]:
+    """Waits for an item in the queue and returns it, along with up to `MAX_DEMUX_BATCH_SIZE` - 1 other available
+    items if `demux_mode` is `DemuxMode.BATCHED`."""
+    items = [await queue.get()]
+    if demux_mode == DemuxMode.BATCHED and not queue.empty():
+        count = min(queue.qsize(), MAX_DEMUX_BATCH_SIZE - 1)
+        if isinstance(queue, OverflowQueue):
+            items.extend(cast(List[_T], queue.get_many_nowait(count)))
+        else:
+            items.extend(queue.get_nowait() for _ in range(count))
+    return items
+
+
+async def _put_items(
+    queue: asyncio.Queue[_T], items: List[_T], demux_mode: DemuxMode
+) -> None:
+    """Puts items on the queue. If `demux_mode` is `DemuxMode.BATCHED`, it only waits when the queue is full."""
+    for item in items:
+        if demux_mode == DemuxMode.BATCHED and not queue.full():
+            queue.put_nowait(item)
+        else:
+            await queue.put(item)
+
+
+class FrameBufferPool:
+    """A pool of reusable NumPy arrays which decoded frames are converted into.
+
+    Arrays are allocated for the first frames and then reused, so that no arrays are allocated once the
+    pool holds enough arrays for all frames in flight. Arrays may be acquired in a decoder worker thread and
+    released on the event loop.
+    """
+
+    allocation_count: int
+    """The number of arrays allocated by the pool."""
+
+    def __init__(self) -> None:
+        self.allocation_count = 0
+        self._free_arrays: Deque[np.ndarray] = deque()
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """Returns a free array of the given shape, allocating a new one if there is none."""
+        while self._free_arrays:
+            array = self._free_arrays.popleft()
+            if array.shape == shape:
+                return array
+        self.allocation_count += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, array: np.ndarray) -> None:
+        """Returns an array to the pool. It may be overwritten by the next frame which is converted."""
+        self._free_arrays.append(array)
+
+
+class FrameQueue(asyncio.Queue[Tuple[Any, Optional[float]]]):
+    """The queue of decoded frames returned by `VideoStream.decode`.
+
+    If `latest_only` is `True`, the queue holds a single frame and putting a frame never blocks. Instead the
+    queued frame is replaced.
+
+    If a `converter` is given, the queue holds decoded `av.VideoFrame` objects and converts each frame when it is
+    taken from the queue, so that frames which are replaced are never converted. `get` converts the frame in
+    `executor` if there is one, while `get_nowait` always converts it on the calling thread. Errors raised by the
+    converter are passed on to the caller.
+
+    If the frames are arrays from a `buffer_pool`, the queue returns them to the pool when they are replaced
+    and when the next frame is taken from the queue.
+    """
+
+    latest_only: bool
+    """Whether only the most recent frame is kept."""
+    buffer_pool: Optional[FrameBufferPool]
+    """The pool the arrays in the queue were acquired from, if any."""
+    converter: Optional[FrameConverter]
+    """Converts the frames when they are taken from the queue, if given."""
+    executor: Optional[Executor]
+    """The executor `get` runs the `converter` in, or `None` to run it on the event loop."""
+
+    def __init__(
+        self,
+        latest_only: bool = False,
+        buffer_pool: Optional[FrameBufferPool] = None,
+        converter: Optional[FrameConverter] = None,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        super().__init__(1 if latest_only else FRAME_QUEUE_SIZE)
+        self.latest_only = latest_only
+        self.buffer_pool = buffer_pool
+        self.converter = converter
+        self.executor = executor
+        self._taken_frame: Any = None
+        self._frame_put = asyncio.Event()
+
+    async def put(self, item: Tuple[Any, Optional[float]]) -> None:
+        if self.latest_only:
+            self.put_nowait(item)
+        else:
+            await super().put(item)
+
+    def put_nowait(self, item: Tuple[Any, Optional[float]]) -> None:
+        if self.latest_only and self.full():
+            replaced_frame, _ = cast(Tuple[Any, Optional[float]], self._queue.popleft())  # type: ignore
+            if self.buffer_pool is not None and self.converter is None:
+                self.buffer_pool.release(replaced_frame)
+        super().put_nowait(item)
+        self._frame_put.set()
+
+    async def get(self) -> Tuple[Any, Optional[float]]:
+        if self.converter is None or self.executor is None:
+            return await super().get()
+        while self.empty():
+            self._frame_put.clear()
+            await self._frame_put.wait()
+        frame, timestamp = super().get_nowait()
+        frame = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.converter.convert, frame
+        )
+        return self._take((frame, timestamp))
+
+    def get_nowait(self) -> Tuple[Any, Optional[float]]:
+        item = super().get_nowait()
+        if self.converter is not None:
+            item = (self.converter.convert(item[0]), item[1])
+        return self._take(item)
+
+    def _take(self, item: Tuple[Any, Optional[float]]) -> Tuple[Any, Optional[float]]:
+        if self.buffer_pool is not None:
+            if self._taken_frame is not None:
+                self.buffer_pool.release(self._taken_frame)
+            self._taken_frame = item[0]
+        return item
+
+
+class SubscriberPolicy(Enum):
+    """Defines what a `Broadcast` does when the queue of one of its subscribers is full."""
+
+    BLOCK = auto()
+    """Wait until the subscriber takes an item. This holds back all other subscribers and, once the queues in front
+    of the broadcast are full, the decoding."""
+    DROP_OLDEST = auto()
+    """Drop the oldest item in the subscriber's queue to make room for the new one."""
+    DROP_NEWEST = auto()
+    """Drop the new item and keep the items already in the subscriber's queue."""
+
+
+class SubscriberQueue(asyncio.Queue[Tuple[Any, Optional[float]]]):
+    """The queue of a subscriber of a `Broadcast`.
+
+    Putting an item only blocks with `SubscriberPolicy.BLOCK`. With the other policies, an item is dropped instead
+    when the queue is full.
+    """
+
+    policy: SubscriberPolicy
+    """What to do when the queue is full."""
+    dropped_count: int
+    """The number of items dropped because the queue was full."""
+
+    def __init__(
+        self,
+        policy: SubscriberPolicy = SubscriberPolicy.DROP_OLDEST,
+        maxsize: int = SUBSCRIBER_QUEUE_SIZE,
+    ) -> None:
+        super().__init__(maxsize)
+        self.policy = policy
+        self.dropped_count = 0
+
+    async def put(self, item: Tuple[Any, Optional[float]]) -> None:
+        if self.policy == SubscriberPolicy.BLOCK:
+            await super().put(item)
+        else:
+            self.put_nowait(item)
+
+    def put_nowait(self, item: Tuple[Any, Optional[float]]) -> None:
+        if self.full():
+            match self.policy:
+                case SubscriberPolicy.BLOCK:
+                    pass
+                case SubscriberPolicy.DROP_OLDEST:
+                    self._queue.popleft()  # type: ignore
+                    self.dropped_count += 1
+                case SubscriberPolicy.DROP_NEWEST:
+                    self.dropped_count += 1
+                    return
+        super().put_nowait(item)
+
+
+class Broadcast:
+    """Feeds the decoded items of a stream to any number of subscribers, each with its own queue and
+    `SubscriberPolicy`, so that several consumers can share one demuxer and decoder. Created by `Stream.broadcast`.
+
+    Every subscriber gets the items put on the source queue after it subscribed. The items are shared between the
+    subscribers and must not be modified.
+    """
+
+    def __init__(
+        self, source_queue: asyncio.Queue[Tuple[Any, Optional[float]]]
+    ) -> None:
+        self._source_queue = source_queue
+        self._subscribers: List[SubscriberQueue] = []
+
+    @property
+    def subscribers(self) -> List[SubscriberQueue]:
+        """The queues of the current subscribers."""
+        return list(self._subscribers)
+
+    def subscribe(
+        self,
+        policy: SubscriberPolicy = SubscriberPolicy.DROP_OLDEST,
+        maxsize: int = SUBSCRIBER_QUEUE_SIZE,
+    ) -> SubscriberQueue:
+        """Adds a subscriber and returns its queue, which holds at most `maxsize` items."""
+        subscriber_queue = SubscriberQueue(policy, maxsize)
+        self._subscribers.append(subscriber_queue)
+        return subscriber_queue
+
+    def unsubscribe(self, subscriber_queue: SubscriberQueue) -> None:
+        """Removes a subscriber. Items already in its queue stay there."""
+        self._subscribers.remove(subscriber_queue)
+
+    async def run(self) -> None:
+        """Takes the items from the source queue and puts them on the queues of the subscribers, until cancelled."""
+        while True:
+            item = await self._source_queue.get()
+            for subscriber_queue in list(self._subscribers):
+                await subscriber_queue.put(item)
+
+
+class FrameConverter:
+    """Converts decoded frames to a given size and pixel format, either as NumPy arrays, optionally flipped
+    vertically, or as `av.VideoFrame` objects.
+
+    The arrays are acquired from `buffer_pool`. The scaler context of the `VideoReformatter` is reused across
+    frames, as long as the size and format of the decoded frames don't change.
+    """
+
+    format: Optional[str]
+    """The pixel format of the converted frames or `None` to keep the format of the decoded frames.
+    Arrays must have one of the formats in `NDARRAY_FORMAT_CHANNELS`."""
+    size: Optional[Tuple[int, int]]
+    """The width and height of the converted frames or `None` to keep the size of the decoded frames."""
+    flip: bool
+    """Whether the arrays are flipped vertically."""
+    ndarray: bool
+    """Whether frames are converted to NumPy arrays or kept as `av.VideoFrame` objects."""
+    buffer_pool: FrameBufferPool
+
+    def __init__(
+        self,
+        format: Optional[str],
+        size: Optional[Tuple[int, int]] = None,
+        flip: bool = False,
+        ndarray: bool = True,
+    ) -> None:
+        if ndarray and format not in NDARRAY_FORMAT_CHANNELS:
+            raise ValueError(
+                f"Frames can't be converted to arrays in the {format} format, use one of {list(NDARRAY_FORMAT_CHANNELS)}."
+            )
+        if flip and not ndarray:
+            raise ValueError("Only frames converted to arrays can be flipped.")
+        self.format = format
+        self.size = size
+        self.flip = flip
+        self.ndarray = ndarray
+        self.buffer_pool = FrameBufferPool()
+        self._reformatter: Any = av.video.reformatter.VideoReformatter()  # type: ignore
+
+    def convert(self, frame: Any) -> Any:
+        """Converts a decoded `av.VideoFrame` into an array from the buffer pool or into a new `av.VideoFrame`."""
+        width, height = self.size if self.size is not None else (None, None)
+        frame = self._reformatter.reformat(frame, width, height, self.format)
+        if not self.ndarray:
+            return frame
+        channels = NDARRAY_FORMAT_CHANNELS[cast(str, self.format)]
+        plane = frame.planes[0]
+        rows = np.frombuffer(plane, dtype=np.uint8).reshape(-1, plane.line_size)
+        rows = rows[: frame.height, : frame.width * channels]
+        shape = (
+            (frame.height, frame.width, channels)
+            if channels > 1
+            else (frame.height, frame.width)
+        )
+        array = self.buffer_pool.acquire(shape)
+        np.copyto(
+            array.reshape(frame.height, frame.width * channels),
+            rows[::-1] if self.flip else rows,
+        )
+        return array
+
+
+def _frame_converter(
+    format: Optional[str],
+    size: Optional[Tuple[int, int]],
+    flip: bool,
+    ndarray: Optional[bool],
+) -> Optional[FrameConverter]:
+    """Returns the `FrameConverter` for the conversion arguments of `VideoStream.decode` or `None` if the frames are
+    not converted. If `ndarray` is `None`, frames are converted to arrays if `format` is an array format."""
+    if format is None and size is None:
+        return None
+    if ndarray is None:
+        ndarray = format in NDARRAY_FORMAT_CHANNELS
+    return FrameConverter(format, size, flip, ndarray)
+
+
+class ColumnarSchema:
+    """Describes how the JSON samples of a `DataStream` are laid out in a NumPy structured array.
+
+    Each field is given by its name, the path of keys to its value in a sample and its NumPy type. Fields with a
+    boolean type tell whether the value at the path is present in the sample. Other fields are filled with NaN
+    when their value is missing. The array also has a float64 `timestamp` field with the timestamp of each sample.
+    """
+
+    dtype: np.dtype
+    """The type of the structured arrays."""
+
+    def __init__(self, fields: List[Tuple[str, Tuple[str, ...], Any]]) -> None:
+        self._fields = [(name, path) for name, path, _ in fields]
+        self.dtype = np.dtype(
+            [("timestamp", "f8"), *[(name, type) for name, _, type in fields]]
+        )
+        self._presence_fields = {
+            name for name, _ in self._fields if self.dtype[name] == np.bool_
+        }
+        self._paths = list(dict.fromkeys(path for _, path in self._fields))
+        self._missing_values = {
+            name: [math.nan] * math.prod(self.dtype[name].shape)
+            for name, _ in self._fields
+            if name not in self._presence_fields
+        }
+
+    def to_array(self, samples: List[Tuple[JSONObject, Optional[float]]]) -> np.ndarray:
+        """Returns a structured array with one element per sample.
+
+        The values at each path are collected into a list, sharing the lists of common prefixes of the paths, from
+        which every field is filled with a single assignment.
+        """
+        count = len(samples)
+        array = np.empty(count, dtype=self.dtype)
+        array["timestamp"] = np.fromiter(
+            (math.nan if timestamp is None else timestamp for _, timestamp in samples),
+            np.float64,
+            count,
+        )
+        columns: Dict[Tuple[str, ...], List[Any]] = {
+            (): [sample for sample, _ in samples]
+        }
+        for path in self._paths:
+            for depth in range(1, len(path) + 1):
+                if path[:depth] not in columns:
+                    key = path[depth - 1]
+                    columns[path[:depth]] = [
+                        value.get(key) if isinstance(value, dict) else None
+                        for value in columns[path[: depth - 1]]
+                    ]
+        for name, path in self._fields:
+            column = columns[path]
+            if name in self._presence_fields:
+                array[name] = np.fromiter(
+                    (value is not None for value in column), np.bool_, count
+                )
+                continue
+            field_type = self.dtype[name]
+            missing_value = self._missing_values[name]
+            if field_type.shape:
+                values = itertools.chain.from_iterable(
+                    missing_value if value is None else value for value in column
+                )
+            else:
+                values = (
+                    missing_value[0] if value is None else value for value in column
+                )
+            array[name] = np.fromiter(
+                values, field_type.base, count * len(missing_value)
+            ).reshape((count, *field_type.shape))
+        return array
+
+
+GAZE_SCHEMA = ColumnarSchema(
+    [
+        ("valid", ("gaze2d",), "?"),
+        ("gaze2d", ("gaze2d",), ("f4", 2)),
+        ("gaze3d", ("gaze3d",), ("f4", 3)),
+        *[
+            field
+            for eye in ["eyeleft", "eyeright"]
+            for field in [
+                (f"{eye}_valid", (eye, "gazedirection"), "?"),
+                (f"{eye}_gazeorigin", (eye, "gazeorigin"), ("f4", 3)),
+                (f"{eye}_gazedirection", (eye, "gazedirection"), ("f4", 3)),
+                (f"{eye}_pupildiameter", (eye, "pupildiameter"), "f4"),
+            ]
+        ],
+    ]
+)
+"""The columnar layout of gaze samples."""
+IMU_SCHEMA = ColumnarSchema(
+    [
+        ("accelerometer", ("accelerometer",), ("f4", 3)),
+        ("gyroscope", ("gyroscope",), ("f4", 3)),
+        ("magnetometer", ("magnetometer",), ("f4", 3)),
+    ]
+)
+"""The columnar layout of IMU samples. The magnetometer is sampled separately from the accelerometer and gyroscope, so
+each sample has either the first two or the last one, with NaN for the others."""
+
+
+class Stream(RTPTransportClient, ABC):
+    """Abstract class for a RTSP media stream."""
+
+    transport: RTPTransport
+    """A wrapper around a pair of UDP (or TCP) sockets."""
+    rtp_queue: RTPQueue
+    """The queue where all received raw RTP packets get queued for demuxing and decoding."""
+    rtcp_queue: asyncio.Queue[RTCP]
+    """The queue where all received raw RTCP packets get queued for demuxing and decoding."""
+    type: StreamType
+    """The type of this media stream. For example scene camera or gaze."""
+    jitter_buffer: Optional[RTPJitterBuffer]
+    """Reorders the received RTP packets before they are queued, or `None` if packets are queued in arrival order."""
+    clock: RTPClock
+    """Maps the RTP timestamps of the stream to NTP time."""
+    demux_mode: DemuxMode
+    """How the demuxer and decoder tasks take items from their queues."""
+    first_packet_time: Optional[float]
+    """The `time.monotonic()` time when the first RTP packet of the current RTSP media session was received or `None`
+    if no packet has been received since the session started."""
+    last_packet_time: Optional[float]
+    """The `time.monotonic()` time when the last RTP packet was received or `None` if no packet has been received."""
+    _last_extended_rtp_timestamp: Optional[int]
+    _callback_demuxer: Optional[
+        Tuple[
+            Callable[[RTP, Optional[float]], List[Tuple[Any, Optional[float]]]],
+            OverflowQueue[Any],
+        ]
+    ]
+
+    def __init__(
+        self,
+        transport: RTPTransport,
+        type: StreamType,
+        jitter_buffer_latency: Optional[float] = DEFAULT_JITTER_BUFFER_LATENCY,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        rtp_queue_size: int = RTP_QUEUE_SIZE,
+        demux_mode: DemuxMode = DemuxMode.BATCHED,
+    ) -> None:
+        """Initializes the stream. If `jitter_buffer_latency` is `None` no `jitter_buffer` is used.
+
+        `overflow_policy` decides what happens when more than `rtp_queue_size` packets are waiting in the `rtp_queue`.
+        """
+        transport.subscribe(self)
+        self.transport = transport
+        self.rtp_queue = RTPQueue(
+            rtp_queue_size,
+            overflow_policy,
+            self._pause_reading,
+            self._resume_reading,
+            self._is_keyframe_start,
+            self._request_keyframe,
+        )
+        self.rtcp_queue = asyncio.Queue(RTCP_QUEUE_SIZE)
+        self.type = type
+        self.jitter_buffer = (
+            None
+            if jitter_buffer_latency is None
+            else RTPJitterBuffer(jitter_buffer_latency)
+        )
+        self._jitter_buffer_timer: Optional[asyncio.TimerHandle] = None
+        self.clock = RTPClock()
+        self.demux_mode = demux_mode
+        self.first_packet_time = None
+        self.last_packet_time = None
+        self._last_extended_rtp_timestamp = None
+        self._callback_demuxer = None
+        self._rtp_queue_consumed = False
+        self._callback_dropped_count = 0
+        self._closed_sockets_kernel_dropped_count = 0
+
+    def handle_rtp(self, rtp: RTP) -> None:
+        """A callback which is called everytime a new RTP packet is received. Queues the packet and
+        calculates its absolute NTP timestamp using the `clock`.
+
+        If the stream has a `jitter_buffer` the packet passes through it before being queued. If a demuxer runs in
+        the callback, see `DemuxMode.IN_CALLBACK`, the packet is demuxed right away and the results are queued instead.
+        """
+        now = time.monotonic()
+        if self.first_packet_time is None:
+            self.first_packet_time = now
+        self.last_packet_time = now
+        ntp_timestamp = self.clock.to_ntp(cast(int, rtp.ts))  # type: ignore
+        if self.jitter_buffer is None:
+            self._queue_packet((rtp, ntp_timestamp))
+            return
+        for packet in self.jitter_buffer.push(rtp, ntp_timestamp, now):
+            self._queue_packet(packet)
+        self._schedule_jitter_buffer_release()
+
+    def _queue_packet(self, packet: Tuple[RTP, Optional[float]]) -> None:
+        if self._callback_demuxer is None:
+            self.rtp_queue.put_nowait(packet)
+            return
+        demux_packet, queue = self._callback_demuxer
+        dropped_count = queue.dropped_count
+        for item in demux_packet(*packet):
+            queue.put_nowait(item)
+        if queue.dropped_count != dropped_count:
+            self._demuxed_items_dropped()
+
+    def _demuxed_items_dropped(self) -> None:
+        """Called when demuxed items were dropped by the overflow policy of a demuxer running in the callback."""
+        pass
+
+    def _request_keyframe(self) -> None:
+        """Requests a keyframe from the sender. Only video streams have keyframes, see `VideoStream`."""
+        pass
+
+    @asynccontextmanager
+    async def _demux_in_callback(
+        self,
+        demux_packet: Callable[
+            [RTP, Optional[float]], List[Tuple[_T, Optional[float]]]
+        ],
+        is_keyframe_start: Callable[[_T], bool] = lambda item: True,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[OverflowQueue[_T]]:
+        """Demuxes every received packet with `demux_packet` in `handle_rtp` and returns the queue of the results,
+        which has the same overflow policy as the `rtp_queue` and holds up to `limit` items, by default as many as the
+        `rtp_queue`. Packets already in the `rtp_queue` are demuxed first."""
+        with self._consume_rtp_queue():
+            queue: OverflowQueue[_T] = OverflowQueue(
+                self.rtp_queue.limit if limit is None else limit,
+                self.rtp_queue.overflow_policy,
+                self._pause_reading,
+                self._resume_reading,
+                is_keyframe_start,
+            )
+            self._callback_demuxer = (demux_packet, queue)
+            for packet in self._session_packets(
+                self.rtp_queue.get_many_nowait(self.rtp_queue.qsize())
+            ):
+                self._queue_packet(packet)
+            try:
+                yield queue
+            finally:
+                self._callback_demuxer = None
+                self._callback_dropped_count += queue.dropped_count
+
+    def _session_packets(
+        self, packets: List[Tuple[RTP, Optional[float]]]
+    ) -> Iterator[Tuple[RTP, Optional[float]]]:
+        """Iterates over packets just taken from the `rtp_queue`, calling `_restart_demuxer` where the packets of a
+        new RTSP media session start, so that the packets of the previous session are demuxed with its state."""
+        session_starts = self.rtp_queue.take_session_starts(len(packets))
+        if not session_starts:
+            yield from packets
+            return
+        start = 0
+        for session_start in session_starts:
+            yield from packets[start:session_start]
+            self._restart_demuxer()
+            start = session_start
+        yield from packets[start:]
+
+    @contextmanager
+    def _consume_rtp_queue(self) -> Iterator[None]:
+        """Marks the `rtp_queue` as taken by a demuxer or decoder while in the context, raising `RuntimeError` if it
+        already is, since the packets of a stream can only be consumed once."""
+        if self._rtp_queue_consumed:
+            raise RuntimeError(f"The {self.type.name} stream is already demuxed.")
+        self._rtp_queue_consumed = True
+        try:
+            yield
+        finally:
+            self._rtp_queue_consumed = False
+
+    def _schedule_jitter_buffer_release(self) -> None:
+        """Makes sure held back packets are released when they expire, even if no more packets arrive."""
+        assert self.jitter_buffer is not None
+        deadline = self.jitter_buffer.deadline
+        if deadline is None or self._jitter_buffer_timer is not None:
+            return
+        self._jitter_buffer_timer = asyncio.get_running_loop().call_later(
+            max(deadline - time.monotonic(), 0), self._release_jitter_buffer
+        )
+
+    def _release_jitter_buffer(self) -> None:
+        assert self.jitter_buffer is not None
+        self._jitter_buffer_timer = None
+        for packet in self.jitter_buffer.release(time.monotonic()):
+            self._queue_packet(packet)
+        self._schedule_jitter_buffer_release()
+
+    @property
+    def _datagram_transport(self) -> Any:
+        """The asyncio transport of the RTP socket or `None` if the stream doesn't receive over UDP."""
+        return getattr(getattr(self.transport, "rtp_sink", None), "transport", None)
+
+    @property
+    def _rtp_socket(self) -> Optional[socket.socket]:
+        datagram_transport = self._datagram_transport
+        if datagram_transport is None:
+            return None
+        return datagram_transport.get_extra_info("socket")
+
+    def set_receive_buffer_size(self, size: int) -> Optional[int]:
+        """Sets the receive buffer size of the RTP socket in bytes and returns the effective `receive_buffer_size`, or
+        `None` if the stream doesn't receive over UDP.
+
+        The kernel caps the size, at `net.core.rmem_max` on Linux unless the process has the `CAP_NET_ADMIN`
+        capability. Linux reports twice the requested size, since the buffer also holds bookkeeping data. If the size
+        can't be set at all, a warning is logged and the current size is returned.
+        """
+        sock = self._rtp_socket
+        if sock is None:
+            return None
+        forced = False
+        if sys.platform.startswith("linux"):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, _SO_RCVBUFFORCE, size)
+                forced = True
+            except OSError:
+                # Without CAP_NET_ADMIN, or where the option isn't supported, the size is capped
+                pass
+        if not forced:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+            except OSError as error:
+                _logger.warning(
+                    f"The receive buffer of the {self.type.name} RTP socket couldn't be set to {size} bytes: {error}"
+                )
+        effective_size = self.receive_buffer_size
+        if effective_size is not None and effective_size < size:
+            _logger.warning(
+                f"The {self.type.name} RTP socket got a receive buffer of {effective_size} bytes instead of {size}."
+            )
+        return effective_size
+
+    @property
+    def receive_buffer_size(self) -> Optional[int]:
+        """The receive buffer size of the RTP socket in bytes as reported by the kernel, or `None` if the stream doesn't
+        receive over UDP."""
+        sock = self._rtp_socket
+        if sock is None:
+            return None
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+    @property
+    def kernel_dropped_count(self) -> Optional[int]:
+        """The number of RTP datagrams the kernel dropped because the receive buffer of the socket was full, or `None`
+        if it isn't known.
+
+        Only available on Linux, where the drop counter of the socket is read with the `SO_MEMINFO` socket option.
+        The asyncio transports read datagrams without ancillary data, so the `SO_RXQ_OVFL` counter can't be used.
+        """
+        sock = self._rtp_socket
+        if sock is None or not sys.platform.startswith("linux"):
+            return None
+        try:
+            meminfo = sock.getsockopt(
+                socket.SOL_SOCKET, _SO_MEMINFO, 4 * (_SK_MEMINFO_DROPS + 1)
+            )
+        except OSError:
+            return None
+        return (
+            self._closed_sockets_kernel_dropped_count
+            + struct.unpack_from("=I", meminfo, 4 * _SK_MEMINFO_DROPS)[0]
+        )
+
+    @property
+    def packet_counts(self) -> Tuple[int, int]:
+        """The number of RTP packets expected from the sequence numbers and the number of packets received in the
+        current RTSP media session, as counted by the transport for its receiver reports. Both are 0 for transports
+        which don't count packets."""
+        transport_stats = getattr(self.transport, "stats", None)
+        if getattr(transport_stats, "base_seq", None) is None:
+            return 0, 0
+        return (
+            cast(int, transport_stats.extended_seq - transport_stats.base_seq + 1),  # type: ignore
+            cast(int, transport_stats.received),  # type: ignore
+        )
+
+    def attach_transport(self, transport: RTPTransport) -> None:
+        """Moves the stream to the transport of a new RTSP media session.
+
+        Queued packets are kept, while the state which belongs to the previous session, such as the `clock` and
+        the sequence numbers, is reset. The demuxer keeps its state until it gets to the first packet of the new
+        session, see `RTPQueue.mark_session_start`.
+        """
+        kernel_dropped_count = self.kernel_dropped_count
+        if kernel_dropped_count is not None:
+            self._closed_sockets_kernel_dropped_count = kernel_dropped_count
+        self.transport.unsubscribe(self)  # type: ignore
+        transport.subscribe(self)
+        self.transport = transport
+        self._restart_session()
+
+    def _restart_session(self) -> None:
+        """Resets the state of the receiving side which belongs to an RTSP media session and marks the start of the
+        new session in the `rtp_queue`, or restarts the demuxer right away if it runs in the callback. Subclasses
+        reset their own state as well."""
+        if self.jitter_buffer is not None:
+            for packet in self.jitter_buffer.flush():
+                self._queue_packet(packet)
+        self.clock = RTPClock(self.clock.clock_rate, self.clock.window)
+        self.first_packet_time = None
+        if self._callback_demuxer is None:
+            self.rtp_queue.mark_session_start()
+        else:
+            self._restart_demuxer()
+
+    def _restart_demuxer(self) -> None:
+        """Resets the state of the demuxer which belongs to an RTSP media session, once the packets of the previous
+        session have been demuxed. Subclasses reset their own state as well."""
+        self._last_extended_rtp_timestamp = None
+
+    def _pause_reading(self) -> bool:
+        """Pauses reading from the RTP socket and returns whether it was possible."""
+        datagram_transport = self._datagram_transport
+        if datagram_transport is None:
+            _logger.warning(
+                f"The {self.type.name} RTP queue is full and the transport can't be paused. Dropping the oldest packets instead."
+            )
+            return False
+        datagram_transport.pause_reading()
+        return True
+
+    def _resume_reading(self) -> None:
+        datagram_transport = self._datagram_transport
+        if datagram_transport is not None:
+            datagram_transport.resume_reading()
+
+    def _is_keyframe_start(self, rtp: RTP) -> bool:
+        """Should tell whether the packet starts a keyframe. Every packet is a valid starting point by default."""
+        return True
+
+    def handle_rtcp(self, rtcp: RTCP) -> None:
+        """A callback which is called everytime a new RTCP packet is received. Queues the packet and
+        updates the `clock` with the sender reports.
+
+        Packets which were queued before the first sender report get their timestamps when it arrives.
+        """
+        try:
+            self.rtcp_queue.put_nowait(rtcp)
+        except asyncio.QueueFull:
+            _logger.warning(
+                "RTCP queue full. New RTCP packages will be thrown away. Consume the queue to prevent this from happening."
+            )
+        sender_report = cast(Optional[SR], rtcp.get(200))
+        if sender_report is None:
+            return
+        is_first_sender_report = not self.clock.is_synchronized
+        self.clock.add_sender_report(
+            cast(int, sender_report.ts), cast(float, sender_report.ntp)
+        )
+        if is_first_sender_report:
+            self._fill_missing_timestamps()
+
+    def _fill_missing_timestamps(self) -> None:
+        def timestamp(rtp: RTP) -> Optional[float]:
+            return self.clock.to_ntp(cast(int, rtp.ts))  # type: ignore
+
+        self.rtp_queue.fill_missing_timestamps(timestamp)
+        if self.jitter_buffer is not None:
+            self.jitter_buffer.fill_missing_timestamps(timestamp)
+
+    def _extend_rtp_timestamp(self, rtp_timestamp: int) -> int:
+        """Extends a 32 bit RTP timestamp to an unbounded timestamp which is continuous over wraparounds."""
+        if self._last_extended_rtp_timestamp is None:
+            extended_rtp_timestamp = rtp_timestamp
+        else:
+            delta = (rtp_timestamp - self._last_extended_rtp_timestamp) & 0xFFFFFFFF
+            if delta >= 0x80000000:
+                delta -= 0x100000000
+            extended_rtp_timestamp = self._last_extended_rtp_timestamp + delta
+        self._last_extended_rtp_timestamp = extended_rtp_timestamp
+        return extended_rtp_timestamp
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Contains some media stream statistics. Used mainly for debugging purposes.
+
+        The base class contains the packet counters of the transport, the RTP queue and the jitter buffer and the state
+        of the clock. Items dropped after being demuxed in the callback are counted in `demux_dropped_count`. Streams
+        received over UDP also report the effective `receive_buffer_size` and, on Linux, the `kernel_dropped_count`.
+        Subclasses extend it with their own statistics.
+        """
+        demux_dropped_count = self._callback_dropped_count
+        if self._callback_demuxer is not None:
+            demux_dropped_count += self._callback_demuxer[1].dropped_count
+        stats: Dict[str, Union[int, float]] = {
+            "dropped_count": self.rtp_queue.dropped_count,
+            "demux_dropped_count": demux_dropped_count,
+            "clock_drift_ppm": self.clock.drift * 1e6,
+            "clock_step_count": self.clock.step_count,
+        }
+        stats["expected_count"], stats["received_count"] = self.packet_counts
+        receive_buffer_size = self.receive_buffer_size
+        if receive_buffer_size is not None:
+            stats["receive_buffer_size"] = receive_buffer_size
+        kernel_dropped_count = self.kernel_dropped_count
+        if kernel_dropped_count is not None:
+            stats["kernel_dropped_count"] = kernel_dropped_count
+        if self.jitter_buffer is not None:
+            stats["lost_count"] = self.jitter_buffer.lost_count
+            stats["reordered_count"] = self.jitter_buffer.reordered_count
+            stats["late_count"] = self.jitter_buffer.late_count
+            stats["duplicate_count"] = self.jitter_buffer.duplicate_count
+            stats["resync_count"] = self.jitter_buffer.resync_count
+        return stats
+
+    @property
+    def media_stream_configuration(self) -> MediaStreamConfiguration:
+        """A `MediaStreamConfiguration` for this media stream which is used for configuring the `RTSPMediaSession`"""
+        return MediaStreamConfiguration(
+            self.transport, self.media_type, self.media_index
+        )
+
+    @abstractproperty
+    def media_type(self) -> MediaType:
+        """Should be the media type identifier of the `Stream` subclass."""
+        raise NotImplementedError
+
+    @property
+    def media_index(self) -> int:
+        """The media index of the stream.
+
+        Every separate media stream in the RTSP media session is identified by its `media_type` and its `media_index`.
+        """
+        match self.type:
+            case StreamType.SCENE_CAMERA:
+                return 0
+            case StreamType.AUDIO:
+                return 0
+            case StreamType.EYE_CAMERAS:
+                return 1
+            case StreamType.GAZE:
+                return 0
+            case StreamType.SYNC:
+                return 1
+            case StreamType.IMU:
+                return 2
+            case StreamType.EVENTS:
+                return 3
+
+    @classmethod
+    @asynccontextmanager
+    async def setup(
+        cls,
+        connection: RTSPConnection,
+        stream_type: StreamType,
+        scheme: str,
+        receive_buffer_size: Optional[int] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Stream]:
+        """The main entry point of a `Stream`.
+
+        Sets up a transport for RTP and RTCP packets and instantiates a `Stream` object containing the transport.
+        If `receive_buffer_size` is given, it's set on the RTP socket of UDP transports, see `set_receive_buffer_size`.
+        Any extra keyword arguments are passed on to the constructor of the `Stream` subclass.
+        """
+        transport_class = transport_for_scheme(scheme)
+        async with transport_class(connection) as transport:
+            stream = cls(transport, stream_type, **kwargs)
+            if receive_buffer_size is not None:
+                stream.set_receive_buffer_size(receive_buffer_size)
+            yield stream
+
+    @abstractmethod
+    @asynccontextmanager
+    async def demux(self) -> AsyncIterator[asyncio.Queue[Tuple[Any, Optional[float]]]]:
+        """Should return a queue with tuples containing the demuxed RTP stream along with timestamps."""
+        raise NotImplementedError
+        yield
+
+    @abstractmethod
+    @asynccontextmanager
+    async def decode(self) -> AsyncIterator[asyncio.Queue[Tuple[Any, Optional[float]]]]:
+        """Should return a queue with tuples containing the demuxed and decoded RTP stream along with timestamps."""
+        raise NotImplementedError
+        yield
+
+    @asynccontextmanager
+    async def broadcast(self, **decode_kwargs: Any) -> AsyncIterator[Broadcast]:
+        """Decodes the stream once and returns a `Broadcast` which feeds the decoded items to any number of subscribers.
+
+        All demuxers and decoders of a stream take their packets from the same `rtp_queue`, so only one of them may
+        run at a time and entering another raises `RuntimeError`. Use a broadcast when several consumers need the
+        stream. Any keyword arguments are passed on to `decode`.
+        """
+        async with self.decode(**decode_kwargs) as decoded_queue:  # type: ignore
+            broadcast = Broadcast(decoded_queue)
+            broadcaster_task = _utils.create_task(broadcast.run(), name="broadcaster")
+            try:
+                yield broadcast
+            finally:
+                broadcaster_task.cancel()
+                try:
+                    await broadcaster_task
+                except asyncio.CancelledError:
+                    pass
+
+
+class DataStream(Stream):
+    """Represents a RTSP data stream of JSON samples, which is used for the gaze, sync-port, IMU and events streams.
+
+    Every RTP packet carries one sample. The samples can be decoded one by one with `decode` or, for the gaze and IMU
+    streams, into batches of NumPy arrays with `decode_batches`.
+    """
+
+    def __init__(
+        self,
+        transport: RTPTransport,
+        stream_type: StreamType,
+        jitter_buffer_latency: Optional[float] = DEFAULT_JITTER_BUFFER_LATENCY,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        rtp_queue_size: int = RTP_QUEUE_SIZE,
+        demux_mode: DemuxMode = DemuxMode.BATCHED,
+    ) -> None:
+        if overflow_policy == OverflowPolicy.DROP_UNTIL_KEYFRAME:
+            raise ValueError(f"{overflow_policy} can only be used for video streams.")
+        super().__init__(
+            transport,
+            stream_type,
+            jitter_buffer_latency,
+            overflow_policy,
+            rtp_queue_size,
+            demux_mode,
+        )
+        self._sample_count = 0
+        self._malformed_count = 0
+
+    @property
+    def media_type(self) -> MediaType:
+        return "application"
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            **super().stats,
+            "samples": self._sample_count,
+            "malformed_count": self._malformed_count,
+        }
+
+    @property
+    def columnar_schema(self) -> ColumnarSchema:
+        """The layout of the arrays from `decode_batches`."""
+        match self.type:
+            case StreamType.GAZE:
+                return GAZE_SCHEMA
+            case StreamType.IMU:
+                return IMU_SCHEMA
+            case _:
+                raise ValueError(
+                    f"The {self.type.name} stream can't be decoded into batches."
+                )
+
+    @asynccontextmanager
+    async def demux(
+        self,
+    ) -> AsyncIterator[asyncio.Queue[Tuple[bytes, Optional[float]]]]:
+        if self.demux_mode == DemuxMode.IN_CALLBACK:
+            async with self._demux_in_callback(
+                lambda rtp, timestamp: [(cast(bytes, rtp.data), timestamp)],  # type: ignore
+            ) as data_queue:
+                yield data_queue
+            return
+        data_queue: asyncio.Queue[Tuple[bytes, Optional[float]]] = asyncio.Queue(
+            DATA_QUEUE_SIZE
+        )
+
+        async def demuxer():
+            while True:
+                packets = await _get_items(self.rtp_queue, self.demux_mode)
+                await _put_items(
+                    data_queue,
+                    [(cast(bytes, rtp.data), timestamp) for rtp, timestamp in packets],  # type: ignore
+                    self.demux_mode,
+                )
+
+        with self._consume_rtp_queue():
+            demuxer_task = _utils.create_task(demuxer(), name="demuxer")
+            try:
+                yield data_queue
+            finally:
+                demuxer_task.cancel()
+                try:
+                    await demuxer_task
+                except asyncio.CancelledError:
+                    pass
+
+    @asynccontextmanager
+    async def decode(
+        self,
+    ) -> AsyncIterator[asyncio.Queue[Tuple[JSONObject, Optional[float]]]]:
+        if self.demux_mode == DemuxMode.IN_CALLBACK:
+            async with self._demux_in_callback(self._parse_packet) as json_queue:
+                yield json_queue
+            return
+        json_queue: asyncio.Queue[Tuple[JSONObject, Optional[float]]] = asyncio.Queue(
+            DATA_QUEUE_SIZE
+        )
+
+        async with self.demux() as data_queue:
+
+            async def decoder():
+                while True:
+                    samples: List[Tuple[JSONObject, Optional[float]]] = []
+                    for data, timestamp in await _get_items(
+                        data_queue, self.demux_mode
+                    ):
+                        json_message = self._parse_sample(data)
+                        if json_message is not None:
+                            samples.append((json_message, timestamp))
+                    await _put_items(json_queue, samples, self.demux_mode)
+
+            decoder_task = _utils.create_task(decoder(), name="decoder")
+            try:
+                yield json_queue
+            finally:
+                decoder_task.cancel()
+                try:
+                    await decoder_task
+                except asyncio.CancelledError:
+                    pass
+
+    @asynccontextmanager
+    async def decode_batches(
+        self, batch_size: int = DEFAULT_BATCH_SIZE, window: Optional[float] = None
+    ) -> AsyncIterator[asyncio.Queue[np.ndarray]]:
+        """Returns a queue with batches of decoded samples as NumPy structured arrays laid out by `columnar_schema`.
+
+        Spawns a decoder task which takes all received RTP packets from the queue at once and parses them into a batch. A batch is
+        put on the queue when it holds `batch_size` samples or, if `window` is given, when `window` seconds have passed
+        since its first sample was received. Without a `window`, a batch is put on the queue as soon as no more
+        packets are available.
+        """
+        schema = self.columnar_schema
+        batch_queue: asyncio.Queue[np.ndarray] = asyncio.Queue(BATCH_QUEUE_SIZE)
+
+        async def decoder():
+            loop = asyncio.get_running_loop()
+            while True:
+                samples: List[Tuple[JSONObject, Optional[float]]] = []
+                deadline = None
+                while len(samples) < batch_size:
+                    if self.rtp_queue.empty():
+                        if deadline is None:
+                            if samples:
+                                break
+                            packets = [await self.rtp_queue.get()]
+                        else:
+                            try:
+                                packets = [
+                                    await asyncio.wait_for(
+                                        self.rtp_queue.get(), deadline - loop.time()
+                                    )
+                                ]
+                            except asyncio.TimeoutError:
+                                break
+                    else:
+                        packets = self.rtp_queue.get_many_nowait(
+                            batch_size - len(samples)
+                        )
+                    for rtp, timestamp in packets:
+                        sample = self._parse_sample(cast(bytes, rtp.data))  # type: ignore
+                        if sample is None:
+                            continue
+                        samples.append((sample, timestamp))
+                        if window is not None and deadline is None:
+                            deadline = loop.time() + window
+                await batch_queue.put(schema.to_array(samples))
+
+        with self._consume_rtp_queue():
+            decoder_task = _utils.create_task(decoder(), name="batch_decoder")
+            try:
+                yield batch_queue
+            finally:
+                decoder_task.cancel()
+                try:
+                    await decoder_task
+                except asyncio.CancelledError:
+                    pass
+
+    def _parse_packet(
+        self, rtp: RTP, timestamp: Optional[float]
+    ) -> List[Tuple[JSONObject, Optional[float]]]:
+        """Parses the JSON sample in an RTP packet, returning it along with its timestamp if it could be parsed."""
+        sample = self._parse_sample(cast(bytes, rtp.data))  # type: ignore
+        return [] if sample is None else [(sample, timestamp)]
+
+    def _parse_sample(self, data: bytes) -> Optional[JSONObject]:
+        """Parses the JSON sample in an RTP payload or returns `None` if it can't be parsed."""
+        try:
+            sample = jsoncodec.loads(data)
+        except ValueError:
+            # Either a json.JSONDecodeError or a UnicodeDecodeError for payloads which aren't UTF-8
+            self._malformed_count += 1
+            _logger.debug(
+                f"Received data that couldn't be decoded{' since it was empty.' if len(data) == 0 else '.'}"
+            )
+            return None
+        self._sample_count += 1
+        return sample
+
+
+class VideoStream(Stream):
+    """Represents a RTSP video stream.
+
+    Handles demuxing and decoding of video frames.
+
+    By default the frames are decoded directly in the decoder task on the event loop. If a
+    `decoder_executor` is given, PyAV (ffmpeg) is instead run in that executor so that decoding
+    doesn't block other tasks on the event loop, such as the websocket receiver. The executor must be
+    thread based, for example a `concurrent.futures.ThreadPoolExecutor`, since the codec context
+    can't be shared between processes.
+
+    When packets are lost or a frame can't be decoded, a keyframe is requested from the glasses with an
+    RTCP feedback message of kind `keyframe_request`, so the picture recovers within one round trip instead
+    of at the next scheduled IDR frame.
+
+    With `adaptive_skipping` the decoder skips frames when it falls behind. When the queue of access units
+    waiting to be decoded is half full, non-reference frames are skipped and when it is almost full only
+    keyframes are decoded. Full decoding resumes once the queue has drained, waiting for a keyframe if
+    reference frames were skipped.
+
+    `decoder_threading` and `decoder_thread_count` select how FFmpeg uses threads for decoding, see
+    `DecoderThreading`.
+    """
+
+    _fua_buffer: FUAReassemblyBuffer
+    _access_unit: Optional[Tuple[AccessUnit, Optional[float]]]
+    decoder_executor: Optional[Executor]
+    """The executor PyAV decoding is run in or `None` if decoding is done on the event loop."""
+    keyframe_request: Optional[KeyframeRequestKind]
+    """The kind of RTCP feedback used to request keyframes or `None` if keyframes are never requested."""
+    adaptive_skipping: bool
+    """Whether the decoder skips frames when it can't keep up with the stream."""
+    first_frame_time: Optional[float]
+    """The `time.monotonic()` time when the first frame was decoded or `None` if no frame has been decoded yet."""
+    skip_level: SkipLevel
+    """The frames currently skipped by the decoder."""
+
+    def __init__(
+        self,
+        transport: RTPTransport,
+        stream_type: StreamType,
+        decoder_executor: Optional[Executor] = None,
+        jitter_buffer_latency: Optional[float] = DEFAULT_JITTER_BUFFER_LATENCY,
+        keyframe_request: Optional[KeyframeRequestKind] = KeyframeRequestKind.PLI,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_UNTIL_KEYFRAME,
+        rtp_queue_size: int = RTP_QUEUE_SIZE,
+        adaptive_skipping: bool = False,
+        decoder_threading: DecoderThreading = DecoderThreading.LOW_LATENCY,
+        decoder_thread_count: int = 0,
+        demux_mode: DemuxMode = DemuxMode.BATCHED,
+    ) -> None:
+        super().__init__(
+            transport,
+            stream_type,
+            jitter_buffer_latency,
+            overflow_policy,
+            rtp_queue_size,
+            demux_mode,
+        )
+        self.codec_context: Any = av.CodecContext.create("h264", "r")  # type: ignore
+        self.codec_context.options = decoder_threading.codec_options(
+            decoder_thread_count
+        )
+        self.decoder_executor = decoder_executor
+        self.keyframe_request = keyframe_request
+        self.adaptive_skipping = adaptive_skipping
+        self.skip_level = SkipLevel.NONE
+        self.sps_or_pps_received = False
+        self._demux_in_count = 0
+        self._demux_out_count = 0
+        self._decode_count = 0
+        self._fragment_count = 0
+        self._fua_buffer = FUAReassemblyBuffer()
+        self._access_unit = None
+        self._unhandled_count = 0
+        self._unhandled_types: Set[int] = set()
+        self._malformed_count = 0
+        self._last_sequence_number: Optional[int] = None
+        self._discarded_fragmented_count = 0
+        self._media_ssrc: Optional[int] = None
+        self._decode_error_count = 0
+        self._keyframe_request_count = 0
+        self._keyframe_requested_at: Optional[float] = None
+        self._fir_sequence_number = 0
+        self._last_keyframe_request_time = 0.0
+        self._recovery_count = 0
+        self._last_recovery_time = 0.0
+        self._total_recovery_time = 0.0
+        self._pending_decode_time = 0.0
+        self._total_frame_decode_time = 0.0
+        self._last_frame_decode_time = 0.0
+        self._superseded_count = 0
+        self._skipped_count = 0
+        self._sdp_parameter_sets: Optional[List[NALUnit]] = None
+        self._next_session_parameter_sets: Optional[List[NALUnit]] = None
+        self._waiting_for_keyframe = False
+        self._keyframe_request_pending = False
+        self.first_frame_time = None
+
+    @property
+    def media_type(self) -> MediaType:
+        """The media type identifier of a `VideoStream`."""
+        return "video"
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Contains some media stream statistics. Used mainly for debugging purposes.
+
+        Decode times are given in seconds per decoded frame. Recovery times are the times in seconds from
+        the first keyframe request after an error until a keyframe was received. The skip level is the
+        index of the current `SkipLevel`, where 0 means that all frames are decoded.
+        """
+        mean_frame_decode_time = (
+            self._total_frame_decode_time / self._decode_count
+            if self._decode_count
+            else 0.0
+        )
+        mean_recovery_time = (
+            self._total_recovery_time / self._recovery_count
+            if self._recovery_count
+            else 0.0
+        )
+        return {
+            **super().stats,
+            "demux_in_count": self._demux_in_count,
+            "demux_out_count": self._demux_out_count,
+            "decode_count": self._decode_count,
+            "unhandled_count": self._unhandled_count,
+            "malformed_count": self._malformed_count,
+            "discarded_fragmented_count": self._discarded_fragmented_count,
+            "last_frame_decode_time": self._last_frame_decode_time,
+            "mean_frame_decode_time": mean_frame_decode_time,
+            "decode_error_count": self._decode_error_count,
+            "keyframe_request_count": self._keyframe_request_count,
+            "last_recovery_time": self._last_recovery_time,
+            "mean_recovery_time": mean_recovery_time,
+            "superseded_count": self._superseded_count,
+            "skip_level": list(SkipLevel).index(self.skip_level),
+            "skipped_count": self._skipped_count,
+        }
+
+    def prime_decoder(self, sdp: Any) -> bool:
+        """Primes the decoder with the parameter sets in the `sprop-parameter-sets` of the stream's media description in
+        the SDP of the RTSP session, described in RFC 6184 section
+        [8.1](https://datatracker.ietf.org/doc/html/rfc6184#section-8.1).
+
+        A primed decoder doesn't need to wait for parameter sets in the stream. Instead decoding starts at the first
+        keyframe, which the parameter sets are prepended to, and a keyframe is requested if the stream starts with
+        other frames. Returns whether the SDP contained any parameter sets.
+
+        When the stream has been moved to a new session, the parameter sets are used from the first packet of the new
+        session on, see `attach_transport`.
+        """
+        try:
+            fmtp = sdp.get_media(self.media_type, self.media_index)["attributes"]["fmtp"]  # type: ignore
+            sprop_parameter_sets = cast(str, fmtp["sprop-parameter-sets"])
+            parameter_sets = [
+                base64.b64decode(parameter_set, validate=True)
+                for parameter_set in sprop_parameter_sets.split(",")
+                if parameter_set
+            ]
+        except (KeyError, IndexError, TypeError, ValueError) as error:
+            _logger.debug(f"No parameter sets found in the SDP: {error!r}")
+            return False
+        nal_units = [
+            NALUnit(parameter_set) for parameter_set in parameter_sets if parameter_set
+        ]
+        nal_units = [nal_unit for nal_unit in nal_units if nal_unit.type in [7, 8]]
+        if not nal_units:
+            return False
+        if self.rtp_queue.session_start_pending:
+            self._next_session_parameter_sets = nal_units
+        else:
+            self._sdp_parameter_sets = nal_units
+            self._waiting_for_keyframe = True
+        self.sps_or_pps_received = True
+        return True
+
+    def handle_rtp(self, rtp: RTP) -> None:
+        self._media_ssrc = cast(int, rtp.ssrc)  # type: ignore
+        if self._keyframe_request_pending:
+            # The first packet of a new session, now that the keyframe can be requested from its sender
+            self._keyframe_request_pending = False
+            if not self._is_keyframe_start(rtp):
+                self._request_keyframe()
+        super().handle_rtp(rtp)
+
+    def _is_keyframe_start(self, rtp: RTP) -> bool:
+        """Tells whether the packet starts a keyframe, which is the case if it starts a parameter set or an IDR picture."""
+        if not rtp.data:  # type: ignore
+            return False
+        nal_unit = NALUnit.from_rtp_payload(cast(bytes, rtp.data))  # type: ignore
+        if isinstance(nal_unit, FUA):
+            return bool(nal_unit.s) and nal_unit.original_type == 5
+        if isinstance(nal_unit, AggregationPacket):
+            return any(
+                contained_nal_unit.type in [5, 7, 8]
+                for contained_nal_unit in nal_unit.nal_units
+            )
+        return nal_unit.type in [5, 7, 8]
+
+    @asynccontextmanager
+    async def demux(
+        self,
+    ) -> AsyncIterator[asyncio.Queue[Tuple[AccessUnit, Optional[float]]]]:
+        """Returns a queue with tuples containing the demuxed RTP stream along with timestamps.
+
+        Spawns a demuxer task which parses the NAL units received in the RTP payloads, unpacking
+        single NAL unit packets and aggregation packets (STAP-A, STAP-B, MTAP16 and MTAP24).
+        It also aggregates fragmentation units of larger NAL units sent in multiple RTP packets,
+        discarding fragmented NAL units with missing fragments, and groups the NAL units into access units by their RTP timestamp and marker bit.
+
+        With `DemuxMode.IN_CALLBACK` this is instead done in `handle_rtp` and a keyframe is requested when access
+        units are dropped from the full queue, which holds up to `FRAME_QUEUE_SIZE` access units either way.
+        """
+        if self.demux_mode == DemuxMode.IN_CALLBACK:
+            async with self._demux_in_callback(
+                self._demux_rtp,
+                lambda access_unit: access_unit.is_keyframe,
+                FRAME_QUEUE_SIZE,
+            ) as access_unit_queue:
+                yield access_unit_queue
+            return
+        access_unit_queue: asyncio.Queue[
+            Tuple[AccessUnit, Optional[float]]
+        ] = asyncio.Queue(FRAME_QUEUE_SIZE)
+
+        async def demuxer():
+            while True:
+                access_units: List[Tuple[AccessUnit, Optional[float]]] = []
+                for rtp, timestamp in self._session_packets(
+                    await _get_items(self.rtp_queue, self.demux_mode)
+                ):
+                    access_units.extend(self._demux_rtp(rtp, timestamp))
+                await _put_items(access_unit_queue, access_units, self.demux_mode)
+
+        with self._consume_rtp_queue():
+            demuxer_task = _utils.create_task(demuxer(), name="demuxer")
+            try:
+                yield access_unit_queue
+            finally:
+                demuxer_task.cancel()
+                try:
+                    await demuxer_task
+                except asyncio.CancelledError:
+                    pass
+
+    def _demux_rtp(
+        self, rtp: RTP, timestamp: Optional[float]
+    ) -> List[Tuple[AccessUnit, Optional[float]]]:
+        """Demuxes an RTP packet and returns the access units it completed, usually none or one."""
+        self._demux_in_count += 1
+        completed: List[Tuple[AccessUnit, Optional[float]]] = []
+        rtp_timestamp = self._extend_rtp_timestamp(cast(int, rtp.ts))  # type: ignore
+        if (
+            self._access_unit is not None
+            and self._access_unit[0].rtp_timestamp != rtp_timestamp
+        ):
+            # The packet with the marker bit of the previous access unit was lost
+            access_unit = self._finish_access_unit()
+            if access_unit is not None:
+                completed.append(access_unit)
+        sequence_number = cast(int, rtp.seq)  # type: ignore
+        if (
+            self._last_sequence_number is not None
+            and (sequence_number - self._last_sequence_number) & 0xFFFF != 1
+        ):
+            # Packets are missing so the picture will be corrupt until the next keyframe, unless this packet starts
+            # the keyframe which has already been requested
+            if self._keyframe_requested_at is None or not self._is_keyframe_start(rtp):
+                self._request_keyframe()
+            if self._fua_buffer.in_progress:
+                # The fragmented NAL unit can't be completed
+                self._fua_buffer.discard()
+                self._discarded_fragmented_count += 1
+        self._last_sequence_number = sequence_number
+        if not rtp.data:  # type: ignore
+            self._malformed_count += 1
+            return completed
+        nal_units = self._depacketize(
+            NALUnit.from_rtp_payload(cast(bytes, rtp.data))  # type: ignore
+        )
+        if nal_units:
+            if self._access_unit is None:
+                self._access_unit = (AccessUnit(rtp_timestamp), timestamp)
+            self._access_unit[0].nal_units.extend(nal_units)
+        if rtp.m and self._access_unit is not None:  # type: ignore
+            access_unit = self._finish_access_unit()
+            if access_unit is not None:
+                completed.append(access_unit)
+        return completed
+
+    def _demuxed_items_dropped(self) -> None:
+        self._request_keyframe()
+
+    def _restart_session(self) -> None:
+        """Forgets the sender of the previous session, along with its pending keyframe request, and requests a
+        keyframe when the first packet of the new session is received, unless it starts one."""
+        super()._restart_session()
+        self._media_ssrc = None
+        self._keyframe_requested_at = None
+        self._last_keyframe_request_time = 0.0
+        self._keyframe_request_pending = True
+
+    def _restart_demuxer(self) -> None:
+        """Drops the partial access unit of the previous session and waits for a keyframe of the new session, since
+        the frames before it reference pictures the decoder doesn't have."""
+        super()._restart_demuxer()
+        self._last_sequence_number = None
+        if self._fua_buffer.in_progress:
+            self._fua_buffer.discard()
+            self._discarded_fragmented_count += 1
+        self._access_unit = None
+        self._waiting_for_keyframe = True
+        if self._next_session_parameter_sets is not None:
+            self._sdp_parameter_sets = self._next_session_parameter_sets
+            self._next_session_parameter_sets = None
+
+    def _depacketize(self, nal_unit: NALUnit) -> List[NALUnit]:
+        """Returns the complete NAL units carried in an RTP payload, if any."""
+        if isinstance(nal_unit, FUA):
+            # Fragmented NAL units need to be aggregated
+            if nal_unit.s:
+                if not self.sps_or_pps_received:
+                    return []
+                self._fua_buffer.start(nal_unit)
+                self._fragment_count = 1
+                return []
+            if not self._fua_buffer.in_progress:
+                # The start of the fragmented NAL unit was never received
+                return []
+            self._fua_buffer.append(nal_unit)
+            self._fragment_count += 1
+            if nal_unit.e:
+                return [self._fua_buffer.finish()]
+            return []
+        if isinstance(nal_unit, AggregationPacket):
+            nal_units = nal_unit.nal_units
+        elif 1 <= nal_unit.type <= 23:
+            # Self contained NAL unit
+            nal_units = [nal_unit]
+        else:
+            self._unhandled_count += 1
+            if nal_unit.type not in self._unhandled_types:
+                self._unhandled_types.add(nal_unit.type)
+                _logger.warning(
+                    f"Unhandled NAL unit of type {nal_unit.type}. Further NAL units of this type are dropped silently."
+                )
+            return []
+        if not self.sps_or_pps_received:
+            # SPS or PPS should be the first NAL units to be decoded
+            for i, contained_nal_unit in enumerate(nal_units):
+                if contained_nal_unit.type in [7, 8]:
+                    self.sps_or_pps_received = True
+                    return nal_units[i:]
+            return []
+        return nal_units
+
+    def _finish_access_unit(self) -> Optional[Tuple[AccessUnit, Optional[float]]]:
+        """Finishes the current access unit and returns it, unless it's dropped while waiting for the first keyframe
+        of a primed decoder or of a new RTSP media session."""
+        assert self._access_unit is not None
+        if self._fua_buffer.in_progress:
+            # The end of a fragmented NAL unit was lost
+            self._fua_buffer.discard()
+            self._discarded_fragmented_count += 1
+        access_unit = self._access_unit
+        self._access_unit = None
+        if self._waiting_for_keyframe:
+            if not access_unit[0].is_keyframe:
+                # Nothing can be decoded before the first keyframe
+                self._request_keyframe()
+                return None
+            self._waiting_for_keyframe = False
+        if self._sdp_parameter_sets is not None:
+            access_unit[0].nal_units[:0] = self._sdp_parameter_sets
+            self._sdp_parameter_sets = None
+        self._demux_out_count += 1
+        if self._keyframe_requested_at is not None and access_unit[0].is_keyframe:
+            self._last_recovery_time = time.monotonic() - self._keyframe_requested_at
+            self._total_recovery_time += self._last_recovery_time
+            self._recovery_count += 1
+            self._keyframe_requested_at = None
+            # The next FIR is a new request, see RFC 5104 section 4.3.1
+            self._fir_sequence_number = (self._fir_sequence_number + 1) & 0xFF
+        return access_unit
+
+    def _request_keyframe(self) -> None:
+        """Requests a keyframe from the sender unless one was requested recently.
+
+        Repeated requests before a keyframe has been received are repetitions of the same request, so FIRs keep their
+        sequence number until then.
+        """
+        sender_ssrc = getattr(getattr(self.transport, "stats", None), "ssrc", None)
+        if (
+            self.keyframe_request is None
+            or self._media_ssrc is None
+            or sender_ssrc is None
+        ):
+            return
+        now = time.monotonic()
+        if self._keyframe_requested_at is None:
+            self._keyframe_requested_at = now
+        elif now - self._last_keyframe_request_time < KEYFRAME_REQUEST_INTERVAL:
+            return
+        self._last_keyframe_request_time = now
+        self._keyframe_request_count += 1
+        feedback = PSFB.keyframe_request(
+            self.keyframe_request,
+            cast(int, sender_ssrc),
+            self._media_ssrc,
+            self._fir_sequence_number,
+        )
+        _utils.create_task(self._send_rtcp_feedback(feedback), name="keyframe_request")
+
+    async def _send_rtcp_feedback(self, feedback: RTCPPacket) -> None:
+        """Sends an RTCP feedback message, preceded by a receiver report if one is available."""
+        try:
+            report = cast(Optional[RTCP], self.transport.stats.build_rtcp())  # type: ignore
+        except Exception:
+            report = None
+        rtcp = RTCP([*report.packets, feedback] if report is not None else [feedback])  # type: ignore
+        try:
+            await self.transport.send_rtcp_report(rtcp)  # type: ignore
+        except Exception as exception:
+            _logger.warning(f"Failed to send RTCP feedback: {exception}")
+
+    @asynccontextmanager
+    async def decode(
+        self,
+        latest_only: bool = False,
+        format: Optional[str] = None,
+        size: Optional[Tuple[int, int]] = None,
+        flip: bool = False,
+        ndarray: Optional[bool] = None,
+        reuse_buffers: bool = True,
+    ) -> AsyncIterator[FrameQueue]:
+        """Returns a queue with tuples containing the demuxed and decoded RTP stream along with timestamps.
+
+        Spawns a decoder task which uses PyAV (ffmpeg) to decode the demuxed access units. Each access unit is
+        passed to the decoder as a single packet with its RTP timestamp as pts, so every frame gets the
+        timestamp of the access unit it was decoded from.
+        If the stream has a `decoder_executor`, decoding is done in the executor while the
+        demuxer keeps filling its bounded queue on the event loop.
+
+        If `latest_only` is `True`, the queue only ever holds the most recently decoded frame. Every access
+        unit is still decoded, since later frames reference earlier ones, but a frame that hasn't been
+        consumed when the next one is decoded is replaced by it and counted as superseded in `stats`.
+        This bounds the latency to one frame regardless of how slow the consumer is. Frames are then converted, as
+        described below, when they are taken from the queue, so that superseded frames are never converted. `get`
+        converts the frame in the `decoder_executor` if there is one and otherwise on the event loop of the consumer.
+
+        The returned queue contains PyAVs `av.VideoFrame` objects along with timestamps, unless a `format` is given.
+        Then the frames are converted to NumPy arrays in that pixel format, optionally resized to `size` given as
+        width and height and flipped vertically if `flip` is `True`. The conversion is done along with the decoding,
+        in the `decoder_executor` if there is one, into arrays which are reused for later frames. An array is only
+        valid until the next frame is taken from the queue, so copy it if it's needed for longer than that.
+        If `reuse_buffers` is `False`, every frame gets a new array which stays valid instead.
+        See `NDARRAY_FORMAT_CHANNELS` for the supported formats.
+
+        If `ndarray` is `False`, the frames are instead scaled to `size` and converted to `format` as `av.VideoFrame`
+        objects, keeping the size or format of the decoded frames if either is `None`. Any pixel format supported by
+        PyAV can be used. Scaling down in the decoder, for example to 854x480 for analytics, saves both memory bandwidth
+        and conversion time for the consumer. By default, `ndarray` is `None`, which converts the frames to arrays if
+        `format` is one of `NDARRAY_FORMAT_CHANNELS` and keeps them as `av.VideoFrame` objects otherwise, so that
+        giving only a `size` scales the frames.
+        """
+        converter = _frame_converter(format, size, flip, ndarray)
+        frame_queue = FrameQueue(
+            latest_only,
+            converter.buffer_pool
+            if converter is not None and converter.ndarray and reuse_buffers
+            else None,
+            converter if latest_only else None,
+            self.decoder_executor,
+        )
+        decode_converter = None if latest_only else converter
+
+        async with self.demux() as access_unit_queue:
+
+            async def decoder():
+                loop = asyncio.get_running_loop()
+                timestamps: Dict[int, Optional[float]] = {}
+                while True:
+                    access_units = await _get_items(access_unit_queue, self.demux_mode)
+                    for i, (access_unit, timestamp) in enumerate(access_units):
+                        timestamps[access_unit.rtp_timestamp] = timestamp
+                        if self.adaptive_skipping:
+                            self._adapt_skip_level(
+                                access_unit,
+                                len(access_units) - i - 1 + access_unit_queue.qsize(),
+                            )
+                        if self.decoder_executor is None:
+                            frames = self._decode_access_unit(
+                                access_unit, decode_converter
+                            )
+                        else:
+                            frames = await loop.run_in_executor(
+                                self.decoder_executor,
+                                self._decode_access_unit,
+                                access_unit,
+                                decode_converter,
+                            )
+                        if frames is None:
+                            self._request_keyframe()
+                            continue
+                        if frames and self.first_frame_time is None:
+                            self.first_frame_time = time.monotonic()
+                        for pts, frame in frames:
+                            if latest_only and frame_queue.full():
+                                self._superseded_count += 1
+                            await frame_queue.put(
+                                (frame, self._pop_timestamp(timestamps, pts))
+                            )
+                            self._decode_count += 1
+
+            decoder_task = _utils.create_task(decoder(), name="decoder")
+            try:
+                yield frame_queue
+            finally:
+                decoder_task.cancel()
+                try:
+                    await decoder_task
+                except asyncio.CancelledError:
+                    pass
+
+    @asynccontextmanager
+    async def broadcast(self, **decode_kwargs: Any) -> AsyncIterator[Broadcast]:
+        """Decodes the stream once and returns a `Broadcast` which feeds the decoded frames to any number of
+        subscribers. Any keyword arguments are passed on to `decode`.
+
+        Frames converted to arrays always get new arrays, since each subscriber holds on to them for as long as it
+        needs them.
+        """
+        async with super().broadcast(reuse_buffers=False, **decode_kwargs) as broadcast:
+            yield broadcast
+
+    def _adapt_skip_level(self, access_unit: AccessUnit, queue_depth: int) -> None:
+        """Selects the skip level for the next access unit from the number of access units waiting behind it."""
+        skip_level = self.skip_level
+        if queue_depth >= SKIP_NONKEY_QUEUE_DEPTH:
+            skip_level = SkipLevel.NONKEY
+        elif queue_depth >= SKIP_NONREF_QUEUE_DEPTH:
+            if skip_level == SkipLevel.NONE:
+                skip_level = SkipLevel.NONREF
+        elif queue_depth == 0:
+            skip_level = SkipLevel.NONE
+        if (
+            self.skip_level == SkipLevel.NONKEY
+            and skip_level != SkipLevel.NONKEY
+            and not access_unit.is_keyframe
+        ):
+            # Frames decoded before the next keyframe would reference skipped frames
+            skip_level = SkipLevel.NONKEY
+        if skip_level != self.skip_level:
+            _logger.debug(f"Changing skip level from {self.skip_level} to {skip_level}")
+            self.skip_level = skip_level
+            self.codec_context.skip_frame = skip_level.skip_frame
+        match self.skip_level:
+            case SkipLevel.NONE:
+                pass
+            case SkipLevel.NONREF:
+                if not access_unit.is_reference:
+                    self._skipped_count += 1
+            case SkipLevel.NONKEY:
+                if not access_unit.is_keyframe:
+                    self._skipped_count += 1
+
+    @staticmethod
+    def _pop_timestamp(
+        timestamps: Dict[int, Optional[float]], pts: Optional[int]
+    ) -> Optional[float]:
+        """Pops the timestamp of the access unit with the given pts along with the timestamps of older access
+        units, which will never produce a frame."""
+        if pts is None:
+            return None
+        timestamp = timestamps.pop(pts, None)
+        for stale_pts in [stale_pts for stale_pts in timestamps if stale_pts < pts]:
+            del timestamps[stale_pts]
+        return timestamp
+
+    def _decode_access_unit(
+        self, access_unit: AccessUnit, converter: Optional[FrameConverter] = None
+    ) -> Optional[List[Tuple[Optional[int], Any]]]:
+        """Decodes an access unit with PyAV and returns the pts of the resulting frames along with the frames,
+        converted by `converter` if given, or `None` if decoding failed.
+
+        Safe to run in a worker thread as long as only one call per stream runs at a time.
+        """
+        t0 = time.perf_counter()
+        packet = access_unit.to_packet()
+        try:
+            frames = cast(List[Any], self.codec_context.decode(packet))
+        except av.error.FFmpegError as error:  # type: ignore
+            self._decode_error_count += 1
+            _logger.debug(f"Failed to decode access unit: {error}")
+            return None
+        self._pending_decode_time += time.perf_counter() - t0
+        if frames:
+            self._last_frame_decode_time = self._pending_decode_time / len(frames)
+            self._total_frame_decode_time += self._pending_decode_time
+            self._pending_decode_time = 0.0
+        if converter is None:
+            return [(frame.pts, frame) for frame in frames]
+        return [(frame.pts, converter.convert(frame)) for frame in frames]
+
+
+class AudioStream(Stream):
+    """Represents a RTSP audio stream of AAC audio in the `AAC-hbr` mode of RFC 3640.
+
+    Handles demuxing and decoding of the AAC access units into blocks of PCM samples. PyAV (ffmpeg) is always run in
+    an executor, the `decoder_executor` if given and otherwise the default executor of the event loop, so that
+    decoding never blocks other tasks on the event loop. The executor must be thread based.
+
+    The stream must be configured with the SDP of the RTSP session before it's played, see `configure`.
+    """
+
+    decoder_executor: Optional[Executor]
+    """The executor PyAV decoding is run in or `None` to use the default executor of the event loop."""
+    sample_rate: Optional[int]
+    """The number of samples per second and channel or `None` if the stream hasn't been configured."""
+    size_length: int
+    """The number of bits of the size of each access unit in the AU headers."""
+    index_length: int
+    """The number of bits of the index of the first access unit in the AU headers."""
+    index_delta_length: int
+    """The number of bits of the index delta of the following access units in the AU headers."""
+
+    def __init__(
+        self,
+        transport: RTPTransport,
+        stream_type: StreamType,
+        decoder_executor: Optional[Executor] = None,
+        jitter_buffer_latency: Optional[float] = DEFAULT_JITTER_BUFFER_LATENCY,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        rtp_queue_size: int = RTP_QUEUE_SIZE,
+        demux_mode: DemuxMode = DemuxMode.BATCHED,
+    ) -> None:
+        if overflow_policy == OverflowPolicy.DROP_UNTIL_KEYFRAME:
+            raise ValueError(f"{overflow_policy} can only be used for video streams.")
+        super().__init__(
+            transport,
+            stream_type,
+            jitter_buffer_latency,
+            overflow_policy,
+            rtp_queue_size,
+            demux_mode,
+        )
+        self.codec_context: Any = av.CodecContext.create("aac", "r")  # type: ignore
+        self.decoder_executor = decoder_executor
+        self.sample_rate = None
+        self.size_length = 13
+        self.index_length = 3
+        self.index_delta_length = 3
+        self._fragment: Optional[bytearray] = None
+        self._fragment_rtp_timestamp: Optional[int] = None
+        self._lost_fragment_rtp_timestamp: Optional[int] = None
+        self._last_sequence_number: Optional[int] = None
+        self._access_unit_count = 0
+        self._discarded_fragmented_count = 0
+        self._unhandled_count = 0
+        self._decode_count = 0
+        self._decode_error_count = 0
+        self._sample_count = 0
+        self._total_block_decode_time = 0.0
+
+    @property
+    def media_type(self) -> MediaType:
+        """The media type identifier of an `AudioStream`."""
+        return "audio"
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Contains some media stream statistics. Used mainly for debugging purposes.
+
+        The decode count is the number of decoded blocks and the decode time is given in seconds per block.
+        """
+        mean_block_decode_time = (
+            self._total_block_decode_time / self._decode_count
+            if self._decode_count
+            else 0.0
+        )
+        return {
+            **super().stats,
+            "access_unit_count": self._access_unit_count,
+            "discarded_fragmented_count": self._discarded_fragmented_count,
+            "unhandled_count": self._unhandled_count,
+            "decode_count": self._decode_count,
+            "decode_error_count": self._decode_error_count,
+            "sample_count": self._sample_count,
+            "mean_block_decode_time": mean_block_decode_time,
+        }
+
+    def configure(self, sdp: Any) -> None:
+        """Configures the depacketizer, the decoder and the `clock` with the `rtpmap` and `fmtp` attributes of the
+        stream's media description in the SDP of the RTSP session, described in RFC 3640 section
+        [4.1](https://datatracker.ietf.org/doc/html/rfc3640#section-4.1).
+
+        Raises `ValueError` if the SDP doesn't describe AAC audio the stream can decode.
+        """
+        try:
+            attributes = sdp.get_media(self.media_type, self.media_index)["attributes"]  # type: ignore
+            rtpmap = cast(Dict[str, Any], attributes["rtpmap"])
+            fmtp = {
+                key.lower(): value
+                for key, value in cast(Dict[str, Any], attributes["fmtp"]).items()
+            }
+            # The SDP parser reads the channel count of an `encoding/clock rate/channels` rtpmap as the clock rate
+            encoding, *clock_rate = cast(str, rtpmap["encoding"]).split("/")
+            sample_rate = int(clock_rate[0]) if clock_rate else int(rtpmap["clockRate"])
+            config = bytes.fromhex(fmtp["config"])
+            size_length = int(fmtp.get("sizelength", 0))
+            index_length = int(fmtp.get("indexlength", 0))
+            index_delta_length = int(fmtp.get("indexdeltalength", 0))
+        except (KeyError, IndexError, TypeError, ValueError) as error:
+            raise ValueError(
+                f"The SDP doesn't describe the {self.type.name} stream: {error!r}"
+            )
+        if encoding.upper() != "MPEG4-GENERIC" or size_length == 0:
+            raise ValueError(
+                f"The {self.type.name} stream isn't AAC audio with AU headers, got {encoding} with {fmtp}."
+            )
+        self.sample_rate = sample_rate
+        self.size_length = size_length
+        self.index_length = index_length
+        self.index_delta_length = index_delta_length
+        self.codec_context.extradata = config
+        self.clock = RTPClock(sample_rate)
+
+    @asynccontextmanager
+    async def demux(
+        self,
+    ) -> AsyncIterator[asyncio.Queue[Tuple[List[bytes], Optional[float]]]]:
+        """Returns a queue with tuples containing the AAC access units of each RTP packet along with timestamps.
+
+        Spawns a demuxer task which splits the RTP payloads into access units by their AU headers, described in
+        RFC 3640 section [3.2](https://datatracker.ietf.org/doc/html/rfc3640#section-3.2), and reassembles access
+        units fragmented over several packets, discarding those with missing fragments. Interleaving isn't
+        supported, the access units are expected in decoding order.
+        """
+        if self.demux_mode == DemuxMode.IN_CALLBACK:
+            async with self._demux_in_callback(self._demux_rtp) as access_units_queue:
+                yield access_units_queue
+            return
+        access_units_queue: asyncio.Queue[
+            Tuple[List[bytes], Optional[float]]
+        ] = asyncio.Queue(AUDIO_QUEUE_SIZE)
+
+        async def demuxer():
+            while True:
+                packets: List[Tuple[List[bytes], Optional[float]]] = []
+                for rtp, timestamp in self._session_packets(
+                    await _get_items(self.rtp_queue, self.demux_mode)
+                ):
+                    packets.extend(self._demux_rtp(rtp, timestamp))
+                await _put_items(access_units_queue, packets, self.demux_mode)
+
+        with self._consume_rtp_queue():
+            demuxer_task = _utils.create_task(demuxer(), name="demuxer")
+            try:
+                yield access_units_queue
+            finally:
+                demuxer_task.cancel()
+                try:
+                    await demuxer_task
+                except asyncio.CancelledError:
+                    pass
+
+    def _demux_rtp(
+        self, rtp: RTP, timestamp: Optional[float]
+    ) -> List[Tuple[List[bytes], Optional[float]]]:
+        """Returns the access units of an RTP packet along with its timestamp, unless it completed none."""
+        access_units = self._depacketize(rtp)
+        return [(access_units, timestamp)] if access_units else []
+
+    def _restart_demuxer(self) -> None:
+        super()._restart_demuxer()
+        self._last_sequence_number = None
+
+    def _depacketize(self, rtp: RTP) -> List[bytes]:
+        """Returns the complete access units in an RTP packet."""
+        payload = cast(bytes, rtp.data)  # type: ignore
+        sequence_number = cast(int, rtp.seq)  # type: ignore
+        rtp_timestamp = cast(int, rtp.ts)  # type: ignore
+        in_sequence = (
+            self._last_sequence_number is None
+            or sequence_number == (self._last_sequence_number + 1) & 0xFFFF
+        )
+        self._last_sequence_number = sequence_number
+        if self._fragment is not None and (
+            not in_sequence or rtp_timestamp != self._fragment_rtp_timestamp
+        ):
+            self._discarded_fragmented_count += 1
+            self._fragment = None
+            if not in_sequence:
+                self._lost_fragment_rtp_timestamp = self._fragment_rtp_timestamp
+        if len(payload) < 2:
+            self._unhandled_count += 1
+            return []
+        headers_length = int.from_bytes(payload[:2], "big")
+        headers_end = 2 + (headers_length + 7) // 8
+        headers = int.from_bytes(payload[2:headers_end], "big")
+        headers_bit_count = (headers_end - 2) * 8
+        data = payload[headers_end:]
+        sizes: List[int] = []
+        position = 0
+        header_length = self.size_length + self.index_length
+        while position + header_length <= headers_length:
+            shift = headers_bit_count - position - self.size_length
+            sizes.append((headers >> shift) & ((1 << self.size_length) - 1))
+            position += header_length
+            header_length = self.size_length + self.index_delta_length
+        if not sizes:
+            self._unhandled_count += 1
+            return []
+        access_units: List[bytes] = []
+        if self._fragment is not None or (len(sizes) == 1 and sizes[0] > len(data)):
+            if rtp_timestamp == self._lost_fragment_rtp_timestamp:
+                # The remaining fragments of an access unit with missing fragments
+                return []
+            if self._fragment is None:
+                self._fragment = bytearray()
+                self._fragment_rtp_timestamp = rtp_timestamp
+            self._fragment += data
+            if len(self._fragment) < sizes[0]:
+                if rtp.m:  # type: ignore
+                    self._discarded_fragmented_count += 1
+                    self._fragment = None
+                return []
+            access_units.append(bytes(self._fragment[: sizes[0]]))
+            self._fragment = None
+        else:
+            offset = 0
+            for size in sizes:
+                if offset + size > len(data):
+                    self._unhandled_count += 1
+                    break
+                access_units.append(data[offset : offset + size])
+                offset += size
+        self._access_unit_count += len(access_units)
+        return access_units
+
+    @asynccontextmanager
+    async def decode(
+        self,
+    ) -> AsyncIterator[asyncio.Queue[Tuple[np.ndarray, Optional[float]]]]:
+        """Returns a queue with tuples containing blocks of decoded PCM samples along with timestamps.
+
+        Spawns a decoder task which decodes the access units of each RTP packet with PyAV in the executor into one
+        contiguous NumPy array with a row of samples per sample time and a column per channel, usually of 32 bit
+        floats. The timestamp is the time of the first sample in the block, from the same `clock` model as the other
+        streams. Access units that can't be decoded are left out of the block.
+        """
+        block_queue: asyncio.Queue[Tuple[np.ndarray, Optional[float]]] = asyncio.Queue(
+            AUDIO_QUEUE_SIZE
+        )
+
+        async with self.demux() as access_units_queue:
+
+            async def decoder():
+                loop = asyncio.get_running_loop()
+                while True:
+                    packets = await _get_items(access_units_queue, self.demux_mode)
+                    blocks = await loop.run_in_executor(
+                        self.decoder_executor,
+                        self._decode_packets,
+                        [access_units for access_units, _ in packets],
+                    )
+                    await _put_items(
+                        block_queue,
+                        [
+                            (block, timestamp)
+                            for block, (_, timestamp) in zip(blocks, packets)
+                            if block is not None
+                        ],
+                        self.demux_mode,
+                    )
+
+            decoder_task = _utils.create_task(decoder(), name="decoder")
+            try:
+                yield block_queue
+            finally:
+                decoder_task.cancel()
+                try:
+                    await decoder_task
+                except asyncio.CancelledError:
+                    pass
+
+    def _decode_packets(self, packets: List[List[bytes]]) -> List[Optional[np.ndarray]]:
+        """Decodes the access units of several packets, returning a block or `None` per packet, so that a batch of
+        packets is decoded in a single executor call."""
+        return [self._decode_access_units(access_units) for access_units in packets]
+
+    def _decode_access_units(self, access_units: List[bytes]) -> Optional[np.ndarray]:
+        """Decodes access units with PyAV and returns their samples as one block or `None` if none were decoded.
+
+        Safe to run in a worker thread as long as only one call per stream runs at a time.
+        """
+        t0 = time.perf_counter()
+        channel_blocks: List[np.ndarray] = []
+        for access_unit in access_units:
+            try:
+                frames = cast(
+                    List[Any], self.codec_context.decode(av.Packet(access_unit))  # type: ignore
+                )
+            except av.error.FFmpegError as error:  # type: ignore
+                self._decode_error_count += 1
+                _logger.debug(f"Failed to decode access unit: {error}")
+                continue
+            for frame in frames:
+                samples = cast(np.ndarray, frame.to_ndarray())
+                channel_blocks.append(
+                    samples
+                    if frame.format.is_planar
+                    else samples.reshape(-1, len(frame.layout.channels)).T
+                )
+        if not channel_blocks:
+            return None
+        block = np.ascontiguousarray(np.concatenate(channel_blocks, axis=1).T)
+        self._decode_count += 1
+        self._sample_count += len(block)
+        self._total_block_decode_time += time.perf_counter() - t0
+        return block
+
+
+class GazeBuffer:
+    """A bounded buffer of gaze samples sorted by timestamp.
+
+    When the buffer is full, the oldest samples are dropped. Samples without timestamps can't be aligned with frames
+    and are ignored.
+    """
+
+    dropped_count: int
+    """The number of samples dropped because the buffer was full."""
+
+    def __init__(self, size: int = GAZE_BUFFER_SIZE) -> None:
+        self.size = size
+        self.dropped_count = 0
+        self._timestamps: List[float] = []
+        self._samples: List[JSONObject] = []
+        self._previous: Optional[Tuple[JSONObject, float]] = None
+
+    def insert(self, sample: JSONObject, timestamp: Optional[float]) -> None:
+        if timestamp is None:
+            return
+        index = bisect.bisect_right(self._timestamps, timestamp)
+        self._timestamps.insert(index, timestamp)
+        self._samples.insert(index, sample)
+        if len(self._timestamps) > self.size:
+            del self._timestamps[0], self._samples[0]
+            self.dropped_count += 1
+
+    def take_until(self, timestamp: float) -> List[Tuple[JSONObject, float]]:
+        """Removes and returns the samples up to and including `timestamp`, in timestamp order."""
+        index = bisect.bisect_right(self._timestamps, timestamp)
+        samples = list(zip(self._samples[:index], self._timestamps[:index]))
+        del self._timestamps[:index], self._samples[:index]
+        if samples:
+            self._previous = samples[-1]
+        return samples
+
+    def at(self, timestamp: float) -> Optional[JSONObject]:
+        """Returns the gaze at `timestamp`, interpolated between the samples around it or taken from the nearest
+        sample if there are samples on one side only. Samples at or before `timestamp` must have been taken with
+        `take_until` first."""
+        if self._previous is None:
+            return self._samples[0] if self._samples else None
+        previous_sample, previous_timestamp = self._previous
+        if not self._samples or self._timestamps[0] == previous_timestamp:
+            return previous_sample
+        weight = max(
+            0.0,
+            (timestamp - previous_timestamp)
+            / (self._timestamps[0] - previous_timestamp),
+        )
+        return _interpolate(previous_sample, self._samples[0], weight)
+
+
+def _interpolate(a: JSONObject, b: JSONObject, weight: float) -> JSONObject:
+    """Interpolates linearly between the numbers of two samples with the same structure. Where the structures differ,
+    the nearest sample is used."""
+    if (
+        isinstance(a, (int, float))
+        and isinstance(b, (int, float))
+        and not isinstance(a, bool)
+        and not isinstance(b, bool)
+    ):
+        return a + (b - a) * weight  # type: ignore
+    if isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        return [_interpolate(x, y, weight) for x, y in zip(a, b)]
+    if isinstance(a, dict) and isinstance(b, dict) and a.keys() == b.keys():
+        return {key: _interpolate(a[key], b[key], weight) for key in a}
+    return a if weight < 0.5 else b
+
+
+class GazeFrameSynchronizer:
+    """Aligns the gaze samples of a gaze stream with the frames of a scene camera stream.
+
+    Gaze samples are moved to a `GazeBuffer` as soon as they are decoded, so frames are never held back waiting
+    for gaze. Instead each frame is aligned with the gaze samples which have been received when it is taken.
+    """
+
+    gaze_buffer: GazeBuffer
+
+    def __init__(
+        self,
+        frame_queue: asyncio.Queue[Tuple[Any, Optional[float]]],
+        gaze_queue: asyncio.Queue[Tuple[JSONObject, Optional[float]]],
+        gaze_buffer: GazeBuffer,
+    ) -> None:
+        self.gaze_buffer = gaze_buffer
+        self._frame_queue = frame_queue
+        self._gaze_queue = gaze_queue
+
+    async def get(
+        self,
+    ) -> Tuple[
+        Tuple[Any, List[Tuple[JSONObject, float]], Optional[JSONObject]],
+        Optional[float],
+    ]:
+        """Returns the next frame along with the gaze samples received since the previous frame and the gaze at the
+        time of the frame, interpolated if possible, together with the timestamp of the frame.
+
+        The gaze samples are given with their timestamps. Frames without timestamps get no gaze. The lifetime of the
+        frame is the same as for the frames from `VideoStream.decode`.
+        """
+        frame, timestamp = await self._frame_queue.get()
+        self.drain_gaze_queue()
+        if timestamp is None:
+            return (frame, [], None), None
+        gaze_samples = self.gaze_buffer.take_until(timestamp)
+        return (frame, gaze_samples, self.gaze_buffer.at(timestamp)), timestamp
+
+    def drain_gaze_queue(self) -> None:
+        """Moves all decoded gaze samples to the gaze buffer."""
+        while not self._gaze_queue.empty():
+            self.gaze_buffer.insert(*self._gaze_queue.get_nowait())
+
+
+class UDPLossDetector:
+    """Detects sustained packet loss from the expected and received packet counts of the streams, see
+    `Stream.packet_counts`, taken at regular intervals."""
+
+    threshold: float
+    """The fraction of the packets of a stream which have to be lost in an interval for the interval to be lossy."""
+    check_count: int
+    """The number of consecutive lossy intervals after which the loss is sustained."""
+
+    def __init__(
+        self,
+        threshold: float = UDP_LOSS_THRESHOLD,
+        check_count: int = UDP_LOSS_CHECK_COUNT,
+    ) -> None:
+        self.threshold = threshold
+        self.check_count = check_count
+        self._last_packet_counts: Dict[StreamType, Tuple[int, int]] = {}
+        self._lossy_count = 0
+
+    def check(self, packet_counts: Dict[StreamType, Tuple[int, int]]) -> bool:
+        """Takes the current packet counts of the streams and returns whether the loss is sustained."""
+        loss = 0.0
+        for stream_type, (expected_count, received_count) in packet_counts.items():
+            last_expected_count, last_received_count = self._last_packet_counts.get(
+                stream_type, (0, 0)
+            )
+            expected_delta = expected_count - last_expected_count
+            if expected_delta > 0:
+                received_delta = received_count - last_received_count
+                loss = max(loss, (expected_delta - received_delta) / expected_delta)
+        self._last_packet_counts = dict(packet_counts)
+        self._lossy_count = self._lossy_count + 1 if loss > self.threshold else 0
+        return self._lossy_count >= self.check_count
+
+    def reset(self) -> None:
+        """Starts counting lossy intervals from zero."""
+        self._lossy_count = 0
+
+
+class Streams:
+    """Handles a `RTSPMediaSession` with one or multiple media streams.
+
+    Exposes a `connect` function which is used to set up an RTSP media session and create an instance of this object.
+    Gives easy access to the different streams.
+
+    After the setup process is completed, await the `play` coroutine to start the streaming.
+    """
+
+    play_time: Optional[float]
+    """The `time.monotonic()` time when `play` was called or `None` if it hasn't been called."""
+    rtsp_url: Optional[str]
+    """The URL of the RTSP media session."""
+    scheme: Optional[str]
+    """The URL scheme of the transports in use, `rtsp` for UDP or `rtspt` for interleaved TCP."""
+    reconnect_count: int
+    """The number of times the RTSP media session has been reconnected, see `reconnect`."""
+    _session_stack: Optional[AsyncExitStack]
+    _connection: Optional[RTSPConnection]
+
+    def __init__(
+        self,
+        session: RTSPMediaSession,
+        streams: Set[Stream],
+        rtsp_url: Optional[str] = None,
+    ) -> None:
+        self.session = session
+        self.streams: Dict[StreamType, Stream] = {
+            stream.type: stream for stream in streams
+        }
+        self.play_time = None
+        self.rtsp_url = rtsp_url
+        self.scheme = None if rtsp_url is None else urlparse(rtsp_url).scheme
+        self.reconnect_count = 0
+        self._session_stack = None
+        self._connection = None
+        self._receive_buffer_sizes: Dict[StreamType, int] = {}
+        self._switch_lock = asyncio.Lock()
+        self._session_start_time: Optional[float] = None
+        self._gap_start_time: Optional[float] = None
+        self._last_gap_duration = 0.0
+        self._total_gap_duration = 0.0
+        self._gap_count = 0
+
+    @property
+    def time_to_first_frame(self) -> Dict[StreamType, float]:
+        """The time in seconds from when `play` was called until the first frame was decoded, for each video
+        stream which has decoded a frame."""
+        if self.play_time is None:
+            return {}
+        return {
+            stream_type: stream.first_frame_time - self.play_time
+            for stream_type, stream in self.streams.items()
+            if isinstance(stream, VideoStream) and stream.first_frame_time is not None
+        }
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Contains some RTSP session statistics. Used mainly for debugging purposes.
+
+        Gap durations are the times in seconds from the last RTP packet received before a reconnect until the first
+        RTP packet received in the new session, see `reconnect`.
+        """
+        self._update_gap()
+        mean_gap_duration = (
+            self._total_gap_duration / self._gap_count if self._gap_count else 0.0
+        )
+        return {
+            "reconnect_count": self.reconnect_count,
+            "last_gap_duration": self._last_gap_duration,
+            "mean_gap_duration": mean_gap_duration,
+        }
+
+    @property
+    def scene_camera(self) -> VideoStream:
+        return cast(VideoStream, self._get_stream(StreamType.SCENE_CAMERA))
+
+    @property
+    def audio(self) -> AudioStream:
+        return cast(AudioStream, self._get_stream(StreamType.AUDIO))
+
+    @property
+    def eye_cameras(self) -> Stream:
+        return self._get_stream(StreamType.EYE_CAMERAS)
+
+    @property
+    def gaze(self) -> DataStream:
+        return cast(DataStream, self._get_stream(StreamType.GAZE))
+
+    @property
+    def sync(self) -> DataStream:
+        return cast(DataStream, self._get_stream(StreamType.SYNC))
 
     @property
-    def imu(self) -> Stream:
-        return self._get_stream(StreamType.IMU)
+    def imu(self) -> DataStream:
+        return cast(DataStream, self._get_stream(StreamType.IMU))
 
     @property
-    def events(self) -> Stream:
-        return self._get_stream(StreamType.EVENTS)
+    def events(self) -> DataStream:
+        return cast(DataStream, self._get_stream(StreamType.EVENTS))
 
     def _get_stream(self, stream_type: StreamType) -> Stream:
         try:
@@ -569,48 +3285,637 @@ class Streams:
         sync: bool = False,
         imu: bool = False,
         events: bool = False,
+        decoder_executor: Optional[Executor] = None,
+        audio_decoder_executor: Optional[Executor] = None,
+        jitter_buffer_latency: Optional[float] = DEFAULT_JITTER_BUFFER_LATENCY,
+        keyframe_request: Optional[KeyframeRequestKind] = KeyframeRequestKind.PLI,
+        overflow_policies: Optional[Dict[StreamType, OverflowPolicy]] = None,
+        rtp_queue_size: int = RTP_QUEUE_SIZE,
+        adaptive_skipping: bool = False,
+        decoder_threading: Optional[Dict[StreamType, DecoderThreading]] = None,
+        decoder_thread_counts: Optional[Dict[StreamType, int]] = None,
+        demux_mode: DemuxMode = DemuxMode.BATCHED,
+        receive_buffer_sizes: Optional[Dict[StreamType, int]] = None,
+        tcp_fallback: bool = False,
+        auto_reconnect: bool = False,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
     ) -> AsyncIterator[Streams]:
-        """Sets up an RTSP media session with the specified streams and creates an instance of `Streams`."""
+        """Sets up an RTSP media session with the specified streams and creates an instance of `Streams`.
+
+        The decoders of the video streams are primed with the parameter sets in the SDP of the session, if any,
+        so that decoding starts at the first keyframe. See `VideoStream.prime_decoder`. The audio stream is configured
+        with the SDP, see `AudioStream.configure`.
+
+        If `decoder_executor` is given, the video streams decode their frames in it instead of on the event loop.
+        See `VideoStream` for details. The audio stream always decodes in an executor, `audio_decoder_executor` if
+        given and otherwise a single thread executor of its own, so that audio blocks aren't queued behind video
+        frames and the audio decoder isn't run on several threads at once.
+
+        `jitter_buffer_latency` is the time in seconds each stream waits for reordered packets before
+        considering them lost. Set it to `None` to queue packets in arrival order. See `RTPJitterBuffer` for details.
+
+        `keyframe_request` is the kind of RTCP feedback the video streams use to request a keyframe after packet loss
+        or decoding errors. Set it to `None` to never request keyframes.
+
+        Each stream queues at most `rtp_queue_size` received RTP packets for its demuxer. `overflow_policies` selects
+        the `OverflowPolicy` applied by each stream type when its queue is full. Video streams default to
+        `OverflowPolicy.DROP_UNTIL_KEYFRAME` and audio and data streams to `OverflowPolicy.DROP_OLDEST`.
+
+        If `adaptive_skipping` is `True`, the video decoders skip frames while they can't keep up with the stream.
+        See `VideoStream` for details.
+
+        `decoder_threading` selects the `DecoderThreading` mode of each video stream type and `decoder_thread_counts`
+        the number of decoder threads, where 0 means one thread per core. Video streams default to
+        `DecoderThreading.LOW_LATENCY` with one thread per core.
+
+        `demux_mode` selects whether the demuxers and decoders of all streams process one packet at a time or all
+        available packets at once, or whether the packets are demuxed as they are received, see `DemuxMode`.
+
+        `receive_buffer_sizes` sets the receive buffer size in bytes of the RTP socket of each stream type received
+        over UDP. The effective sizes and the number of datagrams dropped by the kernel are found in the stats of the
+        streams, see `Stream.set_receive_buffer_size` and `Stream.kernel_dropped_count`. The sizes are set again on the
+        sockets of every new session, see `switch_transport` and `reconnect`.
+
+        If `tcp_fallback` is `True` and the streams are received over UDP, the session is moved to interleaved TCP
+        when more than `UDP_LOSS_THRESHOLD` of the packets of any stream are lost in `UDP_LOSS_CHECK_COUNT`
+        consecutive intervals of `UDP_LOSS_CHECK_INTERVAL` seconds. See `switch_transport`.
+
+        If `auto_reconnect` is `True`, the session is reconnected when the RTSP connection is lost or when no stream
+        has received an RTP packet for `stall_timeout` seconds after `play` was called. See `reconnect`. The timeout
+        must be longer than the packet interval of the least frequent enabled stream, for example the events stream.
+        """
+        if overflow_policies is None:
+            overflow_policies = {}
+        if receive_buffer_sizes is None:
+            receive_buffer_sizes = {}
+        if decoder_threading is None:
+            decoder_threading = {}
+        if decoder_thread_counts is None:
+            decoder_thread_counts = {}
         parsed_url = urlparse(rtsp_url)
-        async with RTSPConnection(parsed_url.hostname, parsed_url.port) as connection:
-            async with AsyncExitStack() as stack:
-                streams: Set[Stream] = set()
-                if scene_camera:
-                    streams.add(
-                        await stack.enter_async_context(
-                            VideoStream.setup(
-                                connection, StreamType.SCENE_CAMERA, parsed_url.scheme
-                            )
+        async with AsyncExitStack() as stack:
+            connection = await stack.enter_async_context(
+                RTSPConnection(parsed_url.hostname, parsed_url.port)
+            )
+            streams: Set[Stream] = set()
+            if scene_camera:
+                streams.add(
+                    await stack.enter_async_context(
+                        VideoStream.setup(
+                            connection,
+                            StreamType.SCENE_CAMERA,
+                            parsed_url.scheme,
+                            receive_buffer_size=receive_buffer_sizes.get(
+                                StreamType.SCENE_CAMERA
+                            ),
+                            decoder_executor=decoder_executor,
+                            jitter_buffer_latency=jitter_buffer_latency,
+                            keyframe_request=keyframe_request,
+                            overflow_policy=overflow_policies.get(
+                                StreamType.SCENE_CAMERA,
+                                OverflowPolicy.DROP_UNTIL_KEYFRAME,
+                            ),
+                            rtp_queue_size=rtp_queue_size,
+                            demux_mode=demux_mode,
+                            adaptive_skipping=adaptive_skipping,
+                            decoder_threading=decoder_threading.get(
+                                StreamType.SCENE_CAMERA,
+                                DecoderThreading.LOW_LATENCY,
+                            ),
+                            decoder_thread_count=decoder_thread_counts.get(
+                                StreamType.SCENE_CAMERA, 0
+                            ),
                         )
                     )
-                if eye_cameras:
-                    streams.add(
-                        await stack.enter_async_context(
-                            VideoStream.setup(
-                                connection, StreamType.EYE_CAMERAS, parsed_url.scheme
-                            )
+                )
+            if eye_cameras:
+                streams.add(
+                    await stack.enter_async_context(
+                        VideoStream.setup(
+                            connection,
+                            StreamType.EYE_CAMERAS,
+                            parsed_url.scheme,
+                            receive_buffer_size=receive_buffer_sizes.get(
+                                StreamType.EYE_CAMERAS
+                            ),
+                            decoder_executor=decoder_executor,
+                            jitter_buffer_latency=jitter_buffer_latency,
+                            keyframe_request=keyframe_request,
+                            overflow_policy=overflow_policies.get(
+                                StreamType.EYE_CAMERAS,
+                                OverflowPolicy.DROP_UNTIL_KEYFRAME,
+                            ),
+                            rtp_queue_size=rtp_queue_size,
+                            demux_mode=demux_mode,
+                            adaptive_skipping=adaptive_skipping,
+                            decoder_threading=decoder_threading.get(
+                                StreamType.EYE_CAMERAS,
+                                DecoderThreading.LOW_LATENCY,
+                            ),
+                            decoder_thread_count=decoder_thread_counts.get(
+                                StreamType.EYE_CAMERAS, 0
+                            ),
                         )
                     )
-                if gaze:
-                    streams.add(
-                        await stack.enter_async_context(
-                            DataStream.setup(
-                                connection, StreamType.GAZE, parsed_url.scheme
-                            )
+                )
+            for data_stream_type, enabled in [
+                (StreamType.GAZE, gaze),
+                (StreamType.SYNC, sync),
+                (StreamType.IMU, imu),
+                (StreamType.EVENTS, events),
+            ]:
+                if not enabled:
+                    continue
+                streams.add(
+                    await stack.enter_async_context(
+                        DataStream.setup(
+                            connection,
+                            data_stream_type,
+                            parsed_url.scheme,
+                            receive_buffer_size=receive_buffer_sizes.get(
+                                data_stream_type
+                            ),
+                            jitter_buffer_latency=jitter_buffer_latency,
+                            overflow_policy=overflow_policies.get(
+                                data_stream_type, OverflowPolicy.DROP_OLDEST
+                            ),
+                            rtp_queue_size=rtp_queue_size,
+                            demux_mode=demux_mode,
                         )
                     )
-                if audio or sync or imu or events:
-                    raise NotImplementedError()
+                )
+            if audio:
+                if audio_decoder_executor is None:
+                    audio_decoder_executor = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="audio-decoder"
+                    )
+                    stack.callback(audio_decoder_executor.shutdown, wait=False)
+                streams.add(
+                    await stack.enter_async_context(
+                        AudioStream.setup(
+                            connection,
+                            StreamType.AUDIO,
+                            parsed_url.scheme,
+                            receive_buffer_size=receive_buffer_sizes.get(
+                                StreamType.AUDIO
+                            ),
+                            decoder_executor=audio_decoder_executor,
+                            jitter_buffer_latency=jitter_buffer_latency,
+                            overflow_policy=overflow_policies.get(
+                                StreamType.AUDIO, OverflowPolicy.DROP_OLDEST
+                            ),
+                            rtp_queue_size=rtp_queue_size,
+                            demux_mode=demux_mode,
+                        )
+                    )
+                )
 
-                async with RTSPMediaSession(
+            session = await stack.enter_async_context(
+                RTSPMediaSession(
                     connection,
                     rtsp_url,
                     media_stream_configurations=list(
                         map(lambda s: s.media_stream_configuration, streams)
                     ),
-                ) as session:
-                    yield cls(session, streams)
+                )
+            )
+            for stream in streams:
+                if isinstance(stream, VideoStream):
+                    stream.prime_decoder(session.sdp)  # type: ignore
+                elif isinstance(stream, AudioStream):
+                    stream.configure(session.sdp)  # type: ignore
+            instance = cls(session, streams, rtsp_url)
+            instance._session_stack = stack
+            instance._connection = connection
+            instance._receive_buffer_sizes = receive_buffer_sizes
+            monitor_tasks: List[asyncio.Task[None]] = []
+            if tcp_fallback and parsed_url.scheme == "rtsp":
+                monitor_tasks.append(
+                    _utils.create_task(
+                        instance._monitor_udp_loss(UDPLossDetector()),
+                        name="udp_loss_monitor",
+                    )
+                )
+            if auto_reconnect:
+                monitor_tasks.append(
+                    _utils.create_task(
+                        instance._monitor_session(stall_timeout),
+                        name="session_monitor",
+                    )
+                )
+            try:
+                yield instance
+            finally:
+                for monitor_task in monitor_tasks:
+                    monitor_task.cancel()
+                    try:
+                        await monitor_task
+                    except asyncio.CancelledError:
+                        pass
+
+    @asynccontextmanager
+    async def synchronize_gaze(
+        self, gaze_buffer_size: int = GAZE_BUFFER_SIZE, **decode_kwargs: Any
+    ) -> AsyncIterator[GazeFrameSynchronizer]:
+        """Decodes the scene camera and gaze streams and returns a `GazeFrameSynchronizer` which aligns them.
+
+        Any keyword arguments are passed on to `VideoStream.decode` of the scene camera. At most `gaze_buffer_size`
+        gaze samples are kept waiting for frames.
+        """
+        async with self.scene_camera.decode(
+            **decode_kwargs
+        ) as frame_queue, self.gaze.decode() as gaze_queue:
+            synchronizer = GazeFrameSynchronizer(
+                frame_queue, gaze_queue, GazeBuffer(gaze_buffer_size)
+            )
+
+            async def gaze_drainer():
+                while True:
+                    sample, timestamp = await gaze_queue.get()
+                    synchronizer.gaze_buffer.insert(sample, timestamp)
+                    synchronizer.drain_gaze_queue()
+
+            gaze_drainer_task = _utils.create_task(gaze_drainer(), name="gaze_drainer")
+            try:
+                yield synchronizer
+            finally:
+                gaze_drainer_task.cancel()
+                try:
+                    await gaze_drainer_task
+                except asyncio.CancelledError:
+                    pass
 
     async def play(self) -> None:
         """Starts the streaming in the RTSP media session."""
+        self.play_time = time.monotonic()
         await self.session.play()  # type: ignore
+
+    async def switch_transport(self, scheme: str) -> None:
+        """Sets up a new RTSP media session using the transports for the URL `scheme`, for example `rtspt` for
+        interleaved TCP, and moves the streams to it.
+
+        The streams keep their queues, demuxers and decoders. Audio streams are configured and video decoders primed
+        with the SDP of the new session, see `AudioStream.configure` and `VideoStream.prime_decoder`, and video streams
+        drop frames until a keyframe of the new session, which they request. The new session is playing, if the current
+        one was, before the streams are moved to it and the current session is closed. Errors when closing the current session,
+        which may already be broken, are logged and ignored.
+        """
+        if self._session_stack is None or self.rtsp_url is None:
+            raise RuntimeError("Only streams set up with connect can switch transport.")
+        async with self._switch_lock:
+            await self._switch_transport(scheme)
+
+    async def _switch_transport(self, scheme: str) -> None:
+        assert self._session_stack is not None and self.rtsp_url is not None
+        parsed_url = urlparse(self.rtsp_url)
+        async with AsyncExitStack() as stack:
+            connection = await stack.enter_async_context(
+                RTSPConnection(parsed_url.hostname, parsed_url.port)
+            )
+            transports: Dict[StreamType, RTPTransport] = {}
+            for stream_type in self.streams:
+                transports[stream_type] = await stack.enter_async_context(
+                    transport_for_scheme(scheme)(connection)
+                )
+            session = await stack.enter_async_context(
+                RTSPMediaSession(
+                    connection,
+                    self.rtsp_url,
+                    media_stream_configurations=[
+                        MediaStreamConfiguration(
+                            transports[stream_type],
+                            stream.media_type,
+                            stream.media_index,
+                        )
+                        for stream_type, stream in self.streams.items()
+                    ],
+                )
+            )
+            for stream in self.streams.values():
+                if isinstance(stream, AudioStream):
+                    # Raises before any stream is moved if the new session can't be decoded
+                    stream.configure(session.sdp)  # type: ignore
+            if self.play_time is not None:
+                await session.play()  # type: ignore
+            for stream_type, stream in self.streams.items():
+                stream.attach_transport(transports[stream_type])
+                receive_buffer_size = self._receive_buffer_sizes.get(stream_type)
+                if receive_buffer_size is not None:
+                    stream.set_receive_buffer_size(receive_buffer_size)
+                if isinstance(stream, VideoStream):
+                    stream.prime_decoder(session.sdp)  # type: ignore
+            session_stack = stack.pop_all()
+        previous_session_stack = self._session_stack.pop_all()
+        await self._session_stack.enter_async_context(session_stack)
+        self.session = session
+        self._connection = connection
+        self.scheme = scheme
+        try:
+            await previous_session_stack.aclose()
+        except Exception as exception:
+            _logger.warning(f"Failed to close the previous RTSP session: {exception!r}")
+
+    async def reconnect(self) -> None:
+        """Sets up a new RTSP media session with the same streams and transports and moves the streams to it, see
+        `switch_transport`. Failed attempts are retried after `RECONNECT_INTERVAL` seconds, doubling up to
+        `MAX_RECONNECT_INTERVAL` seconds, until one succeeds.
+
+        The streams keep their queues, so consumers see a gap in the items instead of the end of the streams. The
+        number of reconnects and the durations of the gaps are found in `stats`.
+        """
+        self._update_gap()
+        gap_start_time = max(
+            (
+                stream.last_packet_time
+                for stream in self.streams.values()
+                if stream.last_packet_time is not None
+            ),
+            default=time.monotonic(),
+        )
+        interval = RECONNECT_INTERVAL
+        while True:
+            try:
+                await self.switch_transport(cast(str, self.scheme))
+                break
+            except Exception as exception:
+                _logger.warning(f"Failed to reconnect the RTSP session: {exception!r}")
+            await asyncio.sleep(interval)
+            interval = min(2 * interval, MAX_RECONNECT_INTERVAL)
+        self.reconnect_count += 1
+        self._session_start_time = time.monotonic()
+        self._gap_start_time = gap_start_time
+
+    def _update_gap(self) -> None:
+        """Records the duration of the gap after the last reconnect once the new session has received a packet."""
+        if self._gap_start_time is None:
+            return
+        first_packet_time = min(
+            (
+                stream.first_packet_time
+                for stream in self.streams.values()
+                if stream.first_packet_time is not None
+            ),
+            default=None,
+        )
+        if first_packet_time is None:
+            return
+        self._last_gap_duration = first_packet_time - self._gap_start_time
+        self._total_gap_duration += self._last_gap_duration
+        self._gap_count += 1
+        self._gap_start_time = None
+
+    def _stall_reason(self, stall_timeout: float) -> Optional[str]:
+        """Tells why the session is stalled or returns `None` if it isn't."""
+        if self._connection is not None and not self._connection.running:
+            return "RTSP connection lost"
+        if self.play_time is None:
+            return None
+        last_packet_time = max(
+            (
+                stream.last_packet_time
+                for stream in self.streams.values()
+                if stream.last_packet_time is not None
+            ),
+            default=self.play_time,
+        )
+        if self._session_start_time is not None:
+            last_packet_time = max(last_packet_time, self._session_start_time)
+        silence = time.monotonic() - last_packet_time
+        if silence > stall_timeout:
+            return f"no RTP packets received for {silence:.1f} s"
+        return None
+
+    async def _monitor_session(self, stall_timeout: float) -> None:
+        """Reconnects the session when it stalls for `stall_timeout` seconds or the RTSP connection is lost."""
+        while True:
+            await asyncio.sleep(stall_timeout / 4)
+            self._update_gap()
+            reason = self._stall_reason(stall_timeout)
+            if reason is None:
+                continue
+            _logger.warning(f"RTSP session stalled: {reason}. Reconnecting.")
+            await self.reconnect()
+
+    async def _monitor_udp_loss(self, detector: UDPLossDetector) -> None:
+        """Switches the streams to interleaved TCP when `detector` finds sustained packet loss."""
+        while True:
+            await asyncio.sleep(UDP_LOSS_CHECK_INTERVAL)
+            if not detector.check(
+                {
+                    stream_type: stream.packet_counts
+                    for stream_type, stream in self.streams.items()
+                }
+            ):
+                continue
+            _logger.warning("Sustained UDP packet loss. Switching to interleaved TCP.")
+            try:
+                await self.switch_transport("rtspt")
+            except Exception as exception:
+                _logger.warning(f"Failed to switch to interleaved TCP: {exception!r}")
+                detector.reset()
+                continue
+            return
+
+
+class MediaThread:
+    """Runs an event loop in a background thread, so that RTSP streams can receive and demux their packets without
+    being delayed by a busy application event loop.
+
+    Coroutines and async context managers are run on the media loop with `run` and `enter` from any other loop.
+    `stop` stops the loop, cancelling the tasks which are still running on it, and waits for the thread to finish.
+    """
+
+    loop: asyncio.AbstractEventLoop
+    """The event loop of the media thread."""
+
+    def __init__(self, name: str = "g3pylib-media") -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+            self.loop.close()
+
+    def start(self, coro: Coroutine[Any, Any, _T]) -> Future[_T]:
+        """Starts a coroutine on the media loop and returns a future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run(self, coro: Coroutine[Any, Any, _T]) -> _T:
+        """Runs a coroutine on the media loop and waits for its result."""
+        return await asyncio.wrap_future(self.start(coro))
+
+    @asynccontextmanager
+    async def enter(
+        self, context_manager: AsyncContextManager[_T]
+    ) -> AsyncIterator[_T]:
+        """Enters an async context manager on the media loop and exits it there when the returned context is exited."""
+        stack = AsyncExitStack()
+        value = await self.run(stack.enter_async_context(context_manager))
+        try:
+            yield value
+        finally:
+            await self.run(stack.aclose())
+
+    async def stop(self) -> None:
+        """Stops the media loop and waits for the thread to finish, in a worker thread so that the calling loop
+        keeps running while the tasks on the media loop are cancelled."""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        await asyncio.to_thread(self._thread.join)
+
+
+class StreamProxy:
+    """Gives access to a `Stream` running on a `MediaThread` from another event loop.
+
+    `demux`, `decode`, `decode_batches` and `broadcast` run the demuxers and decoders of the stream on the media loop
+    and forward their output to queues on the calling loop, in batches and waiting for room when a queue is full. Any
+    other attribute, such as `stats`, is read from the stream directly.
+
+    Decoded video frames are forwarded as soon as they are decoded, so they always get new arrays, and with
+    `latest_only` the frames are replaced in the queue on the calling loop without being counted as superseded. They
+    are then forwarded unconverted and converted when they are taken from the queue, in the `decoder_executor` of
+    the stream if there is one.
+    """
+
+    stream: Stream
+    """The proxied stream."""
+    media_thread: MediaThread
+    """The thread the stream runs on."""
+
+    def __init__(self, stream: Stream, media_thread: MediaThread) -> None:
+        self.stream = stream
+        self.media_thread = media_thread
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+    def demux(self, **kwargs: Any) -> AsyncContextManager[asyncio.Queue[Any]]:
+        """Returns a queue with the output of `Stream.demux` of the stream. Any keyword arguments are passed on."""
+        return self._forward(self.stream.demux(**kwargs))
+
+    def decode(self, **kwargs: Any) -> AsyncContextManager[asyncio.Queue[Any]]:
+        """Returns a queue with the output of `Stream.decode` of the stream. Any keyword arguments are passed on."""
+        if isinstance(self.stream, VideoStream):
+            kwargs["reuse_buffers"] = False
+            latest_only = kwargs.get("latest_only", False)
+            converter = None
+            if latest_only:
+                converter = _frame_converter(
+                    kwargs.pop("format", None),
+                    kwargs.pop("size", None),
+                    kwargs.pop("flip", False),
+                    kwargs.pop("ndarray", None),
+                )
+            return self._forward(
+                self.stream.decode(**kwargs),
+                FrameQueue(
+                    latest_only,
+                    converter=converter,
+                    executor=self.stream.decoder_executor,
+                ),
+            )
+        return self._forward(self.stream.decode(**kwargs))  # type: ignore
+
+    def decode_batches(self, **kwargs: Any) -> AsyncContextManager[asyncio.Queue[Any]]:
+        """Returns a queue with the output of `DataStream.decode_batches` of the stream. Any keyword arguments are
+        passed on."""
+        return self._forward(cast(DataStream, self.stream).decode_batches(**kwargs))
+
+    def broadcast(self, **decode_kwargs: Any) -> AsyncContextManager[Broadcast]:
+        """Decodes the stream once and returns a `Broadcast` on the calling loop, see `Stream.broadcast`."""
+        return Stream.broadcast(self, **decode_kwargs)  # type: ignore
+
+    @asynccontextmanager
+    async def _forward(
+        self,
+        context_manager: AsyncContextManager[asyncio.Queue[_T]],
+        queue: Optional[asyncio.Queue[_T]] = None,
+    ) -> AsyncIterator[asyncio.Queue[_T]]:
+        """Enters `context_manager` on the media loop and forwards the items of its queue to `queue`, or to a new
+        queue of the same size, on the calling loop."""
+        loop = asyncio.get_running_loop()
+        async with self.media_thread.enter(context_manager) as source_queue:
+            if queue is None:
+                queue = asyncio.Queue(source_queue.maxsize)
+            target_queue = queue
+
+            async def forwarder():
+                while True:
+                    items = await _get_items(source_queue, DemuxMode.BATCHED)
+                    await asyncio.wrap_future(
+                        asyncio.run_coroutine_threadsafe(
+                            _put_items(target_queue, items, DemuxMode.BATCHED), loop
+                        )
+                    )
+
+            forwarder_future = self.media_thread.start(forwarder())
+            try:
+                yield queue
+            finally:
+                forwarder_future.cancel()
+
+
+class ThreadedStreams(Streams):
+    """A `Streams` whose RTSP session, transports, demuxers and decoders run on a `MediaThread`.
+
+    The stream properties return a `StreamProxy` for each stream, which delivers the demuxed and decoded items to the
+    event loop of the caller.
+    """
+
+    media_thread: MediaThread
+    """The thread the session runs on."""
+
+    def __init__(
+        self,
+        session: RTSPMediaSession,
+        streams: Set[Stream],
+        rtsp_url: Optional[str] = None,
+    ) -> None:
+        super().__init__(session, streams, rtsp_url)
+        self._proxies: Dict[StreamType, StreamProxy] = {}
+
+    def _get_stream(self, stream_type: StreamType) -> Stream:
+        if stream_type not in self._proxies:
+            self._proxies[stream_type] = StreamProxy(
+                super()._get_stream(stream_type), self.media_thread
+            )
+        return cast(Stream, self._proxies[stream_type])
+
+    @classmethod
+    @asynccontextmanager
+    async def connect(cls, rtsp_url: str, **kwargs: Any) -> AsyncIterator[ThreadedStreams]:  # type: ignore
+        """Starts a `MediaThread` and sets up the RTSP media session on it, see `Streams.connect` for the arguments.
+        The thread is stopped when the session is closed."""
+        media_thread = MediaThread()
+        try:
+            async with media_thread.enter(
+                super().connect(rtsp_url, **kwargs)
+            ) as streams:
+                streams = cast(ThreadedStreams, streams)
+                streams.media_thread = media_thread
+                yield streams
+        finally:
+            await media_thread.stop()
+
+    async def play(self) -> None:
+        """Starts the streaming in the RTSP media session on the media thread."""
+        await self.media_thread.run(super().play())
+
+    async def switch_transport(self, scheme: str) -> None:
+        """Switches the transports on the media thread, see `Streams.switch_transport`."""
+        await self.media_thread.run(super().switch_transport(scheme))
+
+    async def reconnect(self) -> None:
+        """Reconnects the session on the media thread, see `Streams.reconnect`."""
+        await self.media_thread.run(super().reconnect())
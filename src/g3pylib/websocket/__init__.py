@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 from abc import ABC, abstractmethod
 from collections import defaultdict
@@ -13,7 +12,7 @@ import websockets.legacy.client
 from websockets.client import connect as websockets_connect
 from websockets.typing import Subprotocol
 
-from g3pylib import _utils
+from g3pylib import _utils, jsoncodec
 from g3pylib.exceptions import InvalidResponseError
 from g3pylib.g3typing import (
     URI,
@@ -193,8 +192,9 @@ class G3WebSocketClientProtocol(
         async def receiver_task() -> None:
             """Listens for and handles/delegates incoming messages."""
             async for message in self:
-                json_message: JSONObject = json.loads(message)
-                self.g3_logger.debug(f"Received {json_message}")
+                json_message: JSONObject = jsoncodec.loads(message)
+                if self.g3_logger.isEnabledFor(logging.DEBUG):
+                    self.g3_logger.debug(f"Received {json_message}")
                 match json_message:
                     case {"id": message_id, "body": message_body}:
                         self._future_messages[cast(MessageId, message_id)].set_result(
@@ -229,7 +229,7 @@ class G3WebSocketClientProtocol(
         """Sends a request  with a unique id and returns the body of the response with the same id."""
         self._message_count += 1
         request["id"] = self._message_count
-        string_request_with_id = json.dumps(request)
+        string_request_with_id = jsoncodec.dumps(request)
         future = self._future_messages[
             MessageId(self._message_count)
         ] = self._event_loop.create_future()
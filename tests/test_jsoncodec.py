@@ -0,0 +1,36 @@
+import json
+from typing import List
+
+import pytest
+
+from g3pylib.jsoncodec import JSONCodec, OrjsonJSONCodec, StdlibJSONCodec
+
+
+def available_codecs() -> List[JSONCodec]:
+    codecs: List[JSONCodec] = [StdlibJSONCodec()]
+    try:
+        codecs.append(OrjsonJSONCodec())
+    except ImportError:
+        pass
+    return codecs
+
+
+@pytest.mark.parametrize("codec", available_codecs(), ids=lambda codec: codec.name)
+class TestJSONCodec:
+    @staticmethod
+    def test_round_trip(codec: JSONCodec):
+        request = {"path": "rudimentary.gaze-sample", "method": "GET", "id": 1}
+        assert json.loads(codec.dumps(request)) == request
+        assert codec.loads(b'{"id": 1, "body": [0.5, null]}') == {
+            "id": 1,
+            "body": [0.5, None],
+        }
+
+    @staticmethod
+    def test_accepts_what_json_accepts(codec: JSONCodec):
+        assert codec.loads("[NaN, 18446744073709551616]")[1] == 2**64  # type: ignore
+
+    @staticmethod
+    def test_invalid_message(codec: JSONCodec):
+        with pytest.raises(json.JSONDecodeError):
+            codec.loads(b"")
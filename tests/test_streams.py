@@ -0,0 +1,1650 @@
+import asyncio
+import base64
+import errno
+import fractions
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Set, cast
+
+import av  # type: ignore
+import numpy as np
+import pytest
+from dpkt.rtp import RTP  # type: ignore
+
+from g3pylib.streams import (
+    FRAME_QUEUE_SIZE,
+    FUA,
+    GAZE_SCHEMA,
+    IMU_SCHEMA,
+    MTAP16,
+    PSFB,
+    STAPA,
+    AccessUnit,
+    AudioStream,
+    DataStream,
+    DecoderThreading,
+    DemuxMode,
+    FrameConverter,
+    FrameQueue,
+    FUAReassemblyBuffer,
+    GazeBuffer,
+    GazeFrameSynchronizer,
+    KeyframeRequestKind,
+    MediaThread,
+    NALUnit,
+    OverflowPolicy,
+    RTPClock,
+    RTPJitterBuffer,
+    RTPQueue,
+    SkipLevel,
+    Stream,
+    StreamProxy,
+    Streams,
+    StreamType,
+    SubscriberPolicy,
+    UDPLossDetector,
+    VideoStream,
+)
+
+SPS = bytes([0x67]) + os.urandom(10)
+PPS = bytes([0x68]) + os.urandom(4)
+IDR = bytes([0x65]) + os.urandom(3000)
+NON_IDR = bytes([0x41]) + os.urandom(500)
+
+
+class FakeRTCPStats:
+    ssrc = 0x11111111
+
+    def build_rtcp(self) -> None:
+        return None
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.stats = FakeRTCPStats()
+        self.sent_rtcp: List[Any] = []
+        self.clients: Set[Stream] = set()
+
+    def subscribe(self, client: Stream) -> None:
+        self.clients.add(client)
+
+    def unsubscribe(self, client: Stream) -> None:
+        self.clients.discard(client)
+
+    async def send_rtcp_report(self, rtcp: Any) -> None:
+        self.sent_rtcp.append(rtcp)
+
+
+def rtp_packet(
+    payload: bytes, seq: int, ts: int, marker: bool = False, ssrc: int = 0x22222222
+) -> Any:
+    rtp: Any = RTP()
+    rtp.pt = 96
+    rtp.ssrc = ssrc
+    rtp.seq = seq
+    rtp.ts = ts
+    rtp.m = int(marker)
+    rtp.data = payload
+    return RTP(bytes(rtp))
+
+
+def fragment(nal_unit: bytes, fragment_size: int) -> List[bytes]:
+    header, payload = nal_unit[0], nal_unit[1:]
+    chunks = [
+        payload[i : i + fragment_size] for i in range(0, len(payload), fragment_size)
+    ]
+    fragments: List[bytes] = []
+    for i, chunk in enumerate(chunks):
+        fu_header = header & 0b00011111
+        if i == 0:
+            fu_header |= 0b10000000
+        if i == len(chunks) - 1:
+            fu_header |= 0b01000000
+        fragments.append(bytes([header & 0b11100000 | 28, fu_header]) + chunk)
+    return fragments
+
+
+class TestFUAReassemblyBuffer:
+    @staticmethod
+    def reassemble(buffer: FUAReassemblyBuffer, fragments: List[bytes]) -> NALUnit:
+        for rtp_payload in fragments:
+            fu_a = NALUnit.from_rtp_payload(rtp_payload)
+            assert isinstance(fu_a, FUA)
+            if fu_a.s:
+                buffer.start(fu_a)
+            else:
+                buffer.append(fu_a)
+        return buffer.finish()
+
+    def test_reassembles_nal_unit_with_prefix(self):
+        idr = bytes([0x65]) + os.urandom(10_000)
+        nal_unit = self.reassemble(FUAReassemblyBuffer(), fragment(idr, 1400))
+        assert nal_unit.type == 5
+        assert bytes(nal_unit.data) == idr
+        assert bytes(nal_unit.data_with_prefix) == b"\x00\x00\x01" + idr
+
+    def test_keeps_views_of_fragment_payloads(self):
+        idr = bytes([0x65]) + os.urandom(10_000)
+        fragments = fragment(idr, 1400)
+        nal_unit = self.reassemble(FUAReassemblyBuffer(), fragments)
+        assert nal_unit.header == 0x65
+        chunks = nal_unit.prefixed_chunks
+        assert bytes(chunks[0]) == b"\x00\x00\x01\x65"
+        assert [cast(memoryview, chunk).obj for chunk in chunks[1:]] == fragments
+
+    def test_keeps_finished_nal_units_intact(self):
+        buffer = FUAReassemblyBuffer()
+        first = bytes([0x65]) + os.urandom(5_000)
+        second = bytes([0x41]) + os.urandom(3_000)
+        first_nal_unit = self.reassemble(buffer, fragment(first, 1000))
+        second_nal_unit = self.reassemble(buffer, fragment(second, 1000))
+        assert bytes(first_nal_unit.data) == first
+        assert bytes(second_nal_unit.data) == second
+
+    def test_access_unit_packet(self):
+        access_unit = AccessUnit(3600)
+        access_unit.nal_units = [
+            NALUnit(SPS),
+            NALUnit(PPS),
+            self.reassemble(FUAReassemblyBuffer(), fragment(IDR, 1000)),
+        ]
+        packet = access_unit.to_packet()
+        assert bytes(packet) == b"".join(
+            b"\x00\x00\x01" + nal_unit for nal_unit in [SPS, PPS, IDR]
+        )
+        assert packet.pts == 3600
+
+
+class TestAggregationPackets:
+    @staticmethod
+    def test_stap_a():
+        payload = bytes([0x78]) + b"".join(
+            len(nal_unit).to_bytes(2, "big") + nal_unit for nal_unit in [SPS, PPS]
+        )
+        stap_a = NALUnit.from_rtp_payload(payload)
+        assert isinstance(stap_a, STAPA)
+        assert [bytes(nal_unit.data) for nal_unit in stap_a.nal_units] == [SPS, PPS]
+
+    @staticmethod
+    def test_mtap16():
+        payload = (
+            bytes([0x7A])
+            + (1).to_bytes(2, "big")
+            + b"".join(
+                len(nal_unit).to_bytes(2, "big")
+                + bytes([0])
+                + (3600 * i).to_bytes(2, "big")
+                + nal_unit
+                for i, nal_unit in enumerate([NON_IDR, NON_IDR])
+            )
+        )
+        mtap16 = NALUnit.from_rtp_payload(payload)
+        assert isinstance(mtap16, MTAP16)
+        assert [bytes(nal_unit.data) for nal_unit in mtap16.nal_units] == [
+            NON_IDR,
+            NON_IDR,
+        ]
+
+    @staticmethod
+    def test_truncated_aggregation_unit_is_dropped():
+        payload = bytes([0x78]) + len(SPS).to_bytes(2, "big") + SPS + b"\x00\x10\x68"
+        stap_a = NALUnit.from_rtp_payload(payload)
+        assert isinstance(stap_a, STAPA)
+        assert [bytes(nal_unit.data) for nal_unit in stap_a.nal_units] == [SPS]
+
+
+class TestVideoStreamDemux:
+    @staticmethod
+    async def test_groups_nal_units_into_access_units():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA)  # type: ignore
+        payloads = [SPS, PPS, *fragment(IDR, 1000)]
+        packets = [
+            rtp_packet(payload, seq, 0, marker=seq == len(payloads) - 1)
+            for seq, payload in enumerate(payloads)
+        ]
+        # The marker bit of the second access unit is lost
+        packets.append(rtp_packet(NON_IDR, len(packets), 3600))
+        packets.append(rtp_packet(NON_IDR, len(packets), 7200, marker=True))
+        async with stream.demux() as access_unit_queue:
+            for packet in packets:
+                stream.handle_rtp(packet)
+            access_units = [
+                (await asyncio.wait_for(access_unit_queue.get(), 1))[0]
+                for _ in range(3)
+            ]
+        assert [access_unit.rtp_timestamp for access_unit in access_units] == [
+            0,
+            3600,
+            7200,
+        ]
+        assert access_units[0].is_keyframe
+        assert [nal_unit.type for nal_unit in access_units[0].nal_units] == [7, 8, 5]
+        assert access_units[0].data == b"".join(
+            b"\x00\x00\x01" + nal_unit for nal_unit in [SPS, PPS, IDR]
+        )
+        assert not access_units[1].is_keyframe
+
+    @staticmethod
+    async def test_parameter_sets_in_stap_a():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA)  # type: ignore
+        stap_a = bytes([0x78]) + b"".join(
+            len(nal_unit).to_bytes(2, "big") + nal_unit for nal_unit in [SPS, PPS]
+        )
+        async with stream.demux() as access_unit_queue:
+            stream.handle_rtp(rtp_packet(stap_a, 0, 0))
+            stream.handle_rtp(rtp_packet(IDR[:1000], 1, 0, marker=True))
+            access_unit, _ = await asyncio.wait_for(access_unit_queue.get(), 1)
+        assert [nal_unit.type for nal_unit in access_unit.nal_units] == [7, 8, 5]
+        assert stream.stats["unhandled_count"] == 0
+
+
+class TestLatestOnlyDecode:
+    @staticmethod
+    async def test_keeps_only_latest_frame():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        decoded: List[int] = []
+
+        def decode_access_unit(access_unit: Any, converter: Any) -> List[Any]:
+            decoded.append(access_unit.rtp_timestamp)
+            return [
+                (
+                    access_unit.rtp_timestamp,
+                    SimpleNamespace(pts=access_unit.rtp_timestamp),
+                )
+            ]
+
+        stream._decode_access_unit = decode_access_unit  # type: ignore
+        payloads = [SPS, PPS, IDR[:1000], *[NON_IDR] * 4]
+        async with stream.decode(latest_only=True) as frame_queue:
+            for seq, payload in enumerate(payloads):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), marker=seq >= 2)
+                )
+            await asyncio.sleep(0.01)
+            frame, _timestamp = frame_queue.get_nowait()
+        assert decoded == [0, 3600, 7200, 10800, 14400]
+        assert frame.pts == 14400
+        assert frame_queue.empty()
+        assert stream.stats["superseded_count"] == 4
+
+    @staticmethod
+    async def test_converts_only_taken_frames(monkeypatch: pytest.MonkeyPatch):
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        converted: List[int] = []
+        convert = FrameConverter.convert
+
+        def counting_convert(self: FrameConverter, frame: Any) -> Any:
+            converted.append(frame.pts)
+            return convert(self, frame)
+
+        def decode_access_unit(access_unit: Any, converter: Any) -> List[Any]:
+            assert converter is None
+            frame = av.VideoFrame(64, 48, "yuv420p")  # type: ignore
+            frame.pts = access_unit.rtp_timestamp
+            return [(frame.pts, frame)]
+
+        monkeypatch.setattr(FrameConverter, "convert", counting_convert)
+        stream._decode_access_unit = decode_access_unit  # type: ignore
+        payloads = [SPS, PPS, IDR[:1000], *[NON_IDR] * 4]
+        async with stream.decode(latest_only=True, format="gray") as frame_queue:
+            for seq, payload in enumerate(payloads):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), marker=seq >= 2)
+                )
+            await asyncio.sleep(0.01)
+            array, _timestamp = frame_queue.get_nowait()
+        assert converted == [14400]
+        assert array.shape == (48, 64)
+
+    @staticmethod
+    async def test_converts_in_decoder_executor(monkeypatch: pytest.MonkeyPatch):
+        stream = VideoStream(
+            FakeTransport(),  # type: ignore
+            StreamType.SCENE_CAMERA,
+            decoder_executor=ThreadPoolExecutor(max_workers=1),
+            jitter_buffer_latency=None,
+        )
+        threads: List[int] = []
+        convert = FrameConverter.convert
+
+        def recording_convert(self: FrameConverter, frame: Any) -> Any:
+            threads.append(threading.get_ident())
+            return convert(self, frame)
+
+        def decode_access_unit(access_unit: Any, converter: Any) -> List[Any]:
+            frame = av.VideoFrame(64, 48, "yuv420p")  # type: ignore
+            frame.pts = access_unit.rtp_timestamp
+            return [(frame.pts, frame)]
+
+        monkeypatch.setattr(FrameConverter, "convert", recording_convert)
+        stream._decode_access_unit = decode_access_unit  # type: ignore
+        async with stream.decode(latest_only=True, format="gray") as frame_queue:
+            for seq, payload in enumerate([SPS, PPS, IDR[:1000]]):
+                stream.handle_rtp(rtp_packet(payload, seq, 0, marker=seq == 2))
+            array, _timestamp = await asyncio.wait_for(frame_queue.get(), 1)
+        assert array.shape == (48, 64)
+        assert threads and threading.get_ident() not in threads
+
+    @staticmethod
+    async def test_passes_on_converter_errors():
+        converter = FrameConverter("gray")
+        frame_queue = FrameQueue(
+            True, converter=converter, executor=ThreadPoolExecutor(max_workers=1)
+        )
+        frame_queue.put_nowait((SimpleNamespace(pts=0), None))
+        with pytest.raises(TypeError):
+            await asyncio.wait_for(frame_queue.get(), 1)
+
+
+class TestFrameConverter:
+    @staticmethod
+    def test_converts_into_reused_arrays():
+        image = np.random.randint(0, 256, (48, 64, 3), dtype=np.uint8)
+        frame = av.VideoFrame.from_ndarray(image, format="rgb24")  # type: ignore
+        converter = FrameConverter("bgr24", flip=True)
+        frame_queue = FrameQueue(buffer_pool=converter.buffer_pool)
+        for timestamp in range(3):
+            frame_queue.put_nowait((converter.convert(frame), timestamp))
+        arrays = [frame_queue.get_nowait()[0] for _ in range(3)]
+        assert np.array_equal(arrays[-1], image[::-1, :, ::-1])
+        assert converter.buffer_pool.allocation_count == 3
+        frame_queue.put_nowait((converter.convert(frame), 3))
+        # Only the array of the frame taken last is still in use
+        assert converter.buffer_pool.allocation_count == 3
+        assert converter.convert(frame) is not arrays[-1]
+
+    @staticmethod
+    def test_resizes():
+        frame = av.VideoFrame(64, 48, "yuv420p")  # type: ignore
+        array = FrameConverter("gray", size=(32, 24)).convert(frame)
+        assert array.shape == (24, 32)
+
+    @staticmethod
+    def test_scales_video_frames():
+        converter = FrameConverter(None, size=(32, 24), ndarray=False)
+        for _ in range(2):
+            frame = converter.convert(av.VideoFrame(64, 48, "yuv420p"))  # type: ignore
+            assert (frame.width, frame.height) == (32, 24)
+            assert frame.format.name == "yuv420p"
+
+    @staticmethod
+    async def test_decode_with_only_size_scales_video_frames():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+
+        def decode_access_unit(access_unit: Any, converter: Any) -> List[Any]:
+            return [(0, converter.convert(av.VideoFrame(64, 48, "yuv420p")))]  # type: ignore
+
+        stream._decode_access_unit = decode_access_unit  # type: ignore
+        async with stream.decode(size=(32, 24)) as frame_queue:
+            stream.handle_rtp(rtp_packet(SPS, 0, 0))
+            stream.handle_rtp(rtp_packet(IDR[:1000], 1, 0, marker=True))
+            frame, _timestamp = await asyncio.wait_for(frame_queue.get(), 1)
+        assert (frame.width, frame.height) == (32, 24)
+        assert frame_queue.buffer_pool is None
+
+
+class TestBroadcast:
+    @staticmethod
+    async def test_subscribers_share_one_decoder():
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        async with stream.broadcast() as broadcast:
+            display_queue = broadcast.subscribe()
+            recording_queue = broadcast.subscribe(SubscriberPolicy.BLOCK)
+            for seq in range(3):
+                stream.handle_rtp(rtp_packet(json.dumps({"n": seq}).encode(), seq, 0))
+            samples = [
+                [(await asyncio.wait_for(queue.get(), 1))[0] for _ in range(3)]
+                for queue in [display_queue, recording_queue]
+            ]
+        assert samples == [[{"n": 0}, {"n": 1}, {"n": 2}]] * 2
+        assert stream.stats["samples"] == 3
+
+    @staticmethod
+    async def test_slow_subscriber_drops_without_holding_back_others():
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        async with stream.broadcast() as broadcast:
+            fast_queue = broadcast.subscribe(SubscriberPolicy.BLOCK)
+            latest_queue = broadcast.subscribe(maxsize=1)
+            first_queue = broadcast.subscribe(SubscriberPolicy.DROP_NEWEST, maxsize=2)
+            received: List[Any] = []
+            for seq in range(5):
+                stream.handle_rtp(rtp_packet(json.dumps({"n": seq}).encode(), seq, 0))
+                received.append((await asyncio.wait_for(fast_queue.get(), 1))[0])
+            broadcast.unsubscribe(first_queue)
+        assert received == [{"n": n} for n in range(5)]
+        assert latest_queue.get_nowait()[0] == {"n": 4}
+        assert latest_queue.dropped_count == 4
+        assert [first_queue.get_nowait()[0] for _ in range(2)] == [{"n": 0}, {"n": 1}]
+        assert first_queue.dropped_count == 3
+
+    @staticmethod
+    async def test_video_subscribers_get_their_own_arrays():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+
+        def decode_access_unit(access_unit: Any, converter: Any) -> List[Any]:
+            frame = av.VideoFrame(64, 48, "yuv420p")  # type: ignore
+            return [(access_unit.rtp_timestamp, converter.convert(frame))]
+
+        stream._decode_access_unit = decode_access_unit  # type: ignore
+        payloads = [SPS, PPS, IDR[:1000], *[NON_IDR] * 3]
+        arrays: List[Any] = []
+        async with stream.broadcast(format="gray") as broadcast:
+            subscriber_queues = [broadcast.subscribe(), broadcast.subscribe()]
+            for seq, payload in enumerate(payloads):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), marker=seq >= 2)
+                )
+                if seq >= 2:
+                    for subscriber_queue in subscriber_queues:
+                        array, _ = await asyncio.wait_for(subscriber_queue.get(), 1)
+                        arrays.append(array)
+        assert arrays[0] is arrays[1]
+        assert len({id(array) for array in arrays}) == 4
+
+    @staticmethod
+    async def test_second_decoder_raises():
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        async with stream.broadcast():
+            for decode in [stream.decode, stream.decode_batches, stream.demux]:
+                with pytest.raises(RuntimeError):
+                    async with decode():
+                        pass
+        async with stream.decode() as json_queue:
+            stream.handle_rtp(rtp_packet(json.dumps({"n": 0}).encode(), 0, 0))
+            assert (await asyncio.wait_for(json_queue.get(), 1))[0] == {"n": 0}
+
+
+def h264_access_units(
+    count: int, width: int = 64, height: int = 48
+) -> List[List[bytes]]:
+    encoder: Any = av.CodecContext.create("libx264", "w")  # type: ignore
+    encoder.width = width
+    encoder.height = height
+    encoder.pix_fmt = "yuv420p"
+    encoder.time_base = fractions.Fraction(1, 25)
+    encoder.options = {"preset": "ultrafast", "tune": "zerolatency"}
+    packets: List[bytes] = []
+    for i in range(count):
+        frame: Any = av.VideoFrame(width, height, "yuv420p")  # type: ignore
+        for plane in frame.planes:
+            plane.update(bytes([(16 * i) % 256]) * plane.buffer_size)
+        frame.pts = i
+        packets.extend(bytes(packet) for packet in encoder.encode(frame))
+    packets.extend(bytes(packet) for packet in encoder.encode(None))
+    return [
+        [nal_unit.rstrip(b"\x00") for nal_unit in packet.split(b"\x00\x00\x01")[1:]]
+        for packet in packets
+    ]
+
+
+class TestExecutorDecoding:
+    @staticmethod
+    async def test_decodes_in_executor():
+        stream = VideoStream(
+            FakeTransport(),  # type: ignore
+            StreamType.SCENE_CAMERA,
+            decoder_executor=ThreadPoolExecutor(max_workers=1),
+            jitter_buffer_latency=None,
+        )
+        access_units = h264_access_units(5)
+        seq = 0
+        async with stream.decode(format="rgb24") as frame_queue:
+            frames: List[Any] = []
+            for i, nal_units in enumerate(access_units):
+                for j, nal_unit in enumerate(nal_units):
+                    stream.handle_rtp(
+                        rtp_packet(
+                            nal_unit, seq, 3600 * i, marker=j == len(nal_units) - 1
+                        )
+                    )
+                    seq += 1
+                array, _timestamp = await asyncio.wait_for(frame_queue.get(), 1)
+                frames.append(array.copy())
+        assert len(frames) == 5
+        assert all(frame.shape == (48, 64, 3) for frame in frames)
+        assert not np.array_equal(frames[0], frames[-1])
+        stats = stream.stats
+        assert stats["decode_count"] == 5
+        assert stats["decode_error_count"] == 0
+        assert stats["mean_frame_decode_time"] > 0
+
+
+class TestDecoderThreading:
+    @staticmethod
+    def test_codec_options():
+        assert DecoderThreading.LOW_LATENCY.codec_options() == {
+            "threads": "auto",
+            "thread_type": "slice",
+            "flags": "+low_delay",
+        }
+        stream = VideoStream(
+            FakeTransport(),  # type: ignore
+            StreamType.SCENE_CAMERA,
+            decoder_threading=DecoderThreading.HIGH_THROUGHPUT,
+            decoder_thread_count=4,
+        )
+        stream.codec_context.open()
+        assert stream.codec_context.thread_count == 4
+
+
+class TestAdaptiveSkipping:
+    @staticmethod
+    def access_unit(rtp_timestamp: int, nal_unit: bytes) -> AccessUnit:
+        access_unit = AccessUnit(rtp_timestamp)
+        access_unit.nal_units.append(NALUnit(nal_unit))
+        return access_unit
+
+    def test_skip_level_follows_queue_depth(self):
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, adaptive_skipping=True)  # type: ignore
+        non_reference = bytes([0x01]) + NON_IDR[1:]
+        skip_levels: List[SkipLevel] = []
+        for queue_depth, nal_unit in [
+            (0, IDR),
+            (5, non_reference),
+            (5, NON_IDR),
+            (9, NON_IDR),
+            (0, NON_IDR),
+            (0, IDR),
+            (0, non_reference),
+        ]:
+            stream._adapt_skip_level(self.access_unit(0, nal_unit), queue_depth)
+            skip_levels.append(stream.skip_level)
+        assert skip_levels == [
+            SkipLevel.NONE,
+            SkipLevel.NONREF,
+            SkipLevel.NONREF,
+            SkipLevel.NONKEY,
+            SkipLevel.NONKEY,
+            SkipLevel.NONE,
+            SkipLevel.NONE,
+        ]
+        assert stream.codec_context.skip_frame == "DEFAULT"
+        assert stream.stats["skipped_count"] == 3
+
+
+class FakeSDP:
+    def __init__(self, fmtp: Dict[str, Any]) -> None:
+        self.fmtp = fmtp
+
+    def get_media(self, media_type: str, media_index: int) -> Dict[str, Any]:
+        return {"attributes": {"fmtp": self.fmtp}}
+
+
+class TestPrimeDecoder:
+    @staticmethod
+    async def test_decoding_starts_at_first_keyframe():
+        transport = FakeTransport()
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        sprop_parameter_sets = ",".join(
+            base64.b64encode(nal_unit).decode() for nal_unit in [SPS, PPS]
+        )
+        assert stream.prime_decoder(
+            FakeSDP({"pt": 96, "sprop-parameter-sets": sprop_parameter_sets})
+        )
+        async with stream.demux() as access_unit_queue:
+            stream.handle_rtp(rtp_packet(NON_IDR, 0, 0, marker=True))
+            stream.handle_rtp(rtp_packet(IDR[:1000], 1, 3600, marker=True))
+            access_unit, _ = await asyncio.wait_for(access_unit_queue.get(), 1)
+            await asyncio.sleep(0)
+        assert access_unit.rtp_timestamp == 3600
+        assert [nal_unit.type for nal_unit in access_unit.nal_units] == [7, 8, 5]
+        assert len(transport.sent_rtcp) == 1
+
+    @staticmethod
+    def test_sdp_without_parameter_sets():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA)  # type: ignore
+        assert not stream.prime_decoder(FakeSDP({"pt": 96}))
+        assert not stream.sps_or_pps_received
+
+
+def aac_access_units(count: int, sample_rate: int = 48000) -> Any:
+    encoder: Any = av.CodecContext.create("aac", "w")  # type: ignore
+    encoder.sample_rate = sample_rate
+    encoder.layout = "stereo"
+    encoder.format = "fltp"
+    encoder.time_base = fractions.Fraction(1, sample_rate)
+    encoder.open()
+    access_units: List[bytes] = []
+    for i in range(count + 2):
+        tone = np.sin(np.arange(i * 1024, (i + 1) * 1024, dtype=np.float32) / 10)
+        frame: Any = av.AudioFrame.from_ndarray(np.stack([tone, tone]), format="fltp", layout="stereo")  # type: ignore
+        frame.sample_rate = sample_rate
+        frame.pts = i * 1024
+        access_units.extend(bytes(packet) for packet in encoder.encode(frame))
+    return access_units[:count], bytes(encoder.extradata)
+
+
+def aac_payload(access_units: List[bytes], size: Any = None) -> bytes:
+    headers = b"".join(
+        ((len(access_unit) if size is None else size) << 3).to_bytes(2, "big")
+        for access_unit in access_units
+    )
+    return (
+        (len(access_units) * 16).to_bytes(2, "big") + headers + b"".join(access_units)
+    )
+
+
+class FakeAudioSDP:
+    def __init__(self, rtpmap: Dict[str, Any], fmtp: Dict[str, Any]) -> None:
+        self.attributes = {"rtpmap": rtpmap, "fmtp": fmtp}
+
+    def get_media(self, media_type: str, media_index: int) -> Dict[str, Any]:
+        return {"attributes": self.attributes}
+
+
+class TestAudioStream:
+    access_units, config = aac_access_units(12)
+
+    def configured_stream(self) -> AudioStream:
+        stream = AudioStream(FakeTransport(), StreamType.AUDIO, jitter_buffer_latency=None)  # type: ignore
+        stream.configure(
+            FakeAudioSDP(
+                {"pt": 97, "encoding": "MPEG4-GENERIC/48000", "clockRate": 2},
+                {
+                    "pt": 97,
+                    "streamtype": "5",
+                    "mode": "AAC-hbr",
+                    "config": self.config.hex(),
+                    "sizeLength": "13",
+                    "indexLength": "3",
+                    "indexDeltaLength": "3",
+                },
+            )
+        )
+        return stream
+
+    def test_configure(self):
+        stream = self.configured_stream()
+        assert stream.sample_rate == 48000
+        assert stream.clock.clock_rate == 48000
+        with pytest.raises(ValueError):
+            stream.configure(
+                FakeAudioSDP(
+                    {"pt": 97, "encoding": "L16", "clockRate": 48000},
+                    {"pt": 97, "config": "1190"},
+                )
+            )
+
+    async def test_decodes_packets_into_contiguous_blocks(self):
+        stream = self.configured_stream()
+        async with stream.decode() as block_queue:
+            for seq, i in enumerate(range(0, len(self.access_units), 3)):
+                stream.handle_rtp(
+                    rtp_packet(aac_payload(self.access_units[i : i + 3]), seq, i * 1024)
+                )
+            blocks = [
+                await block_queue.get() for _ in range(len(self.access_units) // 3)
+            ]
+        assert [block.shape for block, _ in blocks] == [(3072, 2)] * 4
+        assert all(block.flags.c_contiguous for block, _ in blocks)
+        assert blocks[1][0].dtype == np.float32
+        assert np.abs(blocks[-1][0]).max() > 0.1
+        assert stream.stats["access_unit_count"] == len(self.access_units)
+        assert stream.stats["sample_count"] == 4 * 3072
+
+    def test_reassembles_fragmented_access_units(self):
+        stream = self.configured_stream()
+        access_unit = self.access_units[1]
+        size = len(access_unit)
+        fragments = [access_unit[:100], access_unit[100:200], access_unit[200:]]
+        packets = [
+            rtp_packet(aac_payload([fragment], size), seq, 1024, marker=seq == 2)
+            for seq, fragment in enumerate(fragments)
+        ]
+        assert [stream._depacketize(packet) for packet in packets] == [[], [], [access_unit]]  # type: ignore
+        next_packets = [
+            rtp_packet(aac_payload([fragments[0]], size), 3, 2048),
+            rtp_packet(aac_payload([fragments[2]], size), 5, 2048, marker=True),
+            rtp_packet(aac_payload(self.access_units[2:4]), 6, 3072),
+        ]
+        assert [stream._depacketize(packet) for packet in next_packets] == [  # type: ignore
+            [],
+            [],
+            self.access_units[2:4],
+        ]
+        assert stream.stats["discarded_fragmented_count"] == 1
+
+
+class TestGazeBatches:
+    SAMPLE = {
+        "gaze2d": [0.5, 0.25],
+        "gaze3d": [10.0, -5.0, 500.0],
+        "eyeleft": {
+            "gazeorigin": [30.0, -7.0, -25.0],
+            "gazedirection": [0.1, -0.1, 0.99],
+            "pupildiameter": 3.5,
+        },
+        "eyeright": {},
+    }
+
+    def test_schema(self):
+        array = GAZE_SCHEMA.to_array([(self.SAMPLE, 1.5), ({}, None)])
+        assert array["timestamp"][0] == 1.5
+        assert np.isnan(array["timestamp"][1])
+        assert list(array["valid"]) == [True, False]
+        assert list(array["eyeleft_valid"]) == [True, False]
+        assert list(array["eyeright_valid"]) == [False, False]
+        assert array["gaze2d"][0].tolist() == [0.5, 0.25]
+        assert array["eyeleft_pupildiameter"][0] == 3.5
+        assert np.isnan(array["eyeright_gazeorigin"]).all()
+
+    async def test_batches_by_size_and_drains(self):
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        payload = json.dumps(self.SAMPLE).encode()
+        async with stream.decode_batches(batch_size=4) as batch_queue:
+            for seq in range(6):
+                stream.handle_rtp(rtp_packet(payload, seq, 900 * seq))
+            batches = [await asyncio.wait_for(batch_queue.get(), 1) for _ in range(2)]
+        assert [len(batch) for batch in batches] == [4, 2]
+        assert stream.stats["samples"] == 6
+
+    async def test_batches_by_window(self):
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        payload = json.dumps(self.SAMPLE).encode()
+        async with stream.decode_batches(window=0.05) as batch_queue:
+            for seq in range(3):
+                stream.handle_rtp(rtp_packet(payload, seq, 900 * seq))
+                await asyncio.sleep(0.01)
+            batch = await asyncio.wait_for(batch_queue.get(), 1)
+        assert len(batch) == 3
+
+
+class TestIMUBatches:
+    @staticmethod
+    def test_schema():
+        array = IMU_SCHEMA.to_array(
+            [
+                ({"accelerometer": [0.1, 9.8, 0.2], "gyroscope": [1.0, 2.0, 3.0]}, 1.0),
+                ({"magnetometer": [20.0, -5.0, 40.0]}, 1.01),
+            ]
+        )
+        assert array["accelerometer"][0].tolist() == pytest.approx([0.1, 9.8, 0.2])
+        assert array["magnetometer"][1].tolist() == [20.0, -5.0, 40.0]
+        assert np.isnan(array["magnetometer"][0]).all()
+        assert np.isnan(array["gyroscope"][1]).all()
+
+    @staticmethod
+    async def test_decodes_imu_batches():
+        stream = DataStream(FakeTransport(), StreamType.IMU, jitter_buffer_latency=None)  # type: ignore
+        payload = json.dumps({"accelerometer": [0.0, 9.8, 0.0]}).encode()
+        async with stream.decode_batches(batch_size=10) as batch_queue:
+            for seq in range(3):
+                stream.handle_rtp(rtp_packet(payload, seq, 900 * seq))
+            batch = await asyncio.wait_for(batch_queue.get(), 1)
+        assert batch.dtype == IMU_SCHEMA.dtype
+        assert len(batch) == 3
+
+    @staticmethod
+    def test_only_gaze_and_imu_have_schemas():
+        stream = DataStream(FakeTransport(), StreamType.EVENTS)  # type: ignore
+        with pytest.raises(ValueError):
+            stream.columnar_schema
+
+
+class TestGazeFrameSynchronizer:
+    @staticmethod
+    def test_interpolates_gaze():
+        gaze_buffer = GazeBuffer()
+        for timestamp, x in [(1.0, 0.0), (1.02, 0.2), (1.04, 0.4), (1.06, 0.6)]:
+            gaze_buffer.insert({"gaze2d": [x, 0.5]}, timestamp)
+        gaze_buffer.insert({"gaze2d": [1.0, 1.0]}, None)
+        assert [timestamp for _, timestamp in gaze_buffer.take_until(1.03)] == [
+            1.0,
+            1.02,
+        ]
+        gaze = gaze_buffer.at(1.03)
+        assert isinstance(gaze, dict)
+        assert gaze["gaze2d"] == pytest.approx([0.3, 0.5])  # type: ignore
+
+    @staticmethod
+    def test_uses_nearest_sample_without_gaze():
+        gaze_buffer = GazeBuffer()
+        gaze_buffer.insert({"gaze2d": [0.1, 0.1]}, 1.0)
+        gaze_buffer.insert({}, 1.1)
+        gaze_buffer.take_until(1.02)
+        assert gaze_buffer.at(1.02) == {"gaze2d": [0.1, 0.1]}
+        assert gaze_buffer.at(1.08) == {}
+
+    @staticmethod
+    async def test_never_waits_for_gaze():
+        frame_queue: asyncio.Queue[Any] = asyncio.Queue()
+        gaze_queue: asyncio.Queue[Any] = asyncio.Queue()
+        synchronizer = GazeFrameSynchronizer(frame_queue, gaze_queue, GazeBuffer())
+        frame_queue.put_nowait(("frame 0", 1.0))
+        gaze_queue.put_nowait(({"gaze2d": [0.5, 0.5]}, 0.99))
+        (frame, gaze_samples, gaze), timestamp = await synchronizer.get()
+        assert (frame, timestamp) == ("frame 0", 1.0)
+        assert gaze_samples == [({"gaze2d": [0.5, 0.5]}, 0.99)]
+        assert gaze == {"gaze2d": [0.5, 0.5]}
+        frame_queue.put_nowait(("frame 1", 1.04))
+        (frame, gaze_samples, gaze), _ = await asyncio.wait_for(synchronizer.get(), 1)
+        assert (frame, gaze_samples, gaze) == ("frame 1", [], {"gaze2d": [0.5, 0.5]})
+
+
+class TestRTPJitterBuffer:
+    @staticmethod
+    def sequence_numbers(released: List[Any]) -> List[int]:
+        return [rtp.seq for rtp, _ in released]
+
+    def test_reorders_within_latency(self):
+        jitter_buffer = RTPJitterBuffer(latency=0.1)
+        assert self.sequence_numbers(
+            jitter_buffer.push(rtp_packet(b"", 0, 0), None, 0)
+        ) == [0]
+        assert jitter_buffer.push(rtp_packet(b"", 2, 0), None, 0.01) == []
+        released = jitter_buffer.push(rtp_packet(b"", 1, 0), None, 0.02)
+        assert self.sequence_numbers(released) == [1, 2]
+        assert jitter_buffer.reordered_count == 1
+        assert jitter_buffer.lost_count == 0
+
+    def test_skips_lost_packets_after_latency(self):
+        jitter_buffer = RTPJitterBuffer(latency=0.1)
+        jitter_buffer.push(rtp_packet(b"", 0, 0), None, 0)
+        assert jitter_buffer.push(rtp_packet(b"", 3, 0), None, 0.01) == []
+        assert jitter_buffer.deadline == 0.11
+        assert self.sequence_numbers(jitter_buffer.release(0.11)) == [3]
+        assert jitter_buffer.lost_count == 2
+        jitter_buffer.push(rtp_packet(b"", 1, 0), None, 0.12)
+        assert jitter_buffer.late_count == 1
+
+    def test_handles_sequence_number_wraparound(self):
+        jitter_buffer = RTPJitterBuffer(latency=0.1)
+        jitter_buffer.push(rtp_packet(b"", 0xFFFE, 0), None, 0)
+        assert jitter_buffer.push(rtp_packet(b"", 0, 0), None, 0) == []
+        released = jitter_buffer.push(rtp_packet(b"", 0xFFFF, 0), None, 0)
+        assert self.sequence_numbers(released) == [0xFFFF, 0]
+        jitter_buffer.push(rtp_packet(b"", 0, 0), None, 0)
+        assert jitter_buffer.late_count == 1
+
+    def test_resyncs_when_sender_restarts_sequence(self):
+        jitter_buffer = RTPJitterBuffer(latency=0.1)
+        for seq in [5000, 5001, 5003]:
+            jitter_buffer.push(rtp_packet(b"", seq, 0), None, 0)
+        released = jitter_buffer.push(rtp_packet(b"", 10, 0), None, 0.01)
+        assert self.sequence_numbers(released) == [5003, 10]
+        assert self.sequence_numbers(
+            jitter_buffer.push(rtp_packet(b"", 11, 0), None, 0.02)
+        ) == [11]
+        released = jitter_buffer.push(rtp_packet(b"", 12, 0, ssrc=1), None, 0.03)
+        assert self.sequence_numbers(released) == [12]
+        assert jitter_buffer.resync_count == 2
+        assert jitter_buffer.late_count == 0
+        jitter_buffer.push(rtp_packet(b"", 5, 0, ssrc=1), None, 0.04)
+        assert jitter_buffer.late_count == 1
+
+    def test_resyncs_when_sequence_jumps_ahead(self):
+        jitter_buffer = RTPJitterBuffer(latency=0.1, max_dropout=3000)
+        for seq in [0, 1, 3]:
+            jitter_buffer.push(rtp_packet(b"", seq, 0), None, 0)
+        assert jitter_buffer.push(rtp_packet(b"", 3003, 0), None, 0.01) == []
+        released = jitter_buffer.push(rtp_packet(b"", 20000, 0), None, 0.02)
+        assert self.sequence_numbers(released) == [3, 3003, 20000]
+        assert self.sequence_numbers(
+            jitter_buffer.push(rtp_packet(b"", 20001, 0), None, 0.03)
+        ) == [20001]
+        assert jitter_buffer.resync_count == 1
+        assert jitter_buffer.lost_count == 1 + 2999
+
+
+class SyntheticSender:
+    """An RTP clock which drifts relative to the NTP clock of the sender, with jittery sender reports."""
+
+    def __init__(self, rtp_offset: int, drift: float, jitter: float = 0.0) -> None:
+        self.rtp_offset = rtp_offset
+        self.drift = drift
+        self.jitter = jitter
+        self.random = random.Random(rtp_offset)
+
+    def rtp_timestamp(self, ntp_time: float) -> int:
+        return (
+            self.rtp_offset + round(ntp_time * 90000 * (1 + self.drift))
+        ) & 0xFFFFFFFF
+
+    def sender_report(self, ntp_time: float) -> Any:
+        reported_time = ntp_time + self.random.uniform(-self.jitter, self.jitter)
+        return self.rtp_timestamp(ntp_time), reported_time
+
+
+class TestRTPClock:
+    @staticmethod
+    def test_not_synchronized_before_first_sender_report():
+        clock = RTPClock()
+        assert not clock.is_synchronized
+        assert clock.to_ntp(1234) is None
+
+    @staticmethod
+    def test_follows_drift_across_streams():
+        senders = [
+            SyntheticSender(0x12345678, 50e-6, jitter=0.001),
+            SyntheticSender(0xFFF00000, -80e-6, jitter=0.001),
+        ]
+        clocks = [RTPClock(), RTPClock()]
+        max_error = 0.0
+        for report in range(60):
+            for sender, clock in zip(senders, clocks):
+                clock.add_sender_report(*sender.sender_report(report * 5.0))
+            if report >= 10:
+                for ntp_time in [report * 5.0 + 1.0, report * 5.0 + 4.5]:
+                    times = [
+                        clock.to_ntp(sender.rtp_timestamp(ntp_time))
+                        for sender, clock in zip(senders, clocks)
+                    ]
+                    max_error = max(max_error, abs(times[0] - times[1]))  # type: ignore
+        assert max_error < 0.002
+        assert clocks[0].drift == pytest.approx(50e-6, abs=10e-6)
+        assert clocks[1].drift == pytest.approx(-80e-6, abs=10e-6)
+        assert clocks[0].step_count == clocks[1].step_count == 0
+
+    @staticmethod
+    def test_handles_rtp_timestamp_wraparound():
+        clock = RTPClock()
+        clock.add_sender_report(0xFFFF0000, 100.0)
+        assert clock.to_ntp(0x00010000) == pytest.approx(100.0 + 0x20000 / 90000)
+        clock.add_sender_report(0x00010000, 100.0 + 0x20000 / 90000)
+        assert clock.to_ntp(0xFFFF0000) == pytest.approx(100.0)
+
+    @staticmethod
+    def test_slews_small_corrections():
+        clock = RTPClock()
+        clock.add_sender_report(0, 10.0)
+        clock.add_sender_report(90000, 11.0)
+        before = [clock.to_ntp(ts) for ts in range(180000, 360000, 900)]
+        clock.add_sender_report(180000, 12.02)
+        after = [clock.to_ntp(ts) for ts in range(180000, 360000, 900)]
+        assert after[0] == pytest.approx(before[0])
+        assert all(
+            0 < b - a < 0.011 + 0.0001 for a, b in zip(after, after[1:])  # type: ignore
+        )
+        assert 14.0 < clock.to_ntp(360000) < 14.02  # type: ignore
+        assert clock.step_count == 0
+
+    @staticmethod
+    def test_restarts_after_discontinuity():
+        clock = RTPClock()
+        clock.add_sender_report(0, 10.0)
+        clock.add_sender_report(90000, 11.0)
+        clock.add_sender_report(180000, 50.0)
+        assert clock.step_count == 1
+        assert clock.to_ntp(270000) == pytest.approx(51.0)
+
+    @staticmethod
+    async def test_timestamps_packets_queued_before_first_sender_report():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        stream.handle_rtp(rtp_packet(SPS, 0, 90000))
+        stream.handle_rtp(rtp_packet(PPS, 1, 180000))
+        sender_report = SimpleNamespace(ntp=100.0, ts=270000)
+        stream.handle_rtcp(SimpleNamespace(get=lambda packet_type: sender_report))  # type: ignore
+        stream.handle_rtp(rtp_packet(NON_IDR, 2, 360000))
+        timestamps = [stream.rtp_queue.get_nowait()[1] for _ in range(3)]
+        assert timestamps == pytest.approx([98.0, 99.0, 101.0])
+
+
+class TestKeyframeRequests:
+    @staticmethod
+    def test_pli():
+        pli = PSFB.keyframe_request(KeyframeRequestKind.PLI, 1, 2, 0)
+        assert bytes(pli) == bytes.fromhex("81ce0002" "00000001" "00000002")
+
+    @staticmethod
+    def test_fir():
+        fir = PSFB.keyframe_request(KeyframeRequestKind.FIR, 1, 2, 7)
+        assert bytes(fir) == bytes.fromhex(
+            "84ce0004" "00000001" "00000000" "00000002" "07000000"
+        )
+
+    @staticmethod
+    async def test_sequence_gap_requests_keyframe_once():
+        transport = FakeTransport()
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        async with stream.demux():
+            for seq in [0, 1, 3, 5]:
+                stream.handle_rtp(rtp_packet(SPS, seq, 0))
+            await asyncio.sleep(0)
+            stream.handle_rtp(rtp_packet(IDR[:1000], 6, 0, marker=True))
+            await asyncio.sleep(0.01)
+        assert stream.stats["keyframe_request_count"] == 1
+        assert [bytes(rtcp) for rtcp in transport.sent_rtcp] == [
+            bytes.fromhex("81ce0002" "11111111" "22222222")
+        ]
+        assert stream.stats["mean_recovery_time"] > 0
+
+    @staticmethod
+    async def test_fir_sequence_number_advances_after_keyframe(
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        monkeypatch.setattr("g3pylib.streams.KEYFRAME_REQUEST_INTERVAL", 0)
+        transport = FakeTransport()
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None, keyframe_request=KeyframeRequestKind.FIR)  # type: ignore
+        async with stream.demux():
+            stream.handle_rtp(rtp_packet(SPS, 0, 0))
+            for seq in [2, 4]:
+                stream.handle_rtp(rtp_packet(NON_IDR, seq, 0))
+            stream.handle_rtp(rtp_packet(IDR[:1000], 5, 0, marker=True))
+            stream.handle_rtp(rtp_packet(NON_IDR, 7, 3600))
+            await asyncio.sleep(0.01)
+        assert [bytes(rtcp)[-4] for rtcp in transport.sent_rtcp] == [0, 0, 1]
+
+
+class TestRTPQueue:
+    @staticmethod
+    def rtp_queue(overflow_policy: OverflowPolicy, paused: List[bool]) -> RTPQueue:
+        def pause_reading() -> bool:
+            paused.append(True)
+            return True
+
+        return RTPQueue(
+            4,
+            overflow_policy,
+            pause_reading,
+            lambda: paused.append(False),
+            lambda rtp: rtp.data[0] & 0x1F in [5, 7, 8],
+        )
+
+    @staticmethod
+    def sequence_numbers(rtp_queue: RTPQueue) -> List[int]:
+        sequence_numbers: List[int] = []
+        while not rtp_queue.empty():
+            sequence_numbers.append(rtp_queue.get_nowait()[0].seq)
+        return sequence_numbers
+
+    def test_drop_oldest(self):
+        rtp_queue = self.rtp_queue(OverflowPolicy.DROP_OLDEST, [])
+        for seq in range(6):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        assert self.sequence_numbers(rtp_queue) == [2, 3, 4, 5]
+        assert rtp_queue.dropped_count == 2
+
+    def test_drop_until_keyframe(self):
+        rtp_queue = self.rtp_queue(OverflowPolicy.DROP_UNTIL_KEYFRAME, [])
+        for seq in range(6):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        rtp_queue.put_nowait((rtp_packet(SPS, 6, 0), None))
+        rtp_queue.put_nowait((rtp_packet(IDR, 7, 0), None))
+        assert self.sequence_numbers(rtp_queue) == [6, 7]
+        assert rtp_queue.dropped_count == 6
+
+    @staticmethod
+    async def test_drop_until_keyframe_requests_keyframe():
+        transport = FakeTransport()
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None, rtp_queue_size=4)  # type: ignore
+        stream.handle_rtp(rtp_packet(SPS, 0, 0))
+        stream.handle_rtp(rtp_packet(IDR[:1000], 1, 0, marker=True))
+        async with stream.demux() as access_unit_queue:
+            await asyncio.wait_for(access_unit_queue.get(), 1)
+        for seq in range(2, 8):
+            stream.handle_rtp(rtp_packet(NON_IDR, seq, 3600 * seq, marker=True))
+        await asyncio.sleep(0)
+        assert stream.stats["keyframe_request_count"] == 1
+        async with stream.demux() as access_unit_queue:
+            stream.handle_rtp(rtp_packet(IDR[:1000], 10, 36000, marker=True))
+            access_unit, _ = await asyncio.wait_for(access_unit_queue.get(), 1)
+            await asyncio.sleep(0)
+        assert access_unit.is_keyframe
+        assert stream.stats["keyframe_request_count"] == 1
+        assert len(transport.sent_rtcp) == 1
+
+    def test_block_pauses_and_resumes_reading(self):
+        paused: List[bool] = []
+        rtp_queue = self.rtp_queue(OverflowPolicy.BLOCK, paused)
+        for seq in range(6):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        assert paused == [True]
+        assert self.sequence_numbers(rtp_queue) == list(range(6))
+        assert paused == [True, False]
+        assert rtp_queue.dropped_count == 0
+
+    def test_get_many_resumes_reading(self):
+        paused: List[bool] = []
+        rtp_queue = self.rtp_queue(OverflowPolicy.BLOCK, paused)
+        for seq in range(6):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        assert [rtp.seq for rtp, _ in rtp_queue.get_many_nowait(3)] == [0, 1, 2]
+        assert paused == [True]
+        assert [rtp.seq for rtp, _ in rtp_queue.get_many_nowait(10)] == [3, 4, 5]
+        assert paused == [True, False]
+
+    def test_session_starts_survive_dropped_packets(self):
+        rtp_queue = self.rtp_queue(OverflowPolicy.DROP_OLDEST, [])
+        for seq in range(3):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        rtp_queue.mark_session_start()
+        for seq in range(100, 102):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        packets = rtp_queue.get_many_nowait(3)
+        assert [rtp.seq for rtp, _ in packets] == [1, 2, 100]
+        assert rtp_queue.take_session_starts(len(packets)) == [2]
+        rtp_queue.mark_session_start()
+        for seq in range(200, 205):
+            rtp_queue.put_nowait((rtp_packet(NON_IDR, seq, 0), None))
+        assert self.sequence_numbers(rtp_queue) == [201, 202, 203, 204]
+        # The packets of the previous session were all dropped
+        assert rtp_queue.take_session_starts(1) == [0]
+        rtp_queue.mark_session_start()
+        assert rtp_queue.session_start_pending
+        assert rtp_queue.take_session_starts(0) == [0]
+        assert not rtp_queue.session_start_pending
+
+
+@pytest.mark.parametrize("demux_mode", list(DemuxMode), ids=lambda mode: mode.name)
+class TestDemuxModes:
+    @staticmethod
+    async def test_video_demux(demux_mode: DemuxMode):
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None, demux_mode=demux_mode)  # type: ignore
+        payloads = [SPS, PPS, *fragment(IDR, 1000), NON_IDR, NON_IDR]
+        markers = [False, False, False, False, True, True, True]
+        async with stream.demux() as access_unit_queue:
+            for seq, (payload, marker) in enumerate(zip(payloads, markers)):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 4, 0), marker)
+                )
+            access_units = [
+                (await asyncio.wait_for(access_unit_queue.get(), 1))[0]
+                for _ in range(3)
+            ]
+        assert [access_unit.rtp_timestamp for access_unit in access_units] == [
+            0,
+            3600,
+            7200,
+        ]
+
+    @staticmethod
+    async def test_data_decode(demux_mode: DemuxMode):
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None, demux_mode=demux_mode)  # type: ignore
+        async with stream.decode() as json_queue:
+            for seq in range(20):
+                payload = json.dumps({"n": seq}).encode() if seq != 5 else b""
+                stream.handle_rtp(rtp_packet(payload, seq, 0))
+            samples = [
+                (await asyncio.wait_for(json_queue.get(), 1))[0] for _ in range(19)
+            ]
+        assert samples == [{"n": n} for n in range(20) if n != 5]
+
+
+class TestInCallbackDemux:
+    @staticmethod
+    async def test_samples_are_queued_in_the_callback():
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None, demux_mode=DemuxMode.IN_CALLBACK)  # type: ignore
+        stream.handle_rtp(rtp_packet(json.dumps({"n": 0}).encode(), 0, 0))
+        async with stream.decode() as json_queue:
+            stream.handle_rtp(rtp_packet(json.dumps({"n": 1}).encode(), 1, 0))
+            assert [json_queue.get_nowait()[0] for _ in range(2)] == [
+                {"n": 0},
+                {"n": 1},
+            ]
+        stream.handle_rtp(rtp_packet(json.dumps({"n": 2}).encode(), 2, 0))
+        assert stream.rtp_queue.qsize() == 1
+
+    @staticmethod
+    async def test_drops_access_units_until_keyframe():
+        transport = FakeTransport()
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None, rtp_queue_size=10, demux_mode=DemuxMode.IN_CALLBACK)  # type: ignore
+        async with stream.demux() as access_unit_queue:
+            payloads = [SPS, PPS, IDR[:1000], *[NON_IDR] * 12, IDR[:1000]]
+            for seq, payload in enumerate(payloads):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), seq >= 2)
+                )
+            with pytest.raises(RuntimeError):
+                async with stream.demux():
+                    pass
+            await asyncio.sleep(0.01)
+        assert access_unit_queue.qsize() == 1
+        assert access_unit_queue.get_nowait()[0].is_keyframe
+        assert stream.stats["demux_dropped_count"] == 13
+        assert stream.stats["keyframe_request_count"] == 1
+
+    @staticmethod
+    async def test_video_queue_holds_frame_queue_size_access_units():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None, overflow_policy=OverflowPolicy.DROP_OLDEST, demux_mode=DemuxMode.IN_CALLBACK)  # type: ignore
+        async with stream.demux() as access_unit_queue:
+            payloads = [SPS, PPS, IDR[:1000], *[NON_IDR] * (FRAME_QUEUE_SIZE + 5)]
+            for seq, payload in enumerate(payloads):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), seq >= 2)
+                )
+            assert access_unit_queue.qsize() == FRAME_QUEUE_SIZE
+        assert stream.stats["demux_dropped_count"] == 6
+
+    @staticmethod
+    async def test_counts_malformed_packets():
+        video = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None, demux_mode=DemuxMode.IN_CALLBACK)  # type: ignore
+        gaze = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None, demux_mode=DemuxMode.IN_CALLBACK)  # type: ignore
+        async with video.demux() as access_unit_queue, gaze.decode() as json_queue:
+            payloads = [SPS, PPS, IDR[:1000], *[NON_IDR] * (FRAME_QUEUE_SIZE + 2)]
+            for seq, payload in enumerate([*payloads, b"", IDR[:1000]]):
+                video.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), seq >= 2)
+                )
+            for seq, payload in enumerate([b"\xff\xfe", b'"\xff"', b"{}"]):
+                gaze.handle_rtp(rtp_packet(payload, seq, 0))
+            assert access_unit_queue.get_nowait()[0].is_keyframe
+            assert json_queue.get_nowait()[0] == {}
+        assert video.stats["malformed_count"] == 1
+        assert gaze.stats["malformed_count"] == 2
+
+
+class TestMediaThread:
+    @staticmethod
+    async def test_enters_and_exits_on_the_media_loop():
+        threads: List[threading.Thread] = []
+
+        @asynccontextmanager
+        async def context() -> AsyncIterator[int]:
+            threads.append(threading.current_thread())
+            yield 1
+            threads.append(threading.current_thread())
+
+        media_thread = MediaThread()
+        async with media_thread.enter(context()) as value:
+            assert value == 1
+        await media_thread.stop()
+        assert threads == [media_thread._thread] * 2  # type: ignore
+        assert media_thread.loop.is_closed()
+
+    @staticmethod
+    async def test_proxy_forwards_decoded_samples():
+        media_thread = MediaThread()
+
+        async def create_stream() -> DataStream:
+            return DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+
+        stream = await media_thread.run(create_stream())
+        proxy = StreamProxy(stream, media_thread)
+        async with proxy.decode() as json_queue:
+            for seq in range(200):
+                media_thread.loop.call_soon_threadsafe(
+                    stream.handle_rtp,
+                    rtp_packet(json.dumps({"n": seq}).encode(), seq, 0),
+                )
+            samples = [
+                (await asyncio.wait_for(json_queue.get(), 1))[0] for _ in range(200)
+            ]
+        await media_thread.stop()
+        assert samples == [{"n": n} for n in range(200)]
+        assert proxy.stats["samples"] == 200
+
+    @staticmethod
+    async def test_stop_keeps_calling_loop_running():
+        media_thread = MediaThread()
+
+        async def slow_cancellation() -> None:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                time.sleep(0.2)
+                raise
+
+        media_thread.start(slow_cancellation())
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)
+        ticks = 0
+        await media_thread.stop()
+        ticker_task.cancel()
+        assert media_thread.loop.is_closed()
+        assert ticks >= 5
+
+
+class TestUDPReception:
+    @staticmethod
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux"), reason="SO_MEMINFO is Linux only"
+    )
+    async def test_receive_buffer_size_and_kernel_drops():
+        (
+            datagram_transport,
+            _,
+        ) = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=("127.0.0.1", 0)
+        )
+        transport = FakeTransport()
+        transport.rtp_sink = SimpleNamespace(transport=datagram_transport)  # type: ignore
+        stream = DataStream(transport, StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        receive_buffer_size = stream.set_receive_buffer_size(8192)
+        assert receive_buffer_size is not None and receive_buffer_size >= 8192
+        assert stream.stats["receive_buffer_size"] == receive_buffer_size
+        assert stream.stats["kernel_dropped_count"] == 0
+        datagram_transport.pause_reading()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            for _ in range(100):
+                sender.sendto(
+                    bytes(1000), datagram_transport.get_extra_info("sockname")
+                )
+        assert stream.stats["kernel_dropped_count"] > 0
+        datagram_transport.close()
+
+    @staticmethod
+    def test_stats_without_transport_stats():
+        transport = SimpleNamespace(subscribe=lambda stream: None)
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        stream._demux_rtp(rtp_packet(NON_IDR, 0, 0, marker=True), None)
+        stream._request_keyframe()
+        assert stream.packet_counts == (0, 0)
+        assert stream.stats["expected_count"] == 0
+        assert stream.stats["keyframe_request_count"] == 0
+
+    @staticmethod
+    def test_receive_buffer_size_that_cant_be_set(caplog: pytest.LogCaptureFixture):
+        class FailingSocket:
+            def setsockopt(self, level: int, option: int, value: int) -> None:
+                raise OSError(errno.ENOBUFS, "No buffer space available")
+
+            def getsockopt(self, level: int, option: int) -> int:
+                return 4096
+
+        transport = FakeTransport()
+        transport.rtp_sink = SimpleNamespace(transport=SimpleNamespace(get_extra_info=lambda name: FailingSocket()))  # type: ignore
+        stream = DataStream(transport, StreamType.GAZE)  # type: ignore
+        with caplog.at_level(logging.WARNING):
+            assert stream.set_receive_buffer_size(8192) == 4096
+        assert "couldn't be set to 8192 bytes" in caplog.text
+
+    @staticmethod
+    def test_no_socket_stats_without_udp():
+        stream = DataStream(FakeTransport(), StreamType.GAZE)  # type: ignore
+        assert stream.set_receive_buffer_size(8192) is None
+        assert "receive_buffer_size" not in stream.stats
+        assert "kernel_dropped_count" not in stream.stats
+
+    @staticmethod
+    def test_detects_sustained_loss():
+        detector = UDPLossDetector(threshold=0.1, check_count=3)
+        counts = [(100, 100), (200, 180), (300, 280), (400, 400), (500, 450)]
+        assert [
+            detector.check({StreamType.GAZE: (expected, received)})
+            for expected, received in [*counts, (600, 500)]
+        ] == [False] * 6
+        assert detector.check({StreamType.GAZE: (700, 550)})
+
+    @staticmethod
+    async def test_attach_transport_restarts_session():
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=1)  # type: ignore
+        stream.clock.add_sender_report(0, 1000.0)
+        stream.handle_rtp(rtp_packet(b"{}", 10, 0))
+        stream.handle_rtp(rtp_packet(b"{}", 12, 0))
+        assert stream.rtp_queue.qsize() == 1
+        transport = FakeTransport()
+        stream.attach_transport(transport)  # type: ignore
+        assert stream.transport is transport
+        assert stream.rtp_queue.qsize() == 2
+        assert not stream.clock.is_synchronized
+        stream.handle_rtp(rtp_packet(b"{}", 500, 0))
+        assert stream.rtp_queue.qsize() == 3
+
+
+def patch_rtsp(
+    monkeypatch: pytest.MonkeyPatch, events: List[str], sdp: Any = None
+) -> List[FakeTransport]:
+    new_transports: List[FakeTransport] = []
+
+    @asynccontextmanager
+    async def connection(host: str, port: int) -> AsyncIterator[Any]:
+        events.append(f"connect {host}:{port}")
+        yield SimpleNamespace(running=True)
+        events.append("close connection")
+
+    def transport_for_scheme(scheme: str) -> Any:
+        @asynccontextmanager
+        async def transport(connection: Any) -> AsyncIterator[FakeTransport]:
+            new_transports.append(FakeTransport())
+            yield new_transports[-1]
+
+        events.append(f"transport {scheme}")
+        return transport
+
+    async def play() -> None:
+        events.append("play")
+
+    @asynccontextmanager
+    async def media_session(
+        connection: Any, url: str, media_stream_configurations: List[Any]
+    ) -> AsyncIterator[Any]:
+        yield SimpleNamespace(
+            play=play, configurations=media_stream_configurations, sdp=sdp
+        )
+        events.append("close session")
+
+    monkeypatch.setattr("g3pylib.streams.RTSPConnection", connection)
+    monkeypatch.setattr("g3pylib.streams.transport_for_scheme", transport_for_scheme)
+    monkeypatch.setattr("g3pylib.streams.RTSPMediaSession", media_session)
+    monkeypatch.setattr(
+        "g3pylib.streams.MediaStreamConfiguration",
+        lambda transport, media_type, media_index: SimpleNamespace(
+            transport=transport, media_type=media_type, media_index=media_index
+        ),
+    )
+    return new_transports
+
+
+class TestReconnect:
+    @staticmethod
+    async def test_restarted_video_waits_for_keyframe():
+        transport = FakeTransport()
+        stream = VideoStream(transport, StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        fragments = fragment(IDR, 1000)
+        new_ssrc = 0x33333333
+        async with stream.demux() as access_unit_queue:
+            for seq, payload in enumerate([SPS, PPS, IDR[:1000]]):
+                stream.handle_rtp(rtp_packet(payload, seq, 0, marker=seq == 2))
+            stream.handle_rtp(rtp_packet(NON_IDR, 3, 3600, marker=True))
+            stream.handle_rtp(rtp_packet(fragments[0], 4, 7200))
+            # The packets of the previous session haven't been demuxed yet
+            new_transport = FakeTransport()
+            stream.attach_transport(new_transport)  # type: ignore
+            await asyncio.sleep(0)
+            assert not new_transport.sent_rtcp
+            for seq, (payload, rtp_timestamp, marker) in enumerate(
+                [
+                    (fragments[1], 7200, False),
+                    (NON_IDR, 10800, True),
+                    (IDR[:1000], 14400, True),
+                ]
+            ):
+                stream.handle_rtp(
+                    rtp_packet(payload, 100 + seq, rtp_timestamp, marker, new_ssrc)
+                )
+            rtp_timestamps = [
+                (await asyncio.wait_for(access_unit_queue.get(), 1))[0].rtp_timestamp
+                for _ in range(3)
+            ]
+        assert rtp_timestamps == [0, 3600, 14400]
+        assert stream.stats["discarded_fragmented_count"] == 1
+        assert not transport.sent_rtcp
+        # The keyframe is requested from the sender of the new session
+        assert [bytes(rtcp)[-4:] for rtcp in new_transport.sent_rtcp] == [
+            new_ssrc.to_bytes(4, "big")
+        ]
+
+    @staticmethod
+    async def test_restarted_video_in_callback_waits_for_keyframe():
+        stream = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None, demux_mode=DemuxMode.IN_CALLBACK)  # type: ignore
+        async with stream.demux() as access_unit_queue:
+            for seq, payload in enumerate([SPS, PPS, IDR[:1000], NON_IDR]):
+                stream.handle_rtp(
+                    rtp_packet(payload, seq, 3600 * max(seq - 2, 0), seq >= 2)
+                )
+            stream.attach_transport(FakeTransport())  # type: ignore
+            stream.handle_rtp(rtp_packet(NON_IDR, 100, 7200, marker=True))
+            stream.handle_rtp(rtp_packet(IDR[:1000], 101, 10800, marker=True))
+            rtp_timestamps = [
+                access_unit_queue.get_nowait()[0].rtp_timestamp
+                for _ in range(access_unit_queue.qsize())
+            ]
+        assert rtp_timestamps == [0, 3600, 10800]
+
+    @staticmethod
+    async def test_reconnects_after_stall(monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr("g3pylib.streams.RECONNECT_INTERVAL", 0.01)
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        streams = Streams(None, {stream}, "rtsp://127.0.0.1:8554/live/all")  # type: ignore
+        attempts: List[str] = []
+        reconnected = asyncio.Event()
+
+        async def switch_transport(scheme: str) -> None:
+            attempts.append(scheme)
+            if len(attempts) == 1:
+                raise OSError("connection refused")
+            stream.attach_transport(FakeTransport())  # type: ignore
+            reconnected.set()
+
+        streams.switch_transport = switch_transport  # type: ignore
+        streams.play_time = time.monotonic()
+        stream.handle_rtp(rtp_packet(b"{}", 0, 0))
+        monitor_task = asyncio.create_task(streams._monitor_session(0.05))
+        await asyncio.wait_for(reconnected.wait(), 1.0)
+        await asyncio.sleep(0)
+        assert attempts == ["rtsp", "rtsp"]
+        assert streams.stats["reconnect_count"] == 1
+        assert stream.first_packet_time is None
+        stream.handle_rtp(rtp_packet(b"{}", 1000, 0))
+        assert streams.stats["last_gap_duration"] > 0.05
+        assert stream.rtp_queue.qsize() == 2
+        monitor_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await monitor_task
+
+    @staticmethod
+    async def test_switch_transport_moves_streams(monkeypatch: pytest.MonkeyPatch):
+        events: List[str] = []
+        new_transports = patch_rtsp(monkeypatch, events)
+        old_transports = [FakeTransport(), FakeTransport()]
+        gaze = DataStream(old_transports[0], StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        imu = DataStream(old_transports[1], StreamType.IMU, jitter_buffer_latency=None)  # type: ignore
+        streams = Streams(None, {gaze, imu}, "rtsp://127.0.0.1:8554/live/all")  # type: ignore
+        streams._session_stack = AsyncExitStack()
+        streams._session_stack.callback(events.append, "close previous session")
+        streams.play_time = time.monotonic()
+        await streams.switch_transport("rtspt")
+        assert events == [
+            "connect 127.0.0.1:8554",
+            "transport rtspt",
+            "transport rtspt",
+            "play",
+            "close previous session",
+        ]
+        configurations = streams.session.configurations  # type: ignore
+        for stream, old_transport in zip([gaze, imu], old_transports):
+            [configuration] = [
+                configuration
+                for configuration in configurations
+                if configuration.transport is stream.transport
+            ]
+            assert configuration.media_type == stream.media_type
+            assert stream.transport in new_transports
+            assert stream.transport.clients == {stream}  # type: ignore
+            assert not old_transport.clients
+        assert streams.scheme == "rtspt"
+        await streams._session_stack.aclose()
+        assert events[-2:] == ["close session", "close connection"]
+
+    @staticmethod
+    async def test_switch_transport_primes_new_session(
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        events: List[str] = []
+        sprop_parameter_sets = ",".join(
+            base64.b64encode(nal_unit).decode() for nal_unit in [SPS, PPS]
+        )
+        patch_rtsp(
+            monkeypatch,
+            events,
+            FakeSDP({"pt": 96, "sprop-parameter-sets": sprop_parameter_sets}),
+        )
+        video = VideoStream(FakeTransport(), StreamType.SCENE_CAMERA, jitter_buffer_latency=None)  # type: ignore
+        audio = AudioStream(FakeTransport(), StreamType.AUDIO, jitter_buffer_latency=None)  # type: ignore
+        audio.configure = lambda sdp: events.append("configure audio")  # type: ignore
+        streams = Streams(None, {video, audio}, "rtsp://127.0.0.1:8554/live/all")  # type: ignore
+        streams._session_stack = AsyncExitStack()
+        streams._session_stack.callback(events.append, "close previous session")
+        await streams.switch_transport("rtsp")
+        assert events[-2:] == ["configure audio", "close previous session"]
+        async with video.demux() as access_unit_queue:
+            video.handle_rtp(rtp_packet(NON_IDR, 0, 0, marker=True))
+            video.handle_rtp(rtp_packet(IDR[:1000], 1, 3600, marker=True))
+            access_unit, _ = await asyncio.wait_for(access_unit_queue.get(), 1)
+        assert [nal_unit.type for nal_unit in access_unit.nal_units] == [7, 8, 5]
+        await streams._session_stack.aclose()
+
+    @staticmethod
+    async def test_audio_decodes_in_its_own_executor(
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        patch_rtsp(monkeypatch, [], FakeSDP({"pt": 96}))
+        monkeypatch.setattr(AudioStream, "configure", lambda self, sdp: None)
+        video_executor = ThreadPoolExecutor(max_workers=2)
+        async with Streams.connect(
+            "rtsp://127.0.0.1:8554/live/all",
+            audio=True,
+            decoder_executor=video_executor,
+        ) as streams:
+            audio_executor = cast(ThreadPoolExecutor, streams.audio.decoder_executor)
+            assert streams.scene_camera.decoder_executor is video_executor
+            assert audio_executor is not video_executor
+            assert audio_executor._max_workers == 1  # type: ignore
+        assert audio_executor._shutdown  # type: ignore
+        assert not video_executor._shutdown  # type: ignore
+        video_executor.shutdown()
+
+    @staticmethod
+    async def test_switch_transport_keeps_receive_buffer_sizes(
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        patch_rtsp(monkeypatch, [])
+        loop = asyncio.get_running_loop()
+
+        def transport_for_scheme(scheme: str) -> Any:
+            @asynccontextmanager
+            async def transport(connection: Any) -> AsyncIterator[FakeTransport]:
+                datagram_transport, _ = await loop.create_datagram_endpoint(
+                    asyncio.DatagramProtocol, local_addr=("127.0.0.1", 0)
+                )
+                udp_transport = FakeTransport()
+                udp_transport.rtp_sink = SimpleNamespace(transport=datagram_transport)  # type: ignore
+                yield udp_transport
+                datagram_transport.close()
+
+            return transport
+
+        monkeypatch.setattr(
+            "g3pylib.streams.transport_for_scheme", transport_for_scheme
+        )
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            default_size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        stream = DataStream(FakeTransport(), StreamType.GAZE, jitter_buffer_latency=None)  # type: ignore
+        streams = Streams(None, {stream}, "rtsp://127.0.0.1:8554/live/all")  # type: ignore
+        streams._session_stack = AsyncExitStack()
+        streams._receive_buffer_sizes = {StreamType.GAZE: 8192}
+        for _ in range(2):
+            await streams.switch_transport("rtsp")
+            receive_buffer_size = stream.stats["receive_buffer_size"]
+            assert 8192 <= receive_buffer_size < default_size
+        await streams._session_stack.aclose()
+
+    @staticmethod
+    def test_detects_lost_connection():
+        stream = DataStream(FakeTransport(), StreamType.GAZE)  # type: ignore
+        streams = Streams(None, {stream})  # type: ignore
+        streams._connection = SimpleNamespace(running=True)  # type: ignore
+        assert streams._stall_reason(1.0) is None
+        streams.play_time = time.monotonic() - 2.0
+        assert streams._stall_reason(1.0) is not None
+        stream.handle_rtp(rtp_packet(b"{}", 0, 0))
+        assert streams._stall_reason(1.0) is None
+        streams._connection = SimpleNamespace(running=False)  # type: ignore
+        assert streams._stall_reason(1.0) == "RTSP connection lost"